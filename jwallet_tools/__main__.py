@@ -1,12 +1,11 @@
 #!/usr/bin/env python
+import atexit
 import os
 import sys
 import logging.config
 import json
 import click
 
-from .assets_validator import create_assets_validator
-
 
 sys.path.insert(0, os.path.dirname(__name__))
 
@@ -16,6 +15,30 @@ logger = logging.getLogger('jwallet_tools')
 
 INDEX_FILENAME = './assets_index.json'
 
+# lowest --rate-limit (requests per second), zero would never allow a request
+MIN_RATE_LIMIT = 0.01
+
+
+class ConcurrencyType(click.ParamType):
+
+    """Number of receipt requests in flight: positive int or `auto`."""
+
+    name = 'concurrency'
+
+    def convert(self, value, param, ctx):
+        if value == 'auto' or isinstance(value, int):
+            return value
+        try:
+            concurrency = int(value)
+        except ValueError:
+            concurrency = 0
+        if concurrency < 1:
+            self.fail("%s is not a positive integer or `auto`" % value, param, ctx)
+        return concurrency
+
+
+CONCURRENCY = ConcurrencyType()
+
 
 @click.group()
 def main():
@@ -24,12 +47,50 @@ def main():
 
 @main.command()
 @click.argument('file', type=click.File('r'), required=False)
-@click.option('--node', default="https://main-node.jwallet.network/", help="Ethereum node to use to validate contract")  # noqa
+@click.option('--node', default="https://main-node.jwallet.network/", help="Ethereum node to use to validate contract (http(s)://, ipc:// or ws(s)://)")  # noqa
 @click.option('--ignore', help="comma separated list of ignored methods (ex: `approve,name`)")
-@click.option('--fast', is_flag=True, help="do not invoke contract method")
+@click.option('--fast', is_flag=True, help="offline validation: do not query node and coinmarketcap")  # noqa
 @click.option('--loglevel', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']), default='INFO')  # noqa
 @click.option('--progress', is_flag=True, default=False, help="Show progressbar")
-def validate(file, node, ignore, fast, loglevel, progress):
+@click.option('--rpc-backend', type=click.Choice(['web3', 'raw', 'process']), default='web3',
+              help="Backend to scan contract TXs with (`raw` bypasses web3 formatters, "
+                   "`process` fetches receipts on worker processes)")
+@click.option('--processes', type=click.IntRange(1, None),
+              help="Number of receipt worker processes of `process` backend (default: CPU count)")
+@click.option('--block', type=int, help="Block number to validate at (default: head block)")
+@click.option('--confirmations', type=int, default=0,
+              help="Number of blocks to step back from head block")
+@click.option('--concurrency', type=CONCURRENCY, default='100',
+              help="Number of receipt requests in flight, or `auto` to tune it to node")
+@click.option('--rate-limit', type=click.FloatRange(min=MIN_RATE_LIMIT),
+              help="Max requests per second to node")
+@click.option('--burst', type=click.IntRange(1, None),
+              help="Max requests to node at once (default: rate limit)")
+@click.option('--gas-percentile', type=click.IntRange(1, 100), default=100,
+              help="staticGasAmount percentile to check")
+@click.option('--gas-estimation', type=click.Choice(['full', 'sample']), default='full',
+              help="Scan all TXs or sample random block windows to check staticGasAmount")
+@click.option('--gas-window-transfers', type=int,
+              help="Check staticGasAmount by last N transfers only")
+@click.option('--gas-window-blocks', type=int,
+              help="Check staticGasAmount by transfers from last N blocks only")
+@click.option('--record', type=click.Path(dir_okay=False),
+              help="Record node and coinmarketcap responses to cassette file")
+@click.option('--replay', type=click.Path(exists=True, dir_okay=False),
+              help="Replay node and coinmarketcap responses from cassette file (no network)")
+@click.option('--jobs', type=click.IntRange(1, None), default=1,
+              help="Number of assets validated at once (across all networks)")
+@click.option('--stats-file', type=click.Path(dir_okay=False),
+              help="File to keep per-asset validation durations in (used to schedule)")
+@click.option('--profile', type=click.Path(file_okay=False),
+              help="Profile validation and write collapsed stacks and summary to directory")
+@click.option('--queue', help="Distribute validation over work queue (SQLite file or uri)")
+@click.option('--range-size', type=int, default=500000,
+              help="Blocks per gas scan job of distributed validation")
+def validate(file, node, ignore, fast, loglevel, progress, rpc_backend, processes, block,
+             confirmations, concurrency, rate_limit, burst, gas_percentile, gas_estimation,
+             gas_window_transfers, gas_window_blocks, record, replay, jobs, stats_file,
+             profile, queue, range_size):
     """
     Validate json file with assets.
 
@@ -42,57 +103,301 @@ def validate(file, node, ignore, fast, loglevel, progress):
     You can use `--ignore` to ignore some methods. If such methods doesn't exist,
     validation will not fail and warning will be printed to output. For example:
     `--ignore approve,name,decimals`. It is also possible to ignore all method
-    by symbol with, for ex `GNT.*` or exact method with `GNT.approve`.
+    by symbol with, for ex `GNT.*` or exact method with `GNT.approve`. Symbol and
+    method may be glob patterns (`*.decimal?`), prefix rule with network name to
+    apply it to single network only (`ropsten:GNT.name`).
 
     Ignored methods can be also defined in `jwallet_tools/assets.schema.json` under
-    `item.isValidContract.ignore` key.
+    `item.isValidContract.ignore` key. Rules that didn't match anything are reported
+    at the end of validation.
+
+    Use `--fast` to validate schema and addresses only. Fast validation is fully
+    offline: no node connection and no coinmarketcap requests are made.
+
+    Use `--rpc-backend=raw` to scan contract TXs with raw JSON-RPC requests instead of
+    web3, it is much faster for tokens with lots of transfers. With
+    `--rpc-backend=process` receipts are fetched and decoded by `--processes` worker
+    processes, so receipt throughput scales with CPU cores instead of being limited
+    by single interpreter.
+
+    Head block is pinned once per network, so all assets are validated at the same
+    block. Use `--confirmations` to step back from head, or `--block` to validate
+    at exact block (confirmations are not applied to it, so options can't be used
+    together).
+
+    Use `--concurrency=auto` to grow number of receipt requests in flight while node
+    latency stays flat and back off on errors (useful for public nodes).
+
+    Use `--rate-limit` (and `--burst`) to stay within node provider quota. Limit can
+    also be defined per network in `assets_index.json` with `rateLimit` and `burst`
+    keys.
+
+    Use `--gas-estimation=sample` with `--gas-percentile` below 100 to check
+    staticGasAmount by TXs from random block windows. Full scan is performed only
+    if confidence interval of estimated percentile contains staticGasAmount.
+    Interval is estimated by resampling windows, so it is approximate.
+
+    Use `--gas-window-transfers` and/or `--gas-window-blocks` to check staticGasAmount
+    by recent transfers only: blocks are scanned backwards from head, so validation
+    cost doesn't depend on contract age.
+
+    Use `--record` to save all responses to cassette file and `--replay` to run
+    validation against saved responses without network (for CI and benchmarks).
+    Recorded responses are reused, so `--record` also works as a warm cache.
+
+    Use `--stats-file` to save validation durations of assets, next run with same
+    file validates the longest assets first. Use `--jobs` to validate several
+    assets (of all networks) at once, remaining time is estimated by saved durations.
 
-    Use `--fast` to prevent method invocations.
+    Use `--profile` to find out where validation time goes: stacks of all threads
+    (receipt workers included) are sampled per asset and validation stage, and
+    written as `profile.collapsed` (for flamegraph.pl or speedscope) and
+    `profile.txt` (top functions and time per asset/stage).
+
+    Use `--queue` to distribute validation between machines: assets and block
+    ranges of contract TXs are enqueued as jobs, `worker` commands started with
+    same `--queue` process them (this command works on jobs too), then results
+    are merged to single report. Options of local validation (`--fast`, gas
+    estimation and window options, `--processes`, `--jobs`, `--profile`,
+    `--stats-file`, `--record` and `--replay`) can't be used with `--queue`.
     """
+    from .profiling import SamplingProfiler
+    from .scheduler import ValidationStats
+
     _configure_logging(loglevel)
 
-    check_list = []
+    _check_options(record, replay, rpc_backend, block, confirmations, gas_estimation,
+                   gas_percentile)
+    if queue:
+        # options of local validation only, workers would silently ignore them
+        _check_queue_options(
+            fast=fast, gas_estimation=gas_estimation != 'full',
+            gas_window_transfers=gas_window_transfers is not None,
+            gas_window_blocks=gas_window_blocks is not None, processes=processes is not None,
+            profile=profile, jobs=jobs != 1, stats_file=stats_file, record=record, replay=replay
+        )
+    check_list = _open_check_list(file, node)
+    if record or replay:
+        _check_cassette_nodes(check_list)
+        _open_cassette(record, replay)
+    ignore = [] if ignore is None else [x.strip() for x in ignore.split(',')]
+
+    if queue:
+        error_count = _validate_distributed(
+            queue, check_list, range_size, block, confirmations, ignore, gas_percentile,
+            rpc_backend=rpc_backend, concurrency=concurrency, rate_limit=rate_limit,
+            burst=burst
+        )
+        _exit_with_report(error_count)
+
+    stats = ValidationStats(stats_file)
+    scheduler, error_count = _create_scheduler(check_list, stats, jobs, dict(
+        ignore=ignore,
+        fast=fast,
+        progress=progress,
+        rpc_backend=rpc_backend,
+        processes=processes,
+        block_identifier=block,
+        confirmations=confirmations,
+        concurrency=concurrency,
+        rate_limit=rate_limit,
+        burst=burst,
+        gas_percentile=gas_percentile,
+        gas_estimation=gas_estimation,
+        gas_window_transfers=gas_window_transfers,
+        gas_window_blocks=gas_window_blocks
+    ))
+
+    profiler = None
+    if profile:
+        profiler = SamplingProfiler()
+        profiler.start()
+
+    try:
+        result_errors, ignored = _report_results(scheduler, None if fast else stats)
+    finally:
+        for validator in scheduler.validators.values():
+            validator.contract_validator.close()
+        # profile of failed or interrupted validation is still useful
+        if profiler is not None:
+            profiler.stop()
+            for path in profiler.write(profile):
+                click.echo("Profile written to %s" % path)
+    error_count += result_errors
+
+    if not fast:
+        stats.save()
+        # fast validation doesn't check methods, so every rule would be reported
+        _report_unused_ignore_rules(ignore, ignored)
+
+    _exit_with_report(error_count)
+
+
+def _check_options(record, replay, rpc_backend, block, confirmations, gas_estimation,
+                   gas_percentile):
+    """Fail on `validate` options which can't be used together."""
+    if gas_estimation == 'sample' and gas_percentile == 100:
+        # sample can't bound maximum, validation would fall back to full scan
+        click.echo("[FAIL] --gas-estimation=sample requires --gas-percentile below 100")
+        exit(1)
+    if block is not None and confirmations:
+        click.echo("[FAIL] --block and --confirmations can't be used together")
+        exit(1)
+    if record and replay:
+        click.echo("[FAIL] --record and --replay can't be used together")
+        exit(1)
+    if (record or replay) and rpc_backend == 'process':
+        # worker processes don't share cassette of this process
+        click.echo("[FAIL] --record and --replay can't be used with --rpc-backend=process")
+        exit(1)
+
+
+def _check_cassette_nodes(check_list):
+    """Fail if some node of check list can't be served through cassette.
+
+    Only HTTP requests are recorded, `ipc://` and `ws://` connections bypass cassette.
+    """
+    from .assets_validator._socket_provider import is_socket_uri
+
+    socket_nodes = sorted({node for _, _, node, _ in check_list if is_socket_uri(node)})
+    if socket_nodes:
+        raise click.UsageError("--record and --replay can't be used with IPC/WebSocket "
+                               "nodes: %s" % ', '.join(socket_nodes))
+
+
+def _check_queue_options(**options):
+    """Fail on `validate` options which distributed validation doesn't support.
+
+    :param options: option name -> True if option is set
+    """
+    unsupported = ['--' + name.replace('_', '-') for name, value in options.items() if value]
+    if unsupported:
+        click.echo("[FAIL] %s can't be used with --queue" % ', '.join(sorted(unsupported)))
+        exit(1)
+
+
+def _open_check_list(file, node):
+    """[network, assets file, node, network config] of single file or all networks of index."""
     if node and file:
-        check_list.append([file, node])
-    else:
-        if not os.path.exists(INDEX_FILENAME):
-            click.echo('[FAIL] no %s found in current directory, '
-                       'and no file and node provided' % INDEX_FILENAME)
-            exit(1)
-        with open(INDEX_FILENAME) as fp:
-            assets_index = json.load(fp)
-            for config in assets_index.values():
-                check_list.append([open(config['assets']), config['node']])
-
-    if ignore is None:
-        ignore = []
-    else:
-        ignore = [x.strip() for x in ignore.split(',')]
+        return [[node, file, node, {}]]
+
+    check_list = []
+    assets_index = _load_assets_index(', and no file and node provided')
+    for network, config in assets_index.items():
+        check_list.append([network, open(config['assets']), config['node'], config])
+    return check_list
+
+
+def _create_scheduler(check_list, stats, jobs, validator_kwargs):
+    """Scheduler of assets of all networks.
+
+    :param validator_kwargs: `create_assets_validator` kwargs, network config
+        `rateLimit` and `burst` take precedence
+    :return: (Scheduler, number of errors of files which are not asset lists)
+    """
+    from .assets_validator import create_assets_validator
+    from .scheduler import Scheduler
 
+    scheduler = Scheduler(stats, workers=jobs)
     error_count = 0
 
-    for file, node in check_list:
-        validator = create_assets_validator(
-            node=node,
-            ignore=ignore,
-            fast=fast,
-            progress=progress
-        )
+    for network, file, node, config in check_list:
+        kwargs = dict(validator_kwargs, node=node, network=network)
+        kwargs['rate_limit'] = config.get('rateLimit', kwargs['rate_limit'])
+        kwargs['burst'] = config.get('burst', kwargs['burst'])
+        validator = create_assets_validator(**kwargs)
 
         data = json.load(file)
+        file.close()
+
+        if not isinstance(data, list):
+            for error in validator.iter_errors(instance=data):
+                logger.error("[E] %s: %s" % (file.name, error.message))
+                error_count += 1
+            continue
+
+        scheduler.add(network, validator, data)
 
-        for error in validator.iter_errors(instance=data):
-            asset_position = error.absolute_path[0]
-            token_name = '%s (%s)' % (
-                data[asset_position].get('name'),
-                data[asset_position].get('symbol')
-            )
+    return scheduler, error_count
+
+
+def _report_results(scheduler, stats=None):
+    """Run scheduler, log errors and record durations.
+
+    :param stats: ValidationStats to record durations to, None to skip recording
+    :return: (number of errors, matched ignore rules)
+    """
+    from .scheduler import asset_key
+
+    error_count = 0
+    ignored = set()
+
+    for result in scheduler.run():
+        asset = result.job.asset
+        token_name = '%s (%s)' % (asset.get('name'), asset.get('symbol'))
+        for error in result.errors:
             field = '.'.join([str(x) for x in error.absolute_path][1:])
             logger.error("[E] %s: %s: %s" % (token_name, field, error.message))
             error_count += 1
 
+        ignored.update(result.ignored)
+        if stats is not None:
+            stats.record(result.job.network, asset_key(asset), result.duration,
+                         result.transfers)
+
+    return error_count, ignored
+
+
+def _validate_distributed(queue_uri, check_list, range_size, block, confirmations, ignore,
+                          gas_percentile, rpc_backend, concurrency, rate_limit, burst):
+    from .assets_validator.contract import ContractValidator
+    from .distributed import Coordinator, Worker, open_queue
+
+    work_queue = open_queue(queue_uri)
+    coordinator = Coordinator(work_queue)
+
+    for network, file, node, config in check_list:
+        assets = json.load(file)
         file.close()
 
+        head_block = ContractValidator(
+            node, block_identifier=block, confirmations=confirmations
+        ).head_block
+        coordinator.submit(network, node, assets, head_block, {
+            'ignore': ignore,
+            'rpc_backend': rpc_backend,
+            'concurrency': concurrency,
+            'rate_limit': config.get('rateLimit', rate_limit),
+            'burst': config.get('burst', burst),
+        }, range_size=range_size)
+
+    worker = Worker(work_queue)
+    try:
+        coordinator.wait(worker)
+    finally:
+        worker.close()
+
+    error_count = 0
+    for network, asset, field, message in coordinator.report(gas_percentile, ignore):
+        token_name = '%s (%s)' % (asset.get('name'), asset.get('symbol'))
+        logger.error("[E] %s: %s: %s" % (token_name, field, message))
+        error_count += 1
+
+    _report_unused_ignore_rules(ignore, coordinator.ignored)
+    return error_count
+
+
+def _report_unused_ignore_rules(ignore, ignored):
+    """Warn about `--ignore` and schema ignore rules not matched by any asset."""
+    from .assets_validator import load_schema
+
+    rules = set(ignore).union(load_schema()['items'].get('isValidContract', {}).get('ignore', []))
+    unused = sorted(rules - set(ignored))
+    if unused:
+        logger.warning("[W] unused ignore rules: %s", ', '.join(unused))
+
+
+def _exit_with_report(error_count):
     if not error_count:
         click.echo("[OK] Validation complete.")
         exit(0)
@@ -101,6 +406,232 @@ def validate(file, node, ignore, fast, loglevel, progress):
     exit(1)
 
 
+@main.command()
+@click.option('--queue', required=True, help="Work queue (SQLite file or uri)")
+@click.option('--poll-interval', type=float, default=5, help="New jobs polling interval (seconds)")  # noqa
+@click.option('--exit-when-empty', is_flag=True, help="Exit when queue has no jobs")
+@click.option('--loglevel', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']), default='INFO')  # noqa
+def worker(queue, poll_interval, exit_when_empty, loglevel):
+    """
+    Process distributed validation jobs.
+
+    Claim jobs enqueued by `validate --queue`, run them (contract checks or gas
+    scan of block range) and store results to queue for coordinator.
+    """
+    from .distributed import Worker, open_queue
+
+    _configure_logging(loglevel)
+
+    worker = Worker(open_queue(queue))
+    logger.info("Worker %s started", worker.worker_id)
+    try:
+        processed = worker.run(stop_when_empty=exit_when_empty, poll_interval=poll_interval)
+    except KeyboardInterrupt:
+        return
+    finally:
+        worker.close()
+    logger.info("%i jobs processed", processed)
+
+
+@main.command()
+@click.option('--host', default='127.0.0.1', help="HTTP API host")
+@click.option('--port', type=int, default=8080, help="HTTP API port")
+@click.option('--poll-interval', type=float, default=15, help="New head polling interval (seconds)")  # noqa
+@click.option('--confirmations', type=int, default=0,
+              help="Number of blocks to step back from head block")
+@click.option('--rpc-backend', type=click.Choice(['web3', 'raw']), default='web3',
+              help="Backend to scan contract TXs with (`raw` bypasses web3 formatters)")
+@click.option('--concurrency', type=CONCURRENCY, default='100',
+              help="Number of receipt requests in flight, or `auto` to tune it to node")
+@click.option('--gas-percentile', type=click.IntRange(1, 100), default=100,
+              help="Default staticGasAmount percentile to report")
+@click.option('--validate-interval', type=click.FloatRange(min=1), default=3600,
+              help="Assets validation interval (seconds)")
+@click.option('--scan-workers', type=click.IntRange(1, None), default=4,
+              help="Number of tokens scanned at once per network")
+@click.option('--loglevel', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']), default='INFO')  # noqa
+def watch(host, port, poll_interval, confirmations, rpc_backend, concurrency, gas_percentile,
+          validate_interval, scan_workers, loglevel):
+    """
+    Keep staticGasAmount statistics of assets current.
+
+    Will look at `assets_index.json` to get network list, validate all assets (again
+    every `--validate-interval` seconds) and scan all contract TXs (`--scan-workers`
+    tokens at once), then follow new blocks and aggregate new TXs only.
+
+    Statistics and validation status are served over HTTP API: `GET /status` for all
+    assets, `GET /networks/<network>/tokens/<address>` for single token. Use `percentile`
+    query argument to get other percentile, for ex. `/status?percentile=95`.
+    """
+    from .watcher import NetworkWatcher, WatchServer
+
+    _configure_logging(loglevel)
+
+    assets_index = _load_assets_index()
+
+    watchers = []
+    for network, config in assets_index.items():
+        with open(config['assets']) as fp:
+            assets = json.load(fp)
+        watchers.append(NetworkWatcher(
+            network, config['node'], assets,
+            poll_interval=poll_interval,
+            validate_interval=validate_interval,
+            scan_workers=scan_workers,
+            confirmations=confirmations,
+            rpc_backend=rpc_backend,
+            concurrency=concurrency,
+            rate_limit=config.get('rateLimit'),
+            burst=config.get('burst'),
+            gas_percentile=gas_percentile
+        ))
+
+    for watcher in watchers:
+        watcher.start()
+
+    server = WatchServer((host, port), watchers, percentile=gas_percentile)
+    click.echo("Serving on http://%s:%i/status" % (host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for watcher in watchers:
+            watcher.stop()
+
+
+@main.command('export-gas')
+@click.argument('file', type=click.File('r'), required=False)
+@click.option('--node', help="Ethereum node to scan `file` contracts TXs with")
+@click.option('--network', default='mainnet', help="Network directory name for `file` assets")
+@click.option('--output', type=click.Path(file_okay=False), required=True,
+              help="Directory to export columns to")
+@click.option('--symbol', multiple=True, help="Export only given token (can be repeated)")
+@click.option('--confirmations', type=int, default=0,
+              help="Number of blocks to step back from head block")
+@click.option('--rpc-backend', type=click.Choice(['web3', 'raw']), default='web3',
+              help="Backend to scan contract TXs with (`raw` bypasses web3 formatters)")
+@click.option('--concurrency', type=CONCURRENCY, default='100',
+              help="Number of receipt requests in flight, or `auto` to tune it to node")
+@click.option('--progress', is_flag=True, default=False, help="Show progressbar")
+@click.option('--loglevel', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']), default='INFO')  # noqa
+def export_gas(file, node, network, output, symbol, confirmations, rpc_backend, concurrency,
+               progress, loglevel):
+    """
+    Export gas used by contract TXs to columnar files.
+
+    Writes `blockNumber.npy`, `gasUsed.npy` and `transactionHash.npy` to
+    `<output>/<network>/<address>/` for every erc-20 asset, ready for
+    `numpy.load(path, mmap_mode='r')`. Export is incremental: next run appends
+    TXs from new blocks only.
+
+    Will look at `assets_index.json` to get network list and related nodes, unless
+    `file` and `--node` provided.
+    """
+    _configure_logging(loglevel)
+
+    if node and file:
+        check_list = [[network, json.load(file), node, {}]]
+    else:
+        check_list = _load_check_list(', and no file and node provided')
+
+    error_count = 0
+    for network, assets, node, config in check_list:
+        contract_validator = _create_export_validator(
+            node, config, progress, rpc_backend, confirmations, concurrency
+        )
+        for asset in _iter_exported_assets(assets, symbol):
+            # symbols are not unique, checksum address is
+            directory = os.path.join(output, network, _asset_address(asset))
+            if not _export_asset(contract_validator, asset, network, directory):
+                error_count += 1
+
+    if not error_count:
+        click.echo("[OK] Export complete.")
+        exit(0)
+
+    click.echo("[FAIL] export failed, see details above.")
+    exit(1)
+
+
+def _load_check_list(reason=''):
+    """[network, assets, node, network config] of every network from assets index."""
+    check_list = []
+    for network, config in _load_assets_index(reason).items():
+        with open(config['assets']) as fp:
+            check_list.append([network, json.load(fp), config['node'], config])
+    return check_list
+
+
+def _create_export_validator(node, config, progress, rpc_backend, confirmations, concurrency):
+    from .assets_validator.contract import ContractValidator
+
+    return ContractValidator(
+        node,
+        progress=progress,
+        rpc_backend=rpc_backend,
+        confirmations=confirmations,
+        concurrency=concurrency,
+        rate_limit=config.get('rateLimit'),
+        burst=config.get('burst')
+    )
+
+
+def _iter_exported_assets(assets, symbols):
+    """erc-20 assets with valid address (of given symbols only, if any)."""
+    from .assets_validator.utils import is_address
+
+    for asset in assets:
+        blockchain_params = asset.get('blockchainParams', {})
+        if blockchain_params.get('type') != 'erc-20':
+            continue
+        if symbols and asset.get('symbol') not in symbols:
+            continue
+        if is_address(blockchain_params.get('address')):
+            yield asset
+
+
+def _asset_address(asset):
+    from .assets_validator.utils import normalize_address
+
+    return normalize_address(asset['blockchainParams']['address'])
+
+
+def _export_asset(contract_validator, asset, network, directory) -> bool:
+    """Export asset TXs, log result.
+
+    :return: True if export succeeded
+    """
+    from .gas_export import export_gas_samples
+
+    try:
+        rows = export_gas_samples(contract_validator, asset, directory)
+    except Exception:
+        logger.exception("[E] %s (%s): export failed", asset['symbol'], network)
+        return False
+    logger.info("%s (%s): %i TXs exported", asset['symbol'], network, rows)
+    return True
+
+
+def _open_cassette(record, replay):
+    from .assets_validator._http_provider import set_cassette
+    from .assets_validator.cassette import Cassette, RECORD, REPLAY
+
+    cassette = Cassette(record, RECORD) if record else Cassette(replay, REPLAY)
+    set_cassette(cassette)
+    atexit.register(cassette.close)
+    return cassette
+
+
+def _load_assets_index(reason=''):
+    if not os.path.exists(INDEX_FILENAME):
+        click.echo('[FAIL] no %s found in current directory%s' % (INDEX_FILENAME, reason))
+        exit(1)
+    with open(INDEX_FILENAME) as fp:
+        return json.load(fp)
+
+
 def _configure_logging(loglevel):
     logging.config.dictConfig({
         'version': 1,
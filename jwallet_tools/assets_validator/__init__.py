@@ -1,3 +1,5 @@
+import threading
+
 from jsonschema import Draft4Validator
 from jsonschema.validators import extend
 
@@ -5,20 +7,59 @@ from .contract import ContractValidator
 from .utils import load_json
 
 
+_lock = threading.Lock()
+_cache = {}
+
+
+def _is_valid_contract(validator, value, instance, schema):
+    """Delegate `isValidContract` to ContractValidator bound to validator instance."""
+    contract_validator = getattr(validator, 'contract_validator', None)
+    if contract_validator is None:
+        return
+    yield from contract_validator(validator, value, instance, schema)
+
+
+def _cached(key, factory):
+    if key not in _cache:
+        with _lock:
+            if key not in _cache:
+                _cache[key] = factory()
+    return _cache[key]
+
+
+def load_schema():
+    """Load assets schema once per process.
+
+    :return: parsed `assets.schema.json`
+    """
+    return _cached('schema', lambda: load_json('assets.schema.json'))
+
+
+def get_assets_validator_class():
+    """Build jsonschema validator class for assets once per process.
+
+    `isValidContract` keyword is dispatched to `contract_validator` attribute of
+    validator instance, so class doesn't depend on node or ignore settings.
+
+    :return: Draft4Validator subclass
+    """
+    return _cached('validator_class', lambda: extend(Draft4Validator, validators={
+        'isValidContract': _is_valid_contract
+    }))
+
+
 def create_assets_validator(*args, **kwargs):
     """ Create validator for assets.
 
-    Add ContractValidator to default jsonschema validator and pass all received
-    arguments to ContractValidator constructor.
+    Bind ContractValidator to cached jsonschema validator class and pass all received
+    arguments to ContractValidator constructor. Validator class and schema are shared
+    between all created validators (and threads).
 
     :param args: see ContractValidator args
     :param kwargs: see ContractValidator kwargs
     :return: jsonschema.Draft4Validator
     """
-    assets_validator = extend(Draft4Validator, validators={
-        'isValidContract': ContractValidator(
-            *args, **kwargs
-        )
-    })
+    validator = get_assets_validator_class()(load_schema())
+    validator.contract_validator = ContractValidator(*args, **kwargs)
 
-    return assets_validator(load_json('assets.schema.json'))
+    return validator
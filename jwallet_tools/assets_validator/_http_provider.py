@@ -1,6 +1,16 @@
 """
 Ugly hack to increase pool size for requests.Session.
+
+Also limit request rate per endpoint (see `set_rate_limit`), limit is shared by
+all requests to endpoint made in process: logs scanning, receipt workers and
+contract calls of all validators.
+
+Requests can be recorded to and replayed from cassette (see `set_cassette`).
 """
+import json
+import threading
+import time
+
 import lru
 import requests
 from requests.adapters import HTTPAdapter
@@ -14,6 +24,104 @@ def _remove_session(key, session):
 
 _session_cache = lru.LRU(8, callback=_remove_session)
 
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+_cassette = None
+
+# responses of these methods change with every block
+VOLATILE_METHODS = frozenset((
+    'eth_blockNumber', 'eth_gasPrice', 'eth_syncing', 'net_peerCount', 'eth_getFilterChanges',
+))
+
+# block tags resolved to different block every time
+VOLATILE_BLOCK_TAGS = frozenset(('latest', 'pending'))
+
+# null result of these methods means "not mined yet" (or node is not synced), not "never"
+PENDING_RESULT_METHODS = frozenset((
+    'eth_getTransactionReceipt', 'eth_getTransactionByHash', 'eth_getBlockByNumber',
+    'eth_getBlockByHash',
+))
+
+
+class TokenBucket:
+
+    """Token bucket rate limiter.
+
+    Allow `rate` requests per second on average and bursts up to `burst` requests.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        _check_rate_limit(rate, burst)
+        self.rate = rate
+        self.burst = burst if burst else max(1, rate)
+        self.clock = clock
+        self.sleep = sleep
+
+        self.tokens = self.burst
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until request is allowed.
+
+        Token is reserved immediately (balance may go negative), so concurrent
+        callers are served in order and each one sleeps only once.
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if delay > 0:
+            self.sleep(delay)
+
+    def configure(self, rate, burst=None):
+        """Change rate and burst, tokens over new burst are dropped."""
+        _check_rate_limit(rate, burst)
+        with self._lock:
+            self.rate = rate
+            self.burst = burst if burst else max(1, rate)
+            self.tokens = min(self.tokens, self.burst)
+
+
+def _check_rate_limit(rate, burst):
+    if rate <= 0:
+        raise ValueError("rate limit must be positive, got %r" % rate)
+    if burst is not None and burst < 1:
+        raise ValueError("burst must be at least 1, got %r" % burst)
+
+
+def set_rate_limit(endpoint_uri, rate, burst=None):
+    """Limit request rate to endpoint.
+
+    Existing limiter is reconfigured (not replaced), so all providers of same
+    endpoint keep sharing one bucket.
+
+    :param endpoint_uri: node uri
+    :param rate: requests per second, remove limit if None
+    :param burst: max requests allowed at once (default: `rate`)
+    """
+    with _rate_limiters_lock:
+        rate_limiter = _rate_limiters.get(endpoint_uri)
+        if rate is None:
+            _rate_limiters.pop(endpoint_uri, None)
+        elif rate_limiter is None:
+            _rate_limiters[endpoint_uri] = TokenBucket(rate, burst)
+        else:
+            rate_limiter.configure(rate, burst)
+
+
+def set_cassette(cassette):
+    """Serve all requests made in process through cassette.
+
+    :param cassette: `Cassette` instance, or None to make requests directly
+    """
+    global _cassette
+    _cassette = cassette
+
 
 def _get_session(*args, **kwargs):
     cache_key = generate_cache_key((args, kwargs))
@@ -26,8 +134,79 @@ def _get_session(*args, **kwargs):
     return _session_cache[cache_key]
 
 
+def is_volatile_request(method, params) -> bool:
+    """Check if response of JSON-RPC request depends on current head block.
+
+    :param method: JSON-RPC method
+    :param params: JSON-RPC params
+    """
+    if method in VOLATILE_METHODS:
+        return True
+    for param in params or ():
+        values = param.values() if isinstance(param, dict) else (param,)
+        if any(isinstance(value, str) and value in VOLATILE_BLOCK_TAGS for value in values):
+            return True
+    return False
+
+
+def is_recordable_response(method, response) -> bool:
+    """Check if JSON-RPC response can be replayed later.
+
+    Errors, non JSON-RPC responses and null results of `PENDING_RESULT_METHODS`
+    are not recordable, they can change on retry.
+
+    :param method: JSON-RPC method
+    :param response: response bytes
+    """
+    try:
+        data = json.loads(response)
+    except ValueError:
+        return False
+    if not isinstance(data, dict) or 'error' in data:
+        return False
+    return method not in PENDING_RESULT_METHODS or data.get('result') is not None
+
+
 def make_post_request(endpoint_uri, data, *args, **kwargs):
+    if _cassette is not None:
+        from .cassette import request_key
+
+        # request id differs from run to run, so it is not a part of key
+        request = json.loads(data)
+        key = request_key('POST', endpoint_uri, request['method'], request['params'])
+        return _cassette.fetch(
+            key, lambda: _make_post_request(endpoint_uri, data, *args, **kwargs),
+            refresh=is_volatile_request(request['method'], request['params']),
+            should_record=lambda response: is_recordable_response(request['method'], response)
+        )
+    return _make_post_request(endpoint_uri, data, *args, **kwargs)
+
+
+def make_get_request(endpoint_uri, *args, **kwargs):
+    if _cassette is not None:
+        from .cassette import request_key
+
+        key = request_key('GET', endpoint_uri, kwargs.get('params'))
+        return _cassette.fetch(
+            key, lambda: _make_get_request(endpoint_uri, *args, **kwargs)
+        )
+    return _make_get_request(endpoint_uri, *args, **kwargs)
+
+
+def _make_get_request(endpoint_uri, *args, **kwargs):
+    kwargs.setdefault('timeout', 10)
+    session = _get_session(endpoint_uri)
+    response = session.get(endpoint_uri, *args, **kwargs)
+    response.raise_for_status()
+
+    return response.content
+
+
+def _make_post_request(endpoint_uri, data, *args, **kwargs):
     kwargs.setdefault('timeout', 10)
+    rate_limiter = _rate_limiters.get(endpoint_uri)
+    if rate_limiter is not None:
+        rate_limiter.acquire()
     session = _get_session(endpoint_uri)
     response = session.post(endpoint_uri, data=data, *args, **kwargs)
     response.raise_for_status()
@@ -36,6 +215,11 @@ def make_post_request(endpoint_uri, data, *args, **kwargs):
 
 
 class CustomHTTPProvider(HTTPProvider):
+    def __init__(self, endpoint_uri=None, request_kwargs=None, rate_limit=None, burst=None):
+        super().__init__(endpoint_uri, request_kwargs)
+        if rate_limit is not None:
+            set_rate_limit(self.endpoint_uri, rate_limit, burst)
+
     def make_request(self, method, params):
         self.logger.debug("Making request HTTP. URI: %s, Method: %s",
                           self.endpoint_uri, method)
@@ -0,0 +1,448 @@
+"""
+Persistent multiplexed connections to co-located nodes (`ipc://`, `ws://`).
+
+One connection per endpoint is shared by all threads in process (web3 provider,
+raw RPC backend of logs scanning and receipt workers). Requests are written as
+soon as they are made, responses are read by single reader thread and matched
+to waiting callers by JSON-RPC id, so many requests are in flight at once
+without HTTP framing and connection pool overhead.
+"""
+import abc
+import base64
+import codecs
+import itertools
+import json
+import logging
+import os
+import re
+import socket
+import ssl
+import struct
+import threading
+from urllib.parse import urlparse
+
+from web3.providers.base import BaseProvider
+
+logger = logging.getLogger(__name__)
+
+IPC_SCHEME = 'ipc'
+WS_SCHEMES = ('ws', 'wss')
+
+DEFAULT_TIMEOUT = 10
+
+RECV_SIZE = 64 * 1024
+
+# characters changing JSON nesting outside of strings, and ending strings inside
+JSON_TOKEN_RE = re.compile(r'["{}\[\]]')
+JSON_STRING_TOKEN_RE = re.compile(r'["\\]')
+
+WS_OPCODE_CONTINUATION = 0x0
+WS_OPCODE_TEXT = 0x1
+WS_OPCODE_BINARY = 0x2
+WS_OPCODE_CLOSE = 0x8
+WS_OPCODE_PING = 0x9
+WS_OPCODE_PONG = 0xA
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def is_socket_uri(endpoint_uri):
+    """Check if node uri must be served by multiplexed connection."""
+    scheme = urlparse(endpoint_uri).scheme
+    return scheme == IPC_SCHEME or scheme in WS_SCHEMES
+
+
+def get_connection(endpoint_uri):
+    """Shared connection to endpoint (created on first use).
+
+    :param endpoint_uri: `ipc:///path/to/geth.ipc`, `ws://host:port/path` or `wss://...`
+    """
+    connection = _connections.get(endpoint_uri)
+    if connection is None:
+        with _connections_lock:
+            connection = _connections.get(endpoint_uri)
+            if connection is None:
+                if urlparse(endpoint_uri).scheme == IPC_SCHEME:
+                    connection = IPCConnection(endpoint_uri)
+                else:
+                    connection = WebSocketConnection(endpoint_uri)
+                _connections[endpoint_uri] = connection
+    return connection
+
+
+class PendingRequest:
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class MultiplexedConnection(abc.ABC):
+
+    """JSON-RPC over persistent stream, many requests in flight.
+
+    Connection is (re)established on request, if reading fails all waiting
+    requests fail with `ConnectionError` and next request reconnects.
+    Subclasses implement transport: `open`, `send` and `receive`.
+    """
+
+    def __init__(self, endpoint_uri):
+        self.endpoint_uri = endpoint_uri
+        self._request_ids = itertools.count()
+        self._pending = {}
+        self._sock = None
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    def request(self, method, params, timeout=DEFAULT_TIMEOUT):
+        """Make JSON-RPC call.
+
+        :param method: RPC method name
+        :param params: RPC method params
+        :param timeout: seconds to wait for response (`TimeoutError` is raised)
+        :return: response dict (with `result` or `error`)
+        """
+        from ._http_provider import _rate_limiters
+
+        rate_limiter = _rate_limiters.get(self.endpoint_uri)
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+
+        request_id = next(self._request_ids)
+        data = json.dumps({
+            'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params
+        }).encode('utf-8')
+
+        pending = self._pending[request_id] = PendingRequest()
+        try:
+            sock = self._connect()
+            try:
+                with self._send_lock:
+                    self.send(sock, data)
+            except OSError:
+                self._disconnect(sock)
+                raise
+            if not pending.event.wait(timeout):
+                raise TimeoutError("No response to %s in %ss (%s)" % (
+                    method, timeout, self.endpoint_uri
+                ))
+        finally:
+            self._pending.pop(request_id, None)
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.response
+
+    def _connect(self):
+        with self._lock:
+            if self._sock is None:
+                self._sock = self.open()
+                threading.Thread(
+                    target=self._read_loop, args=(self._sock,),
+                    name='rpc-reader', daemon=True
+                ).start()
+            return self._sock
+
+    def _disconnect(self, sock=None, error=None):
+        with self._lock:
+            if sock is not None and sock is not self._sock:
+                return
+            if self._sock is not None:
+                try:
+                    self._sock.close()
+                except OSError:
+                    pass
+                self._sock = None
+
+        if error is not None:
+            for pending in list(self._pending.values()):
+                pending.error = error
+                pending.event.set()
+
+    def _read_loop(self, sock):
+        try:
+            for message in self.receive(sock):
+                self._dispatch(message)
+        except Exception as e:
+            logger.debug("Connection to %s closed: %s", self.endpoint_uri, e)
+            error = e if isinstance(e, ConnectionError) else ConnectionError(str(e))
+        else:
+            error = ConnectionError("Connection to %s closed" % self.endpoint_uri)
+        self._disconnect(sock, error)
+
+    def _dispatch(self, message):
+        if isinstance(message, list):
+            for item in message:
+                self._dispatch(item)
+            return
+
+        pending = self._pending.get(message.get('id'))
+        if pending is None:
+            logger.debug("Unexpected message from %s: %s", self.endpoint_uri, message)
+            return
+        pending.response = message
+        pending.event.set()
+
+    @abc.abstractmethod
+    def open(self) -> socket.socket:
+        """Connect to endpoint."""
+
+    @abc.abstractmethod
+    def send(self, sock, data):
+        """Send encoded JSON-RPC request (called under send lock)."""
+
+    @abc.abstractmethod
+    def receive(self, sock):
+        """Iterate over decoded messages until connection is closed."""
+
+
+class IPCConnection(MultiplexedConnection):
+
+    """Unix socket connection (geth/parity IPC), JSON messages one after another."""
+
+    def __init__(self, endpoint_uri):
+        super().__init__(endpoint_uri)
+        parsed = urlparse(endpoint_uri)
+        self.path = parsed.path if not parsed.netloc else parsed.netloc + parsed.path
+
+    def open(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock
+
+    def send(self, sock, data):
+        sock.sendall(data)
+
+    def receive(self, sock):
+        # chunk may end in the middle of multibyte character
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+        splitter = JSONStreamSplitter()
+        while True:
+            chunk = sock.recv(RECV_SIZE)
+            if not chunk:
+                return
+            yield from splitter.feed(text_decoder.decode(chunk))
+
+
+class JSONStreamSplitter:
+
+    """Split stream of concatenated JSON objects (or arrays) to messages.
+
+    Every character is scanned once: nesting depth outside of strings is tracked
+    across chunks and message is decoded only when its top-level bracket is closed,
+    so large responses split to many chunks are not re-parsed from start.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        """Yield messages completed by text.
+
+        :param text: next decoded chunk of stream
+        :raises ValueError: on unbalanced brackets
+        """
+        start = 0
+        # escaped character of string is first one of chunk
+        position = 1 if self._escaped else 0
+        self._escaped = False
+        while True:
+            token_re = JSON_STRING_TOKEN_RE if self._in_string else JSON_TOKEN_RE
+            match = token_re.search(text, position)
+            if match is None:
+                break
+            if self._in_string:
+                position = self._scan_string(text, match)
+                continue
+            token = match.group()
+            position = match.end()
+            if token == '"':
+                self._in_string = True
+            elif token in '{[':
+                if not self._depth:
+                    # whitespace between messages is dropped
+                    start = match.start()
+                self._depth += 1
+            elif not self._depth:
+                raise ValueError("Unexpected %r in JSON stream" % token)
+            else:
+                self._depth -= 1
+                if not self._depth:
+                    self._parts.append(text[start:position])
+                    message = ''.join(self._parts)
+                    self._parts = []
+                    start = position
+                    yield json.loads(message)
+        if self._depth:
+            self._parts.append(text[start:])
+
+    def _scan_string(self, text, match):
+        """Handle token inside of string, return position to continue scan from."""
+        if match.group() == '"':
+            self._in_string = False
+            return match.end()
+        # character after backslash is skipped, it can be in next chunk
+        self._escaped = match.end() == len(text)
+        return match.end() + 1
+
+
+class WebSocketConnection(MultiplexedConnection):
+
+    """WebSocket connection (RFC 6455 client, text frames with JSON messages)."""
+
+    def __init__(self, endpoint_uri):
+        super().__init__(endpoint_uri)
+        parsed = urlparse(endpoint_uri)
+        self.secure = parsed.scheme == 'wss'
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if self.secure else 80)
+        self.resource = parsed.path or '/'
+        if parsed.query:
+            self.resource += '?' + parsed.query
+
+    def open(self):
+        sock = socket.create_connection((self.host, self.port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        sock.sendall((
+            "GET %s HTTP/1.1\r\n"
+            "Host: %s:%i\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            "Sec-WebSocket-Key: %s\r\n"
+            "Sec-WebSocket-Version: 13\r\n"
+            "\r\n" % (self.resource, self.host, self.port, key)
+        ).encode('ascii'))
+
+        response = b''
+        while b'\r\n\r\n' not in response:
+            chunk = sock.recv(1)
+            if not chunk:
+                raise ConnectionError("Handshake with %s failed" % self.endpoint_uri)
+            response += chunk
+        status_line = response.split(b'\r\n', 1)[0]
+        if b' 101 ' not in status_line + b' ':
+            sock.close()
+            raise ConnectionError("Handshake with %s failed: %s" % (
+                self.endpoint_uri, status_line.decode('latin1')
+            ))
+        return sock
+
+    def send(self, sock, data):
+        sock.sendall(encode_frame(WS_OPCODE_TEXT, data))
+
+    def receive(self, sock):
+        rfile = sock.makefile('rb')
+        message = b''
+        while True:
+            opcode, payload = read_frame(rfile)
+            if opcode == WS_OPCODE_CLOSE:
+                return
+            if opcode == WS_OPCODE_PING:
+                with self._send_lock:
+                    sock.sendall(encode_frame(WS_OPCODE_PONG, payload))
+                continue
+            if opcode == WS_OPCODE_PONG:
+                continue
+
+            message += payload
+            if opcode & 0x80:  # FIN
+                yield json.loads(message.decode('utf-8'))
+                message = b''
+
+
+def encode_frame(opcode, payload):
+    """Encode single final client frame (masked, as required for clients)."""
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([0x80 | length])
+    elif length < 2 ** 16:
+        header += bytes([0x80 | 126]) + struct.pack('>H', length)
+    else:
+        header += bytes([0x80 | 127]) + struct.pack('>Q', length)
+
+    mask = os.urandom(4)
+    mask_stream = (mask * (length // 4 + 1))[:length]
+    masked = (
+        int.from_bytes(payload, 'big') ^ int.from_bytes(mask_stream, 'big')
+    ).to_bytes(length, 'big')
+    return header + mask + masked
+
+
+def read_frame(rfile):
+    """Read single frame.
+
+    :return: (opcode with FIN bit 0x80 for data frames, payload)
+    """
+    def read(size):
+        data = rfile.read(size)
+        if len(data) < size:
+            raise ConnectionError("WebSocket connection closed")
+        return data
+
+    first, second = read(2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length, = struct.unpack('>H', read(2))
+    elif length == 127:
+        length, = struct.unpack('>Q', read(8))
+    mask = read(4) if second & 0x80 else None
+
+    payload = read(length)
+    if mask is not None:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+
+    if opcode in (WS_OPCODE_TEXT, WS_OPCODE_BINARY, WS_OPCODE_CONTINUATION):
+        opcode |= first & 0x80
+    return opcode, payload
+
+
+class SocketProvider(BaseProvider):
+
+    """web3 provider over shared multiplexed connection."""
+
+    def __init__(self, endpoint_uri, timeout=DEFAULT_TIMEOUT, rate_limit=None, burst=None):
+        from ._http_provider import set_rate_limit
+
+        self.endpoint_uri = endpoint_uri
+        self.timeout = timeout
+        if rate_limit is not None:
+            set_rate_limit(endpoint_uri, rate_limit, burst)
+
+    def make_request(self, method, params):
+        logger.debug("Making request. URI: %s, Method: %s", self.endpoint_uri, method)
+        return get_connection(self.endpoint_uri).request(method, params, self.timeout)
+
+    def isConnected(self):
+        try:
+            response = self.make_request('web3_clientVersion', [])
+        except (OSError, ValueError):
+            return False
+        return 'error' not in response
+
+
+def make_provider(endpoint_uri, timeout=DEFAULT_TIMEOUT, rate_limit=None, burst=None):
+    """Create web3 provider for node uri.
+
+    :param endpoint_uri: `http(s)://`, `ipc://` or `ws(s)://` node uri
+    :param timeout: request timeout
+    :param rate_limit: max requests per second to node
+    :param burst: max requests to node allowed at once
+    """
+    if is_socket_uri(endpoint_uri):
+        return SocketProvider(endpoint_uri, timeout, rate_limit=rate_limit, burst=burst)
+
+    from ._http_provider import CustomHTTPProvider
+
+    return CustomHTTPProvider(endpoint_uri, request_kwargs={'timeout': timeout},
+                              rate_limit=rate_limit, burst=burst)
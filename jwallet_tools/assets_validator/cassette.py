@@ -0,0 +1,228 @@
+"""
+Record/replay storage for node (and coinmarketcap) responses.
+
+Cassette is two files:
+
+- `<path>` - zlib compressed responses appended one after another
+- `<path>.idx` - fixed width records `(sha1 key, offset, length)` sorted by key
+
+Replay mode serves responses from memory mapped index (binary search, no
+parsing on open), so replaying millions of receipts costs one lookup and one
+read per request. Record mode serves already recorded responses and appends
+missing ones, so same cassette is also usable as a warm cache. Responses which
+change over time (e.g. head block) are requested again and replace recorded
+ones. Index is rewritten every `FLUSH_INTERVAL` seconds while recording and on
+`close`, so interrupted recording loses at most last few responses.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+INDEX_SUFFIX = '.idx'
+
+KEY_SIZE = 20
+
+INDEX_RECORD = struct.Struct('>%isQI' % KEY_SIZE)
+
+# seconds between index rewrites while recording
+FLUSH_INTERVAL = 30
+
+
+class CassetteMiss(LookupError):
+
+    """Response is not recorded (raised in replay mode)."""
+
+
+def request_key(*parts) -> bytes:
+    """Key of request: sha1 of canonical json of request parts.
+
+    :param parts: json serializable request parts (endpoint, method, params...)
+    """
+    data = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(data.encode('utf-8')).digest()
+
+
+class Cassette:
+
+    """Compressed indexed storage of request/response pairs."""
+
+    def __init__(self, path, mode=REPLAY):
+        """Constructor.
+
+        :param path: data file path (index is stored next to it)
+        :param mode: `replay` (read only, misses raise `CassetteMiss`) or `record`
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError("unknown cassette mode %r" % mode)
+
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.mode = mode
+
+        if mode == REPLAY:
+            self._data = open(path, 'rb', buffering=0)
+        else:
+            self._data = open(path, 'a+b', buffering=0)
+        self._size = os.fstat(self._data.fileno()).st_size
+
+        self._index = None
+        if os.path.exists(self.index_path) and os.path.getsize(self.index_path):
+            self._index = self._open_index()
+        elif mode == REPLAY:
+            raise FileNotFoundError("cassette index %s not found" % self.index_path)
+
+        # responses recorded since last flush: key -> (offset, length)
+        self._recorded = {}
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._index_keys() | set(self._recorded))
+
+    def _open_index(self):
+        with open(self.index_path, 'rb') as fp:
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def _index_size(index):
+        return len(index) // INDEX_RECORD.size if index is not None else 0
+
+    def _index_records(self):
+        index = self._index
+        return [
+            INDEX_RECORD.unpack_from(index, position)
+            for position in range(0, self._index_size(index) * INDEX_RECORD.size,
+                                  INDEX_RECORD.size)
+        ]
+
+    def _index_keys(self):
+        return {key for key, _, _ in self._index_records()}
+
+    def _lookup(self, key):
+        location = self._recorded.get(key)
+        if location is not None:
+            return location
+
+        # index is replaced (not changed) on flush, local reference stays valid
+        index = self._index
+        if index is None:
+            return None
+
+        low, high = 0, self._index_size(index)
+        while low < high:
+            middle = (low + high) // 2
+            position = middle * INDEX_RECORD.size
+            middle_key = index[position:position + KEY_SIZE]
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                return INDEX_RECORD.unpack_from(index, position)[1:]
+        return None
+
+    def get(self, key):
+        """Recorded response.
+
+        :param key: request key (see `request_key`)
+        :return: response bytes or None if not recorded
+        """
+        location = self._lookup(key)
+        if location is None:
+            return None
+        offset, length = location
+        return zlib.decompress(os.pread(self._data.fileno(), length, offset))
+
+    def put(self, key, response, replace=False):
+        """Record response.
+
+        :param key: request key (see `request_key`)
+        :param response: response bytes
+        :param replace: replace already recorded response (kept as is by default)
+        """
+        if self.mode != RECORD:
+            raise ValueError("cassette %s is opened for replay" % self.path)
+
+        compressed = zlib.compress(response)
+        with self._lock:
+            if not replace and self._lookup(key) is not None:
+                return
+            offset = self._size
+            self._data.write(compressed)
+            self._size += len(compressed)
+            self._recorded[key] = (offset, len(compressed))
+
+            if time.monotonic() - self._flushed_at >= FLUSH_INTERVAL:
+                self._flush()
+
+    def fetch(self, key, request, refresh=False, should_record=None):
+        """Get recorded response or make request (and record it in record mode).
+
+        :param key: request key (see `request_key`)
+        :param request: callable making real request, returns response bytes
+        :param refresh: response changes over time: in record mode always make
+            request and replace recorded response
+        :param should_record: callable checking if response can be recorded
+            (e.g. not an error), all responses are recorded by default
+        :return: response bytes
+        """
+        if not (refresh and self.mode == RECORD):
+            response = self.get(key)
+            if response is not None:
+                return response
+        if self.mode == REPLAY:
+            raise CassetteMiss("request %s is not recorded in %s" % (key.hex(), self.path))
+
+        response = request()
+        if should_record is None or should_record(response):
+            self.put(key, response, replace=refresh)
+        return response
+
+    def flush(self):
+        """Write index of responses recorded since last flush."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Write index of recorded responses and close files."""
+        with self._lock:
+            self._flush()
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+            self._data.close()
+
+    def _flush(self):
+        self._flushed_at = time.monotonic()
+        if not self._recorded:
+            return
+
+        records = dict(
+            (key, (offset, length)) for key, offset, length in self._index_records()
+        )
+        records.update(self._recorded)
+
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'wb') as fp:
+            for key, (offset, length) in sorted(records.items()):
+                fp.write(INDEX_RECORD.pack(key, offset, length))
+        os.replace(tmp_path, self.index_path)
+
+        # readers may still use old index: it is closed when released
+        self._index = self._open_index()
+        self._recorded = {}
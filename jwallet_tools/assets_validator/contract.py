@@ -1,23 +1,21 @@
+import json
 import logging
-
-import requests
+import random
+import threading
 
 from jsonschema import ValidationError
 
-from web3 import Web3
-from web3.exceptions import BadFunctionCallOutput
-from web3.utils.events import construct_event_topic_set
-
-from ..blockexplorer.events import EventReceiptIterator
+from ..profiling import scoped
 
 from .utils import (
     IgnoreLoggerAdapter,
+    IgnoreRules,
+    is_address,
     normalize_address,
     make_signature,
     signature_exist,
     load_json
 )
-from ._http_provider import CustomHTTPProvider
 
 
 logger = logging.getLogger(__name__)
@@ -26,10 +24,20 @@ NODE_REQUEST_TIMEOUT = 3
 
 LAST_HARD_FORK_BLOCK = 4370000
 
+SAMPLE_WINDOWS = 20
+SAMPLE_WINDOW_SIZE = 1000
+SAMPLE_CONFIDENCE = 0.95
+
 ERC20_ABI = load_json('erc20_abi.json')
 
 TRANSFER_ABI = list(filter(lambda x: x.get('name') == 'Transfer', ERC20_ABI))[0]
 
+# (name, signature, has no inputs) for every ERC20 function
+ERC20_METHODS = [
+    (method['name'], make_signature(method['name'], method['inputs']), method['inputs'] == [])
+    for method in ERC20_ABI if method.get('type') == 'function'
+]
+
 
 class ContractValidator:
 
@@ -42,33 +50,179 @@ class ContractValidator:
     - contract has ERC20 methods and signature matched
     - decimals stored in json equals to actual contract decimals
 
-    Also calculate and check `staticGasAmount` if `fast is True`.
+    Also calculate and check `staticGasAmount` if `fast is not True`.
+
+    Heavy dependencies (web3, requests, tqdm, tdigest) are imported lazily, so
+    fast validation neither loads them nor touches the network.
+
+    Instance can be shared across threads: log context is stored per thread.
     """
 
     gas_amount_percentile = 100
 
-    def __init__(self, node, ignore=None, fast=False, progress=False):
+    def __init__(self, node, ignore=None, fast=False, progress=False, rpc_backend='web3',
+                 block_identifier=None, confirmations=0, concurrency=100, rate_limit=None,
+                 burst=None, gas_percentile=None, gas_estimation='full',
+                 sample_windows=SAMPLE_WINDOWS, sample_window_size=SAMPLE_WINDOW_SIZE,
+                 gas_window_transfers=None, gas_window_blocks=None, check_gas=True,
+                 network=None, processes=None):
         """Constructor.
 
-        :param node: ethereum node to use
+        :param node: ethereum node to use (`http(s)://`, `ipc://` or `ws(s)://` uri)
         :param ignore: list of ignored contract methods
-        :param fast: do not invoke methods to test
-        :param quiet: do not output ignore logs (if True)
+        :param fast: do not invoke methods to test and stay offline
+        :param progress: show progressbar while scanning contract TXs
+        :param rpc_backend: backend to scan contract TXs with, `web3`, `raw`
+                            (raw JSON-RPC, bypass web3 formatters) or `process`
+                            (raw JSON-RPC, receipts fetched on worker processes)
+        :param block_identifier: block number to validate contracts at, by default
+                                 head block is pinned on first use
+        :param confirmations: number of blocks to step back from pinned head
+        :param concurrency: number of receipt requests in flight, or `auto`
+                            (see EventReceiptIterator)
+        :param rate_limit: max requests per second to node (shared by all node requests)
+        :param burst: max requests to node allowed at once
+        :param gas_percentile: staticGasAmount percentile to check (default: P100)
+        :param gas_estimation: `full` scan or `sample` random block windows (fallback
+                               to full scan if sample result is inconclusive)
+        :param sample_windows: number of sampled windows per fork range
+        :param sample_window_size: number of blocks in sampled window
+        :param gas_window_transfers: check staticGasAmount by last N transfers only
+        :param gas_window_blocks: check staticGasAmount by last N blocks only
+        :param check_gas: validate staticGasAmount (scan contract TXs)
+        :param network: network name to apply network scoped ignore rules
+        :param processes: number of receipt worker processes of `process` backend
+                          (default: CPU count)
         """
         self.node = node
         self.ignore = set() if ignore is None else set(ignore)
         self.fast = fast
         self.progress = progress
+        self.rpc_backend = rpc_backend
+        self.block_identifier = block_identifier
+        self.confirmations = confirmations
+        self.concurrency = concurrency
+        if gas_percentile is not None:
+            self.gas_amount_percentile = gas_percentile
+        self.gas_estimation = gas_estimation
+        self.sample_windows = sample_windows
+        self.sample_window_size = sample_window_size
+        self.gas_window_transfers = gas_window_transfers
+        self.gas_window_blocks = gas_window_blocks
+        self.check_gas = check_gas
+        self.network = network
+        self.processes = processes
+        self.rate_limit = rate_limit
+        self.burst = burst
+
+        self._local = threading.local()
+        self._head_lock = threading.Lock()
+        # frozenset of rules -> IgnoreRules
+        self._ignore_rules = {}
+        self._ignore_rules_lock = threading.Lock()
+        self._receipt_pool = None
+        self._pool_lock = threading.Lock()
+
+        self.web3 = None
+        self._cmc_assets = None
+        self._cmc_lock = threading.Lock()
+
+        if not self.fast:
+            from web3 import Web3
+            from ._socket_provider import make_provider
+
+            self.web3 = Web3(make_provider(
+                self.node, NODE_REQUEST_TIMEOUT, rate_limit=rate_limit, burst=burst
+            ))
+
+    @property
+    def head_block(self) -> int:
+        """Block all contracts are validated at.
 
-        self.log = IgnoreLoggerAdapter(logger, extra={})
+        Resolved once per validator (i.e. per network), so all assets are scanned
+        to the same head and results are reproducible.
+        """
+        if self.block_identifier is None:
+            with self._head_lock:
+                if self.block_identifier is None:
+                    self.block_identifier = self.web3.eth.blockNumber - self.confirmations
+                    logger.info("Validate at block %i (%s)", self.block_identifier, self.node)
+        return self.block_identifier
+
+    def create_rpc_backend(self):
+        """Create backend for event iterators regarding to `rpc_backend` option."""
+        from ..blockexplorer.rpc import RawRPCBackend, Web3Backend
+
+        if self.rpc_backend in ('raw', 'process'):
+            return RawRPCBackend(self.node, timeout=NODE_REQUEST_TIMEOUT)
+        return Web3Backend(self.web3)
+
+    @property
+    def receipt_pool(self):
+        """Receipt worker processes of `process` backend (started on first use)."""
+        if self._receipt_pool is None:
+            with self._pool_lock:
+                if self._receipt_pool is None:
+                    from ..blockexplorer.processes import ReceiptProcessPool
+
+                    self._receipt_pool = ReceiptProcessPool(
+                        self.node, self.processes, timeout=NODE_REQUEST_TIMEOUT,
+                        rate_limit=self.rate_limit, burst=self.burst
+                    )
+        return self._receipt_pool
+
+    def close(self):
+        """Shut down receipt worker processes (if started)."""
+        with self._pool_lock:
+            pool, self._receipt_pool = self._receipt_pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def get_ignore_rules(self, value) -> IgnoreRules:
+        """Ignore rules of validator merged with schema ones, compiled once per schema list.
+
+        :param value: validator config from schema
+        """
+        # schema lists are few, so tuple of one is cheap key (no union per asset)
+        key = tuple(value.get('ignore', ()))
+        rules = self._ignore_rules.get(key)
+        if rules is None:
+            with self._ignore_rules_lock:
+                rules = self._ignore_rules.get(key)
+                if rules is None:
+                    rules = self._ignore_rules[key] = IgnoreRules(self.ignore.union(key))
+        return rules
+
+    def set_log_context(self, instance, value, network=None):
+        """Bind asset and ignored methods to log of current thread.
+
+        :param value: validator config from schema
+        :param instance: contract dict from json
+        :param network: network name (default: network of validator)
+        """
+        self.log.extra = {
+            'token': instance,
+            'ignore': self.get_ignore_rules(value),
+            'network': network or self.network,
+            'ignored': set(),
+        }
 
-        self.web3 = Web3(CustomHTTPProvider(self.node, request_kwargs={
-            'timeout': NODE_REQUEST_TIMEOUT
-        }))
+    @property
+    def ignored(self) -> set:
+        """Ignore rules matched by last validation in current thread."""
+        return self.log.extra.get('ignored', set())
 
-        self._cmc_assets = {}
+    @property
+    def transfers(self) -> int:
+        """Number of contract TXs scanned by last validation in current thread."""
+        return getattr(self._local, 'transfers', 0)
 
-        self.load_coinmarketcap_assets()
+    @property
+    def log(self) -> IgnoreLoggerAdapter:
+        log = getattr(self._local, 'log', None)
+        if log is None:
+            log = self._local.log = IgnoreLoggerAdapter(logger, extra={})
+        return log
 
     def __call__(self, validator, value, instance, schema):
         """Validate whole contract consistency.
@@ -76,15 +230,13 @@ class ContractValidator:
         :param value: validator config from schema
         :param instance: contract dict from json
         """
+        self.set_log_context(instance, value)
+        self._local.transfers = 0
+
         blockchain_params = instance.get('blockchainParams', {})
         if blockchain_params.get('type') != 'erc-20':
             return
 
-        self.log.extra = {
-            'token': instance,
-            'ignore': self.ignore.union(value.get('ignore', set()))
-        }
-
         self.log.info("%s validation", instance.get('symbol'))
 
         address = blockchain_params.get('address')
@@ -93,17 +245,17 @@ class ContractValidator:
             yield ValidationError('`address` is required')
             return
 
-        if not self.web3.isAddress(address):
+        if not is_address(address):
             yield ValidationError("%s is not an address" % address)
             return
 
         address = normalize_address(address)
 
-        yield from self.compare_with_coinmarketcap(instance['symbol'], address)
-
         if not self.fast:
+            yield from self.compare_with_coinmarketcap(instance['symbol'], address)
+
             contract = self.web3.eth.contract(address, abi=ERC20_ABI)
-            code = self.web3.eth.getCode(address)
+            code = self.web3.eth.getCode(address, self.head_block)
             if not code:
                 yield from self.log.if_ignored("code", "Contract code is empty")
                 return
@@ -112,6 +264,9 @@ class ContractValidator:
 
             yield from self.validate_decimals(contract, blockchain_params.get('decimals'))
 
+            if not self.check_gas:
+                return
+
             deployment_block = blockchain_params.get('deploymentBlockNumber', 0)
 
             logger.debug("Validate static gas amount from %i block", deployment_block)
@@ -121,6 +276,7 @@ class ContractValidator:
                 from_block=deployment_block
             )
 
+    @scoped('coinmarketcap')
     def compare_with_coinmarketcap(self, symbol, address):
         cmc_asset = self.get_coinmarketcap_asset(symbol)
 
@@ -155,6 +311,7 @@ class ContractValidator:
                     'No platform info for %s symbol' % symbol
                 )
 
+    @scoped('methods')
     def validate_methods(self, contract, code):
         """Validate contract ERC20 methods.
 
@@ -165,33 +322,32 @@ class ContractValidator:
         :param code: contract byte-code
         :return:
         """
-        for method in ERC20_ABI:
-            method_name = method.get('name')
-
-            # skip if not a function
-            if method.get('type') != 'function':
-                continue
-
-            yield from self.validate_signature(code, method_name, method['inputs'])
+        for method_name, signature, no_inputs in ERC20_METHODS:
+            yield from self.validate_signature(code, method_name, signature)
 
             # call method if no arguments required and `fast` is not True
             # also do not invoke decimals because it invoked in validate_deciamals
-            if self.fast or method.get('inputs') != [] or method_name == 'decimals':
+            if self.fast or not no_inputs or method_name == 'decimals':
                 continue
 
             try:
-                getattr(contract.functions, method_name)().call()
+                getattr(contract.functions, method_name)().call(
+                    block_identifier=self.head_block
+                )
             except Exception as e:
                 yield from self.log.if_ignored(method_name, str(e))
 
+    @scoped('decimals')
     def validate_decimals(self, contract, expected):
         """Check that decimals defined in json equals to actual value.
 
         :param contract: Contract instance
         :param expected: expected decimals value
         """
+        from web3.exceptions import BadFunctionCallOutput
+
         try:
-            actual = contract.functions.decimals().call()
+            actual = contract.functions.decimals().call(block_identifier=self.head_block)
 
             if actual != expected:
                 yield ValidationError(
@@ -204,29 +360,58 @@ class ContractValidator:
         except BadFunctionCallOutput as e:
             yield from self.log.if_ignored('decimals', str(e))
 
+    @scoped('staticGasAmount')
     def validate_static_gas_amount(self, contract, expected_max_gas, from_block):
         """Validate gas amount.
 
-        Iterate over contract TXs using EventReceiptIterator.
+        Iterate over contract TXs using EventReceiptIterator. With `sample` gas
+        estimation try to decide by sampled TXs first (see `estimate_static_gas_amount`).
+
+        If gas window is configured, only recent TXs are checked: blocks are scanned
+        backwards from head and scan stops after `gas_window_transfers` TXs or
+        `gas_window_blocks` blocks.
 
         :param contract: Contract instance to validate
         :param expected_max_gas: expected static gas amount (from source json)
         """
         from .utils import RangedTDigest
-        to_block = self.web3.eth.blockNumber
-        per_fork_tdigest = RangedTDigest([LAST_HARD_FORK_BLOCK, to_block])
 
-        topics = construct_event_topic_set(TRANSFER_ABI,
-                                           dict(to=contract.address))
+        to_block = self.head_block
+        topics = self.transfer_topics(contract.address)
 
-        receipts = EventReceiptIterator(
-            self.web3, contract.address, from_block, to_block, topics,
-            progress=self.progress, progress_title='staticGasAmount'
+        if self.gas_window_blocks:
+            from_block = max(from_block, to_block - self.gas_window_blocks + 1)
+        recent_window = bool(self.gas_window_blocks or self.gas_window_transfers)
+
+        if self.gas_estimation == 'sample' and self.gas_amount_percentile < 100:
+            conclusive = yield from self.estimate_static_gas_amount(
+                contract.address, topics, expected_max_gas, from_block, to_block
+            )
+            if conclusive:
+                return
+            self.log.info("staticGasAmount estimation is inconclusive, scan all TXs")
+
+        per_fork_tdigest = RangedTDigest([LAST_HARD_FORK_BLOCK, to_block])
+
+        receipts = self.iter_receipts(
+            contract.address, topics, from_block, to_block,
+            reverse=recent_window, limit=self.gas_window_transfers
         )
 
+        transfers = 0
         for tx in receipts:
             per_fork_tdigest.update(tx.blockNumber, tx.gasUsed)
+            transfers += 1
+        self._local.transfers = self.transfers + transfers
+
+        yield from self.check_static_gas_amount(per_fork_tdigest, expected_max_gas)
+
+    def check_static_gas_amount(self, per_fork_tdigest, expected_max_gas):
+        """Compare gas amount percentile of scanned TXs with expected one.
 
+        :param per_fork_tdigest: RangedTDigest of contract TXs gas used
+        :param expected_max_gas: expected static gas amount (from source json)
+        """
         self.log.info("staticGasAmount (before block): %s",
                       ", ".join([f"{p} ({r})"
                                  for r, p in per_fork_tdigest.all(self.gas_amount_percentile)]))
@@ -241,26 +426,145 @@ class ContractValidator:
                 )
             )
 
-    def validate_signature(self, code, method_name, inputs):
+    def estimate_static_gas_amount(self, address, topics, expected_max_gas, from_block,
+                                   to_block):
+        """Estimate gas amount percentile by TXs from random block windows.
+
+        Windows are sampled in every fork range, percentile confidence interval is
+        calculated per range by resampling windows (TXs of window are not
+        independent). Error is yielded if whole interval is above expected
+        gas amount. Range without TXs in sampled windows makes estimation
+        inconclusive (unless other range already fails).
+
+        :param address: contract address
+        :param topics: Transfer event topics
+        :param expected_max_gas: expected static gas amount (from source json)
+        :param from_block: first block to sample from
+        :param to_block: last block to sample from
+        :return: True if interval doesn't contain expected gas amount
+        """
+        from .sampling import cluster_percentile_interval, stratified_windows
+
+        rng = random.Random('%s:%i' % (address, to_block))
+        windows = stratified_windows(
+            from_block, to_block, [LAST_HARD_FORK_BLOCK, to_block],
+            self.sample_windows, self.sample_window_size, rng
+        )
+
+        intervals = []
+        unsampled = []
+        for range_end, range_windows in windows.items():
+            if not range_windows:
+                # no blocks of range after from_block
+                continue
+            gas_used = [
+                [tx.gasUsed for tx in self.iter_receipts(address, topics, window_from, window_to)]
+                for window_from, window_to in range_windows
+            ]
+            transfers = sum(len(window) for window in gas_used)
+            self._local.transfers = self.transfers + transfers
+
+            if not transfers:
+                self.log.info("staticGasAmount estimation (before block %i): no TXs in "
+                              "sampled windows", range_end)
+                unsampled.append(range_end)
+                continue
+
+            estimate, lower, upper = cluster_percentile_interval(
+                gas_used, self.gas_amount_percentile, SAMPLE_CONFIDENCE, rng=rng
+            )
+            self.log.info("staticGasAmount estimation (before block %i): %i [%s, %s] "
+                          "by %i TXs of %i windows", range_end, estimate, lower, upper,
+                          transfers, len(range_windows))
+            intervals.append((estimate, lower, upper))
+
+        if not intervals:
+            return False
+
+        estimate, lower, upper = [max(x) for x in zip(*intervals)]
+        if upper <= expected_max_gas and not unsampled:
+            return True
+
+        if lower > expected_max_gas:
+            yield from self.log.if_ignored(
+                "staticGasAmount",
+                "Expected %i gas but %i estimated (P%i, interval %s..%s with %s confidence)" % (
+                    expected_max_gas, estimate, self.gas_amount_percentile,
+                    lower, upper, SAMPLE_CONFIDENCE
+                )
+            )
+            return True
+
+        return False
+
+    def transfer_topics(self, address):
+        """Make topics to filter contract Transfer events with.
+
+        :param address: contract address
+        """
+        from web3.utils.events import construct_event_topic_set
+
+        return construct_event_topic_set(TRANSFER_ABI, dict(to=address))
+
+    def iter_receipts(self, address, topics, from_block, to_block, reverse=False, limit=None,
+                      fields=('blockNumber', 'gasUsed'), progress_title='staticGasAmount'):
+        """Iterate over compact receipts of contract TXs.
+
+        :param address: contract address
+        :param topics: event topics to filter TXs with
+        :param from_block: first block to scan
+        :param to_block: last block to scan
+        :param reverse: scan from `to_block` backwards
+        :param limit: stop after number of TXs
+        :param fields: receipt fields to keep (blockNumber and gasUsed by default)
+        :param progress_title: progressbar title
+        """
+        if self.rpc_backend == 'process':
+            from ..blockexplorer.processes import RECEIPT_FIELDS, ProcessReceiptIterator
+
+            # worker processes return blockNumber and gasUsed only
+            if tuple(fields) == RECEIPT_FIELDS:
+                return ProcessReceiptIterator(
+                    self.web3, address, from_block, to_block, topics,
+                    progress=self.progress, progress_title=progress_title,
+                    backend=self.create_rpc_backend(), reverse=reverse, limit=limit,
+                    pool=self.receipt_pool
+                )
+
+        from ..blockexplorer.events import EventReceiptIterator
+
+        return EventReceiptIterator(
+            self.web3, address, from_block, to_block, topics,
+            progress=self.progress, progress_title=progress_title,
+            backend=self.create_rpc_backend(), fields=fields,
+            concurrency=self.concurrency, reverse=reverse, limit=limit
+        )
+
+    def validate_signature(self, code, method_name, signature):
         """Validate contract ERC20 method signature.
 
         :param code: contract byte-code
         :param method_name: method name from abi
-        :param inputs: input list from abi
+        :param signature: method signature (see `make_signature`)
         """
-        signature = make_signature(method_name, inputs)
         if not signature_exist(code, signature):
             msg = "signature %s not found" % signature
             yield from self.log.if_ignored(method_name, msg)
 
     def load_coinmarketcap_assets(self):
-        resp = requests.get(
+        from ._http_provider import make_get_request
+
+        content = make_get_request(
             "https://pro-api.coinmarketcap.com/v1/cryptocurrency/map",
             headers={
                 'X-CMC_PRO_API_KEY': 'd5aabba1-39a5-466a-87cd-913a4911df5f'
             }
         )
-        self._cmc_assets = {item['symbol']: item for item in resp.json()['data']}
+        self._cmc_assets = {item['symbol']: item for item in json.loads(content)['data']}
 
     def get_coinmarketcap_asset(self, symbol):
+        # loaded on first use, so validator used only to scan TXs stays off coinmarketcap
+        with self._cmc_lock:
+            if self._cmc_assets is None:
+                self.load_coinmarketcap_assets()
         return self._cmc_assets.get(symbol)
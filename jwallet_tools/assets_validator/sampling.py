@@ -0,0 +1,152 @@
+"""
+Sampling-based percentile estimation.
+
+Instead of full history scan, receipts are fetched for transfers from random
+block windows only. Windows are stratified by ranges (same ranges as
+`RangedTDigest` uses), so every range is represented in sample.
+
+TXs of one window are not independent (same period, often same senders), so
+sample is a cluster sample and confidence interval of percentile is computed
+by resampling whole windows (see `cluster_percentile_interval`).
+"""
+import math
+import random
+from typing import Dict, List, Sequence, Tuple
+
+
+# two-sided z-scores for supported confidence levels
+Z_SCORES = {
+    0.9: 1.645,
+    0.95: 1.96,
+    0.99: 2.576,
+}
+
+# bootstrap resamples of windows
+BOOTSTRAP_RESAMPLES = 200
+
+
+def sample_windows(from_block: int, to_block: int, count: int, window_size: int,
+                   rng=random) -> List[Tuple[int, int]]:
+    """Pick random non-overlapping block windows.
+
+    Whole interval is returned as single window if it is not longer than all
+    windows together.
+
+    :param from_block: first block of interval
+    :param to_block: last block of interval
+    :param count: number of windows
+    :param window_size: number of blocks in window
+    :param rng: random generator
+    :return: sorted list of (from_block, to_block) windows
+    """
+    if from_block > to_block:
+        return []
+
+    slots = (to_block - from_block + 1) // window_size
+    if slots <= count:
+        return [(from_block, to_block)]
+
+    windows = []
+    for slot in sorted(rng.sample(range(slots), count)):
+        window_from = from_block + slot * window_size
+        windows.append((window_from, window_from + window_size - 1))
+    return windows
+
+
+def stratified_windows(from_block: int, to_block: int, ranges: Sequence[int], count: int,
+                       window_size: int, rng=random) -> Dict[int, List[Tuple[int, int]]]:
+    """Pick random block windows in every range.
+
+    :param from_block: first block to sample from
+    :param to_block: last block to sample from
+    :param ranges: range ends (exclusive), see RangedTDigest
+    :param count: number of windows per range
+    :param window_size: number of blocks in window
+    :param rng: random generator
+    :return: windows by range end
+    """
+    result = {}
+    range_start = 0
+    for range_end in sorted(ranges):
+        result[range_end] = sample_windows(
+            max(from_block, range_start), min(to_block, range_end - 1),
+            count, window_size, rng
+        )
+        range_start = range_end
+    return result
+
+
+def percentile_interval(values: Sequence[float], percentile: float,
+                        confidence: float = 0.95) -> Tuple[float, float, float]:
+    """Estimate percentile with distribution-free confidence interval.
+
+    Values are assumed to be independent draws (see `cluster_percentile_interval`
+    for values sampled in windows). Interval bounds are order statistics, ranks
+    are chosen with normal approximation of binomial distribution. Bound is
+    infinite if sample is too small to limit percentile from that side.
+
+    :param values: sample
+    :param percentile: percentile to estimate (0-100)
+    :param confidence: confidence level, see Z_SCORES
+    :return: (estimate, lower bound, upper bound)
+    """
+    values = sorted(values)
+    n = len(values)
+    q = percentile / 100
+    estimate = _interpolated(values, q)
+
+    spread = Z_SCORES[confidence] * math.sqrt(n * q * (1 - q))
+    lower_rank = int(math.floor(n * q - spread))
+    upper_rank = int(math.ceil(n * q + spread)) + 1
+
+    lower = values[lower_rank - 1] if lower_rank >= 1 else float('-inf')
+    upper = values[upper_rank - 1] if upper_rank <= n else float('inf')
+    return estimate, lower, upper
+
+
+def cluster_percentile_interval(clusters: Sequence[Sequence[float]], percentile: float,
+                                confidence: float = 0.95, resamples: int = BOOTSTRAP_RESAMPLES,
+                                rng=random) -> Tuple[float, float, float]:
+    """Estimate percentile of cluster sample (values of sampled block windows).
+
+    Interval is cluster bootstrap interval (windows are resampled with
+    replacement) widened to order statistics interval of pooled values, so it
+    stays infinite on side sample is too small for. Single cluster is the whole
+    population (see `sample_windows`), so its interval is not widened by
+    bootstrap.
+
+    :param clusters: values of every sampled window (windows without values allowed)
+    :param percentile: percentile to estimate (0-100)
+    :param confidence: confidence level, see Z_SCORES
+    :param resamples: number of bootstrap resamples
+    :param rng: random generator
+    :return: (estimate, lower bound, upper bound)
+    """
+    clusters = [cluster for cluster in clusters if cluster]
+    estimate, lower, upper = percentile_interval(
+        [value for cluster in clusters for value in cluster], percentile, confidence
+    )
+    if len(clusters) < 2:
+        return estimate, lower, upper
+
+    q = percentile / 100
+    estimates = sorted(
+        _interpolated(sorted(
+            value for _ in clusters for value in rng.choice(clusters)
+        ), q)
+        for _ in range(resamples)
+    )
+    alpha = (1 - confidence) / 2
+    bootstrap_lower = estimates[int(math.floor(alpha * (resamples - 1)))]
+    bootstrap_upper = estimates[int(math.ceil((1 - alpha) * (resamples - 1)))]
+    return estimate, min(lower, bootstrap_lower), max(upper, bootstrap_upper)
+
+
+def _interpolated(values: Sequence[float], q: float) -> float:
+    """Quantile of sorted values with linear interpolation between ranks."""
+    position = q * (len(values) - 1)
+    lower_index = int(math.floor(position))
+    upper_index = min(lower_index + 1, len(values) - 1)
+    return values[lower_index] + (
+        values[upper_index] - values[lower_index]
+    ) * (position - lower_index)
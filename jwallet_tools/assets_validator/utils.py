@@ -1,12 +1,15 @@
 import os
 import json
 import logging
+from fnmatch import fnmatchcase
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, TYPE_CHECKING
 
-from tdigest import TDigest
 from jsonschema import ValidationError
-from web3 import Web3
+
+if TYPE_CHECKING:  # pragma: no cover
+    from tdigest import TDigest
 
 
 TOOLS_ROOT = Path(os.path.dirname(__file__)) / '..'
@@ -16,7 +19,8 @@ logger = logging.getLogger(__name__)
 
 
 def load_json(filename):
-    return json.load(open(TOOLS_ROOT / filename, 'r'))
+    with open(TOOLS_ROOT / filename, 'r') as fp:
+        return json.load(fp)
 
 
 def make_signature(method_name, inputs):
@@ -37,8 +41,30 @@ def signature_exist(code, signature) -> bool:
     :param signature: method signature
     :return: True if signature found in byte-code
     """
-    fn_hash = Web3.sha3(signature.encode('utf-8'))
-    return fn_hash.hex()[2:10] in code.hex()
+    return signature_selector(signature) in code.hex()
+
+
+@lru_cache(maxsize=None)
+def signature_selector(signature) -> str:
+    """Make method selector (first 4 bytes of signature hash) as hex string.
+
+    :param signature: method signature
+    :return: selector hex without `0x` prefix
+    """
+    from eth_utils import keccak
+
+    return keccak(signature.encode('utf-8'))[:4].hex()
+
+
+def is_address(value) -> bool:
+    """Check if value is an ethereum address (checksum or not).
+
+    :param value: value to check
+    :return: True if value is an address
+    """
+    from eth_utils import is_address as _is_address
+
+    return _is_address(value)
 
 
 def normalize_address(address):
@@ -49,13 +75,105 @@ def normalize_address(address):
     :param address: contract address (checksum or not)
     :return: normalized address
     """
-    if not Web3.isChecksumAddress(address):
-        address = Web3.toChecksumAddress(address)
+    from eth_utils import is_checksum_address, to_checksum_address
+
+    if not is_checksum_address(address):
+        address = to_checksum_address(address)
 
     return address
 
 
+GLOB_CHARS = frozenset('*?[')
+
+
+def parse_ignore_rule(rule):
+    """Split ignore rule to parts.
+
+    :param rule: `[network:]symbol.method` or `method` (any symbol)
+    :return: (network or None, symbol, method)
+    """
+    network, _, rest = rule.rpartition(':')
+    symbol, _, method = rest.rpartition('.')
+    return network or None, symbol or '*', method
+
+
+def _is_glob(pattern):
+    return not GLOB_CHARS.isdisjoint(pattern)
+
+
+class IgnoreRules:
+
+    """Ignore rules compiled to per-symbol index.
+
+    Rule is `[network:]symbol.method` or bare `method` (ignored for any symbol),
+    any part may be glob pattern: `REP.*`, `*.approve`, `ropsten:GNT.name`,
+    `ICX.decimal?`. Rules without network apply to all networks.
+
+    Rules are grouped by symbol once, candidates of (network, symbol) are
+    selected on first check of symbol and result of every method check is
+    cached, so checks cost single dict lookup regardless of number of rules.
+    """
+
+    def __init__(self, rules):
+        self.rules = frozenset(rules)
+        self._by_symbol = {}
+        self._symbol_globs = []
+        for rule in self.rules:
+            network, symbol, method = parse_ignore_rule(rule)
+            compiled = (network, symbol, method, rule)
+            if _is_glob(symbol):
+                self._symbol_globs.append(compiled)
+            else:
+                self._by_symbol.setdefault(symbol, []).append(compiled)
+        self._index = {}
+
+    def match(self, method, symbol, network=None):
+        """Find rule ignoring method of symbol.
+
+        :param method: contract method name
+        :param symbol: asset symbol
+        :param network: network name (network scoped rules don't match if None)
+        :return: most specific matched rule or None
+        """
+        index = self._index.get((network, symbol))
+        if index is None:
+            index = self._index[network, symbol] = ({}, self._candidates(network, symbol))
+
+        results, candidates = index
+        try:
+            return results[method]
+        except KeyError:
+            pass
+
+        rule = None
+        for method_pattern, candidate in candidates:
+            if fnmatchcase(method, method_pattern):
+                rule = candidate
+                break
+        results[method] = rule
+        return rule
+
+    def _candidates(self, network, symbol):
+        candidates = []
+        for rule_network, rule_symbol, method, rule in (
+                self._by_symbol.get(symbol, []) + self._symbol_globs):
+            if rule_network is not None and (
+                    network is None or not fnmatchcase(network, rule_network)):
+                continue
+            if not fnmatchcase(symbol, rule_symbol):
+                continue
+            specificity = (_is_glob(rule_symbol), _is_glob(method), rule_network is None)
+            candidates.append((specificity, rule, method))
+        return [(method, rule) for _, rule, method in sorted(candidates)]
+
+
 class IgnoreLoggerAdapter(logging.LoggerAdapter):
+
+    """Asset validation log, messages of ignored methods are logged as debug.
+
+    `extra` holds `token`, `network` and compiled `IgnoreRules` as `ignore`.
+    """
+
     @property
     def token_name(self):
         token = self.extra['token']
@@ -77,20 +195,17 @@ class IgnoreLoggerAdapter(logging.LoggerAdapter):
             yield ValidationError(f"{method_name}: {message % args}")
 
     def _method_ignored(self, method):
-        """Check if method ignored.
+        """Check if method ignored, matched rule is added to `ignored` of context.
 
         :param method: contract method name
         :return:
         """
-        symbol = self.extra['token']['symbol']
-        variants = [
-            method,
-            f'{symbol}.{method}',
-            f'{symbol}.*',
-            f'*.{method}',
-        ]
-
-        return any([v in self.extra['ignore'] for v in variants])
+        extra = self.extra
+        rule = extra['ignore'].match(method, extra['token']['symbol'], extra.get('network'))
+        if rule is None:
+            return False
+        extra.setdefault('ignored', set()).add(rule)
+        return True
 
 
 class RangedTDigest:
@@ -101,9 +216,11 @@ class RangedTDigest:
     two tdigest will be stored: for x<=10, and 20 <= x < 10.
     """
 
-    by_range: Dict[int, TDigest]
+    by_range: Dict[int, 'TDigest']
 
     def __init__(self, ranges: List[int], delta=0.01, k=25):
+        from tdigest import TDigest
+
         self.ranges = ranges
         self.by_range = {x: TDigest(delta, k) for x in ranges}
 
@@ -116,6 +233,28 @@ class RangedTDigest:
                 self.by_range[range_end].update(value)
                 break
 
+    def merge(self, other: 'RangedTDigest'):
+        """Add values from other RangedTDigest with same ranges.
+
+        :param other: RangedTDigest instance
+        """
+        for range_end, tdigest in other.by_range.items():
+            self.by_range[range_end] = self.by_range[range_end] + tdigest
+
+    def to_dict(self) -> dict:
+        """Serialize to json compatible dict (see `from_dict`)."""
+        return {
+            'ranges': list(self.ranges),
+            'digests': {str(x): tdigest.to_dict() for x, tdigest in self.by_range.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RangedTDigest':
+        ranged_tdigest = cls(data['ranges'])
+        for range_end, tdigest in data['digests'].items():
+            ranged_tdigest.by_range[int(range_end)].update_from_dict(tdigest)
+        return ranged_tdigest
+
     def max_percentile(self, percentile) -> float:
         return max(*[x[1] for x in self.all(percentile)])
 
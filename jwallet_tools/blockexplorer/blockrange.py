@@ -56,7 +56,8 @@ class VariableBlockRange:
                 self.new_batch_size, self.batch_size = None, self.new_batch_size
                 step = self.batch_size * self.direction
 
-            for from_block in range(self.from_block, self.to_block + 1, step):
+            # stop is one block past `to_block` in direction of scan
+            for from_block in range(self.from_block, self.to_block + self.direction, step):
                 to_block = from_block + step - self.direction
                 if self.to_block_overflow(to_block):
                     to_block = self.to_block
@@ -82,8 +83,8 @@ class VariableBlockRange:
         if not self.reverse and self.from_block < self.to_block:
             # tail
             yield from_block, self.to_block
-        elif self.reverse and self.to_block != to_block:
-            yield self.to_block + 1, to_block
+        elif self.reverse and self.from_block >= self.to_block:
+            yield self.to_block, self.from_block
 
     def to_block_overflow(self, to_block):
         return (
@@ -96,8 +97,9 @@ class VariableBlockRange:
 class ThrottledBlockRange(VariableBlockRange):
     def update(self, last_measurement):
         ratio = (TARGET_TIME / last_measurement) * SPEED_CHANGE_FACTOR
-        if abs(ratio) > MAX_CHANGE_RATIO:
-            ratio = MAX_CHANGE_RATIO * self.direction
+        # batch size is always positive, direction is applied to step
+        if ratio > MAX_CHANGE_RATIO:
+            ratio = MAX_CHANGE_RATIO
 
         new_batch_size = int(self.batch_size * ratio)
 
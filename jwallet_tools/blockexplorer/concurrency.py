@@ -0,0 +1,119 @@
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 500
+INITIAL_CONCURRENCY = 10
+
+# smoothed latency above `baseline * LATENCY_TOLERANCE` is a spike
+LATENCY_TOLERANCE = 1.5
+LATENCY_SMOOTHING = 0.2
+# let baseline follow node if it gets slower permanently
+BASELINE_DRIFT = 1.01
+
+BACKOFF_FACTOR = 0.7
+
+
+class ConcurrencyLimiter:
+
+    """Limit number of requests in flight.
+
+    Fixed limit, see `AdaptiveConcurrencyLimiter` for self-tuning one.
+    """
+
+    def __init__(self, limit):
+        self._limit = limit
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency level."""
+        return self._limit
+
+    def acquire(self):
+        """Wait for free slot and occupy it."""
+        with self._condition:
+            while self._in_flight >= self._limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def update(self, latency, error=False):
+        """Report request result.
+
+        :param latency: request time (seconds)
+        :param error: True if request failed
+        """
+
+
+class AdaptiveConcurrencyLimiter(ConcurrencyLimiter):
+
+    """Self-tuning concurrency limiter.
+
+    Additive increase, multiplicative decrease: limit grows by one after `limit`
+    successful requests while smoothed latency stays close to the lowest one seen
+    (baseline), and shrinks by BACKOFF_FACTOR on errors or latency spikes. After
+    decrease, next decrease is possible only after `limit` more responses, so one
+    burst of failures doesn't collapse concurrency to minimum.
+    """
+
+    def __init__(self, initial=INITIAL_CONCURRENCY, min_limit=MIN_CONCURRENCY,
+                 max_limit=MAX_CONCURRENCY):
+        super().__init__(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+
+        self.latency = None
+        self.baseline = None
+
+        self._successes = 0
+        self._since_decrease = initial
+
+    def update(self, latency, error=False):
+        with self._condition:
+            self._since_decrease += 1
+
+            if error:
+                self._decrease('error')
+                return
+
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += (latency - self.latency) * LATENCY_SMOOTHING
+
+            if self.baseline is None:
+                self.baseline = self.latency
+            else:
+                self.baseline = min(self.latency, self.baseline * BASELINE_DRIFT)
+
+            if self.latency > self.baseline * LATENCY_TOLERANCE:
+                self._decrease('latency %.3fs (baseline %.3fs)' % (self.latency, self.baseline))
+                return
+
+            self._successes += 1
+            if self._successes >= self._limit and self._limit < self.max_limit:
+                self._successes = 0
+                self._limit += 1
+                logger.debug("[up] concurrency to %i", self._limit)
+                self._condition.notify()
+
+    def _decrease(self, reason):
+        if self._since_decrease < self._limit:
+            return
+
+        self._since_decrease = 0
+        self._successes = 0
+        new_limit = max(self.min_limit, int(self._limit * BACKOFF_FACTOR))
+        if new_limit < self._limit:
+            logger.debug("[down] concurrency to %i (from %i) because of %s",
+                         new_limit, self._limit, reason)
+            self._limit = new_limit
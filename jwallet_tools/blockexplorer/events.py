@@ -1,13 +1,14 @@
 import logging
-import urllib3
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait
 from queue import Queue
 
-import tqdm
-import requests
-
+from ..profiling import bind_scope
 from .blockrange import ThrottledBlockRange
+from .concurrency import AdaptiveConcurrencyLimiter, ConcurrencyLimiter, MAX_CONCURRENCY
+from .records import project
+from .rpc import Web3Backend
 
 MIN_BATCH_SIZE = 2
 MAX_BATCH_SIZE = 10 ** 6
@@ -18,26 +19,57 @@ MAX_CHANGE_RATIO = 2
 
 TARGET_TIME = 2
 
-RETRY_EXCEPTIONS = (
-    requests.exceptions.RequestException,
-    urllib3.exceptions.MaxRetryError
-)
-
+RECEIPT_RETRIES = 5
+RECEIPT_RETRY_DELAY = 0.5
 
 logger = logging.getLogger(__name__)
 
 
+def get_retry_exceptions():
+    """Node request errors to retry on (requests is imported on first use).
+
+    :return: tuple of exception classes
+    """
+    import requests
+    import urllib3
+
+    return (
+        requests.exceptions.RequestException,
+        urllib3.exceptions.MaxRetryError,
+        # IPC/WebSocket connection (see assets_validator._socket_provider)
+        ConnectionError,
+        TimeoutError
+    )
+
+
+class ReceiptFetchError(Exception):
+
+    """Receipt wasn't received after all retries."""
+
+    def __init__(self, tx_hash, reason):
+        super().__init__("Can't get receipt for %s: %s" % (tx_hash, reason))
+        self.tx_hash = tx_hash
+        self.reason = reason
+
+
 class EventIterator:
 
     """Contract events iterator.
 
     Allow to read blocks by small chunks. Chunk size chosen regarding to
     ethereum node performance (targeting node response time to TARGET_TIME).
+
+    Node is queried with `backend` (see `rpc` module), by default web3 instance
+    is used.
+
+    With `reverse=True` blocks are scanned from `to_block` down to `from_block` and
+    latest events are yielded first. Use `limit` to stop after number of events.
     """
 
     def __init__(self, web3, address, from_block, to_block, topics=None, batch_size=1000,
-                 progress=False, progress_title=None, reverse=False):
+                 progress=False, progress_title=None, reverse=False, backend=None, limit=None):
         self.web3 = web3
+        self.backend = backend if backend is not None else Web3Backend(web3)
         self.address = address
         self.from_block = from_block
         self.to_block = to_block
@@ -45,6 +77,7 @@ class EventIterator:
         self.progress = progress
         self.progress_title = progress_title
         self.reverse = reverse
+        self.limit = limit
 
         self.batch_size = batch_size
 
@@ -57,6 +90,8 @@ class EventIterator:
 
         :return:
         """
+        import tqdm
+
         progress_bar = tqdm.tqdm(
             total=self.to_block - self.from_block,
             disable=not self.progress,
@@ -65,11 +100,18 @@ class EventIterator:
             unit_scale=True
         )
 
-        throttler = ThrottledBlockRange(self.from_block, self.to_block, reverse=self.reverse)
+        throttler = ThrottledBlockRange(self.from_block, self.to_block, reverse=self.reverse,
+                                        batch_size=self.batch_size)
+
+        self._events_count = 0
+        lowest_scanned = None
 
         for from_block, to_block in throttler:
             if not self.running:
                 break
+            to_block = self._clip_reverse(from_block, to_block, lowest_scanned)
+            if to_block < from_block:
+                continue
             try:
                 logger.debug(f"Scan blocks {from_block} - {to_block} "
                              f"({to_block - from_block + 1} batch size)")
@@ -82,11 +124,13 @@ class EventIterator:
                 }
                 if self.topics:
                     log_filter['topics'] = self.topics
-                logs = self.web3.eth.getLogs(log_filter)
+                logs = self.backend.get_logs(log_filter)
 
                 result_time = time.time() - start_time
-                for event in logs:
-                    yield event
+                if self.reverse:
+                    lowest_scanned = from_block
+                    logs = reversed(logs)
+                yield from self._limit(logs)
 
                 progress_bar.update(throttler.batch_size)
 
@@ -100,7 +144,7 @@ class EventIterator:
                 throttler.set_step(MIN_BATCH_SIZE)
                 throttler.rollback()
                 time.sleep(10)
-            except RETRY_EXCEPTIONS as e:
+            except get_retry_exceptions() as e:
                 batch_size = int(throttler.batch_size * EXCEPTION_SPEED_FACTOR)
                 if batch_size < MIN_BATCH_SIZE:
                     batch_size = MIN_BATCH_SIZE
@@ -110,6 +154,24 @@ class EventIterator:
 
         progress_bar.close()
 
+    def _clip_reverse(self, from_block, to_block, lowest_scanned):
+        """Upper block of batch without blocks already scanned on reverse range tail.
+
+        :return: to_block below from_block if whole batch is already scanned
+        """
+        if self.reverse and lowest_scanned is not None:
+            return min(to_block, lowest_scanned - 1)
+        return to_block
+
+    def _limit(self, logs):
+        """Yield events until limit is reached, then stop iteration."""
+        for event in logs:
+            yield event
+            self._events_count += 1
+            if self.limit is not None and self._events_count >= self.limit:
+                self.running = False
+                break
+
 
 class EventReceiptIterator(EventIterator):
 
@@ -120,18 +182,42 @@ class EventReceiptIterator(EventIterator):
     be better to switch to asyncio in future).
 
     Order is not guaranteed.
+
+    Use `fields` to project receipts to compact records right in workers, so
+    responses queue doesn't hold full receipts (with logs and bloom).
+
+    Failed receipt requests are retried, `ReceiptFetchError` is raised if receipt
+    still can't be received.
     """
 
-    def __init__(self, *args, concurrency=100, **kwargs):
+    def __init__(self, *args, concurrency=100, fields=None, retries=RECEIPT_RETRIES, **kwargs):
         """
         see EventIterator.__init__ for other options.
 
-        :param concurrency: number of workers to start
+        :param concurrency: number of workers to start, or `auto` to tune number
+                            of requests in flight regarding to node latency and errors
+        :param fields: receipt fields to keep (see `records.project`), keep whole
+                       receipt if None
+        :param retries: number of retries for failed receipt request
         :param args: EventIterator args
         :param kwargs: EventIterator kwargs
         """
         super().__init__(*args, **kwargs)
         self.concurrency = concurrency
+        self.fields = tuple(fields) if fields else None
+        self.retries = retries
+
+        if concurrency == 'auto':
+            self.limiter = AdaptiveConcurrencyLimiter()
+            self.max_workers = MAX_CONCURRENCY
+        else:
+            self.limiter = ConcurrencyLimiter(concurrency)
+            self.max_workers = concurrency
+
+    @property
+    def concurrency_level(self) -> int:
+        """Number of receipt requests allowed in flight now."""
+        return self.limiter.limit
 
     def __iter__(self):
         """Iterate over transaction receipts gathered from parent iterator.
@@ -140,21 +226,78 @@ class EventReceiptIterator(EventIterator):
         responses queue.
         """
         queue = Queue()
-        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
-            executor.submit(self.writer, super().__iter__(), queue, executor)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            writer = threading.Thread(
+                target=bind_scope(self.writer), args=(super().__iter__(), queue, executor),
+                daemon=True
+            )
+            writer.start()
             while True:
                 item = queue.get()
                 if item is None:
                     # FIXME: ugly way to handle stop iteration
                     break
+                if isinstance(item, Exception):
+                    self.running = False
+                    raise item
                 yield item
                 queue.task_done()
 
     def writer(self, iter, queue, executor):
-        for item in iter:
-            executor.submit(self.get_receipt, item.get('transactionHash'), queue)
+        pending = set()
+        get_receipt = bind_scope(self.get_receipt)
+        try:
+            for item in iter:
+                self.limiter.acquire()
+                try:
+                    future = executor.submit(get_receipt, item.transactionHash, queue)
+                except BaseException:
+                    # slot is released by fetch_receipt of submitted request only
+                    self.limiter.release()
+                    raise
+                pending.add(future)
+                future.add_done_callback(pending.discard)
+            # all receipts must be in queue before stop mark
+            wait(list(pending))
+        except Exception as e:
+            logger.exception("Events iteration failed")
+            queue.put(e)
         queue.put(None)
 
     def get_receipt(self, hash, queue):
-        receipt = self.web3.eth.getTransactionReceipt(hash)
+        try:
+            receipt = self.fetch_receipt(hash)
+        except ReceiptFetchError as e:
+            queue.put(e)
+            return
+
+        if self.fields:
+            receipt = project(receipt, self.fields)
         queue.put(receipt)
+
+    def fetch_receipt(self, hash):
+        """Get receipt with retries, report latency and errors to limiter.
+
+        :param hash: transaction hash
+        :return: receipt
+        """
+        try:
+            for attempt in range(self.retries + 1):
+                start_time = time.time()
+                try:
+                    receipt = self.backend.get_transaction_receipt(hash)
+                    if receipt is None:
+                        raise ValueError('receipt not found')
+                except (ValueError,) + get_retry_exceptions() as e:
+                    self.limiter.update(time.time() - start_time, error=True)
+                    if attempt == self.retries:
+                        raise ReceiptFetchError(hash, e)
+                    logger.warning("Receipt request failed (concurrency %i), retry: %s",
+                                   self.limiter.limit, e)
+                    time.sleep(RECEIPT_RETRY_DELAY * 2 ** attempt)
+                    continue
+
+                self.limiter.update(time.time() - start_time)
+                return receipt
+        finally:
+            self.limiter.release()
@@ -0,0 +1,252 @@
+"""
+Fetch receipts on worker processes.
+
+With JSON decoding of receipts on threads GIL becomes the bottleneck long
+before the node does. `ReceiptProcessPool` starts worker processes, every one
+with own HTTP session (or IPC/WebSocket connection) and a few threads, and
+sends them slices of TX hashes. Workers decode receipts and write compact
+`(blockNumber, gasUsed)` pairs to a slot of shared memory buffer, so only slot
+number and count are pickled back.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from queue import Empty, Queue
+
+from .events import (
+    RECEIPT_RETRIES,
+    RECEIPT_RETRY_DELAY,
+    EventIterator,
+    ReceiptFetchError,
+    get_retry_exceptions,
+)
+from .records import record_type
+from .rpc import DEFAULT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# fields of receipts written to shared memory
+RECEIPT_FIELDS = ('blockNumber', 'gasUsed')
+
+# TX hashes sent to worker at once
+SLICE_SIZE = 256
+
+# receipt requests in flight per process
+THREADS_PER_PROCESS = 16
+
+# slices in flight per process (sent, being fetched or waiting to be read)
+SLOTS_PER_PROCESS = 4
+
+# worker process state (see _init_worker)
+_worker = {}
+
+
+def _init_worker(buffer, slice_size, endpoint_uri, timeout, threads, retries, rate_limit,
+                 burst):
+    from .rpc import RawRPCBackend
+
+    if rate_limit is not None:
+        from ..assets_validator._http_provider import set_rate_limit
+
+        set_rate_limit(endpoint_uri, rate_limit, burst)
+
+    _worker.update(
+        view=memoryview(buffer).cast('B').cast('Q'),
+        slice_size=slice_size,
+        backend=RawRPCBackend(endpoint_uri, timeout=timeout),
+        executor=ThreadPoolExecutor(max_workers=threads),
+        retries=retries,
+    )
+
+
+def _fetch_receipt(tx_hash):
+    backend = _worker['backend']
+    retries = _worker['retries']
+    for attempt in range(retries + 1):
+        try:
+            receipt = backend.get_transaction_receipt(tx_hash)
+            if receipt is None:
+                raise ValueError('receipt not found')
+        except (ValueError,) + get_retry_exceptions() as e:
+            if attempt == retries:
+                raise ReceiptFetchError(tx_hash, e)
+            time.sleep(RECEIPT_RETRY_DELAY * 2 ** attempt)
+            continue
+        return receipt.blockNumber, receipt.gasUsed
+
+
+def _fetch_slice(slot, tx_hashes):
+    """Fetch receipts and write (blockNumber, gasUsed) pairs to slot (in worker process).
+
+    :return: (number of pairs written, (tx hash, reason) of first failed receipt or None)
+    """
+    offset = slot * _worker['slice_size'] * 2
+    view = _worker['view']
+    count = 0
+    try:
+        for block_number, gas_used in _worker['executor'].map(_fetch_receipt, tx_hashes):
+            view[offset + count * 2] = block_number
+            view[offset + count * 2 + 1] = gas_used
+            count += 1
+    except ReceiptFetchError as e:
+        return count, (e.tx_hash, str(e.reason))
+    return count, None
+
+
+class ReceiptProcessPool:
+
+    """Worker processes fetching receipts to shared memory slots.
+
+    Pool can be shared by iterators of several threads, slot is owned by
+    iterator from submit until its pairs are read.
+    """
+
+    def __init__(self, endpoint_uri, processes=None, threads=THREADS_PER_PROCESS,
+                 slice_size=SLICE_SIZE, timeout=DEFAULT_TIMEOUT, retries=RECEIPT_RETRIES,
+                 rate_limit=None, burst=None):
+        """Constructor.
+
+        :param endpoint_uri: node uri (`http(s)://`, `ipc://` or `ws(s)://`)
+        :param processes: number of worker processes (default: CPU count)
+        :param threads: receipt requests in flight per process
+        :param slice_size: TX hashes per task
+        :param timeout: receipt request timeout
+        :param retries: number of retries for failed receipt request
+        :param rate_limit: max requests per second to node (divided between processes)
+        :param burst: max requests to node allowed at once (divided between processes)
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.slice_size = slice_size
+
+        slots = self.processes * SLOTS_PER_PROCESS
+        # spawn: parent is threaded, forked children could inherit held locks
+        context = multiprocessing.get_context('spawn')
+        buffer = context.RawArray('Q', slots * slice_size * 2)
+        self._view = memoryview(buffer).cast('B').cast('Q')
+        self._free_slots = Queue()
+        for slot in range(slots):
+            self._free_slots.put(slot)
+
+        if rate_limit is not None:
+            rate_limit = rate_limit / self.processes
+            burst = max(1, burst // self.processes) if burst else None
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=context, initializer=_init_worker,
+            initargs=(buffer, slice_size, endpoint_uri, timeout, threads, retries,
+                      rate_limit, burst)
+        )
+
+    def acquire_slot(self, block=True):
+        """Take free slot.
+
+        :param block: wait for slot released by other iterator
+        :return: slot number, None if not blocking and there is no free slot
+        """
+        try:
+            return self._free_slots.get(block=block)
+        except Empty:
+            return None
+
+    def release_slot(self, slot):
+        self._free_slots.put(slot)
+
+    def submit(self, slot, tx_hashes):
+        """Fetch receipts of TXs to slot.
+
+        :return: future of (count, failed receipt) see `_fetch_slice`
+        """
+        assert len(tx_hashes) <= self.slice_size
+        return self.executor.submit(_fetch_slice, slot, tx_hashes)
+
+    def read(self, slot, count):
+        """Pairs written to slot.
+
+        :return: list of (blockNumber, gasUsed)
+        """
+        offset = slot * self.slice_size * 2
+        values = self._view[offset:offset + count * 2].tolist()
+        return list(zip(values[::2], values[1::2]))
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+class ProcessReceiptIterator(EventIterator):
+
+    """Event receipt iterator fetching receipts on `ReceiptProcessPool`.
+
+    Same as `EventReceiptIterator` with `fields=('blockNumber', 'gasUsed')`, but
+    receipts are requested and decoded by worker processes. Logs are scanned in
+    current process.
+
+    Order is not guaranteed.
+    """
+
+    def __init__(self, *args, pool, **kwargs):
+        """
+        see EventIterator.__init__ for other options.
+
+        :param pool: ReceiptProcessPool instance
+        :param args: EventIterator args
+        :param kwargs: EventIterator kwargs
+        """
+        super().__init__(*args, **kwargs)
+        self.pool = pool
+
+    def __iter__(self):
+        slice_size = self.pool.slice_size
+        # (slot, future) of submitted slices in order of submission
+        pending = deque()
+        tx_hashes = []
+
+        try:
+            for log in super().__iter__():
+                tx_hashes.append(log.transactionHash)
+                if len(tx_hashes) < slice_size:
+                    continue
+                yield from self._submit(pending, tx_hashes)
+                tx_hashes = []
+                while pending and pending[0][1].done():
+                    yield from self._receive(pending)
+
+            if tx_hashes:
+                yield from self._submit(pending, tx_hashes)
+            while pending:
+                yield from self._receive(pending)
+        finally:
+            # slot is reused only after worker stopped writing to it
+            for slot, future in pending:
+                future.cancel()
+                future.add_done_callback(
+                    lambda _, slot=slot: self.pool.release_slot(slot)
+                )
+
+    def _receive(self, pending):
+        """Wait for first submitted slice and release its slot.
+
+        :return: list of receipt records
+        """
+        slot, future = pending.popleft()
+        try:
+            count, failed = future.result()
+            pairs = self.pool.read(slot, count)
+        finally:
+            self.pool.release_slot(slot)
+        if failed is not None:
+            self.running = False
+            raise ReceiptFetchError(*failed)
+        record = record_type(RECEIPT_FIELDS)
+        return [record(*pair) for pair in pairs]
+
+    def _submit(self, pending, tx_hashes):
+        """Submit slice of TX hashes, yield receipts of own slices while waiting for slot."""
+        # never wait for slot while holding own ones: read them instead
+        while True:
+            slot = self.pool.acquire_slot(block=not pending)
+            if slot is not None:
+                break
+            yield from self._receive(pending)
+        pending.append((slot, self.pool.submit(slot, tx_hashes)))
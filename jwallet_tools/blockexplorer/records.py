@@ -0,0 +1,30 @@
+"""
+Compact records for receipts and logs.
+
+Full web3 receipts carry every log, topic and bloom filter. When only a few
+fields are needed, receipts are projected to namedtuples (no per-instance
+`__dict__`) to keep queues and buffers small.
+"""
+from collections import namedtuple
+from functools import lru_cache
+from typing import Tuple
+
+
+@lru_cache(maxsize=None)
+def record_type(fields: Tuple[str, ...]):
+    """Get record class with given fields.
+
+    :param fields: field names
+    :return: namedtuple class (one per fields tuple)
+    """
+    return namedtuple('Record', fields)
+
+
+def project(item, fields: Tuple[str, ...]):
+    """Project receipt (or log) to compact record.
+
+    :param item: web3 AttributeDict or any object with required attributes
+    :param fields: field names to keep
+    :return: record with requested fields only
+    """
+    return record_type(fields)(*[getattr(item, field) for field in fields])
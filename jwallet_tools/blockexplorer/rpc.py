@@ -0,0 +1,105 @@
+"""
+Backends used by event iterators to query ethereum node.
+
+`Web3Backend` goes through web3 (middlewares, result formatters, AttributeDict).
+`RawRPCBackend` posts raw JSON-RPC and returns minimal records with only the
+fields iterators and validator need, which is much cheaper for millions of
+logs and receipts.
+"""
+import itertools
+import json
+import logging
+from collections import namedtuple
+
+try:
+    from orjson import loads as json_loads
+except ImportError:  # pragma: no cover
+    from json import loads as json_loads
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10
+
+Log = namedtuple('Log', ['transactionHash', 'blockNumber'])
+
+Receipt = namedtuple('Receipt', ['transactionHash', 'blockNumber', 'gasUsed'])
+
+
+class Web3Backend:
+
+    """Query node with web3 instance."""
+
+    def __init__(self, web3):
+        self.web3 = web3
+
+    def get_logs(self, log_filter):
+        return self.web3.eth.getLogs(log_filter)
+
+    def get_transaction_receipt(self, tx_hash):
+        return self.web3.eth.getTransactionReceipt(tx_hash)
+
+
+class RawRPCBackend:
+
+    """Query node with raw JSON-RPC over HTTP (or shared IPC/WebSocket connection).
+
+    Errors returned by node raised as `ValueError` (same as web3 does).
+    """
+
+    def __init__(self, endpoint_uri, timeout=DEFAULT_TIMEOUT):
+        self.endpoint_uri = endpoint_uri
+        self.timeout = timeout
+        self._request_ids = itertools.count()
+
+    def call(self, method, params):
+        """Make JSON-RPC call.
+
+        :param method: RPC method name
+        :param params: RPC method params
+        :return: decoded `result` of response
+        """
+        from ..assets_validator._http_provider import make_post_request
+        from ..assets_validator._socket_provider import get_connection, is_socket_uri
+
+        if is_socket_uri(self.endpoint_uri):
+            response = get_connection(self.endpoint_uri).request(method, params, self.timeout)
+        else:
+            request_data = json.dumps({
+                'jsonrpc': '2.0',
+                'method': method,
+                'params': params,
+                'id': next(self._request_ids),
+            }).encode('utf-8')
+            raw_response = make_post_request(
+                self.endpoint_uri, request_data, timeout=self.timeout
+            )
+            response = json_loads(raw_response)
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response['result']
+
+    def get_logs(self, log_filter):
+        params = dict(log_filter)
+        for key in ('fromBlock', 'toBlock'):
+            if isinstance(params.get(key), int):
+                params[key] = hex(params[key])
+
+        return [
+            Log(item['transactionHash'], int(item['blockNumber'], 16))
+            for item in self.call('eth_getLogs', [params])
+        ]
+
+    def get_transaction_receipt(self, tx_hash):
+        if isinstance(tx_hash, bytes):
+            tx_hash = '0x' + tx_hash.hex()
+
+        receipt = self.call('eth_getTransactionReceipt', [tx_hash])
+        if receipt is None:
+            return None
+
+        return Receipt(
+            receipt['transactionHash'],
+            int(receipt['blockNumber'], 16),
+            int(receipt['gasUsed'], 16)
+        )
@@ -0,0 +1,495 @@
+"""
+Distributed validation over shared work queue.
+
+Coordinator (`validate --queue=...`) pins head block of every network and
+enqueues jobs of a run:
+
+- `asset` - schema and contract validation of single asset (without gas scan)
+- `gas` - gas used by contract TXs in block range, result is serialized
+  RangedTDigest, so ranges of one contract are merged by coordinator
+
+Workers (`worker --queue=...`, on any machine with access to queue) claim jobs,
+run them and store results. Claimed job is returned to queue if worker doesn't
+renew its lease (died). Coordinator works on jobs too, then merges results to
+single report.
+
+Queue backend is pluggable (see `register_queue_backend`), default one is SQLite
+database file (`sqlite:///path/to/queue.db` or just path).
+"""
+import abc
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from urllib.parse import urlparse
+
+from .assets_validator.utils import is_address, normalize_address
+
+logger = logging.getLogger(__name__)
+
+ASSET_JOB = 'asset'
+GAS_JOB = 'gas'
+
+QUEUED = 'queued'
+CLAIMED = 'claimed'
+DONE = 'done'
+FAILED = 'failed'
+
+# claimed job is returned to queue if its lease is not renewed in time
+LEASE = 600
+
+MAX_ATTEMPTS = 3
+
+POLL_INTERVAL = 5
+
+# blocks per gas scan job
+RANGE_SIZE = 500000
+
+# validators (of other heads or options) kept by worker, least recently used are closed
+CACHED_VALIDATORS = 4
+
+_queue_backends = {}
+
+
+def register_queue_backend(scheme, queue_class):
+    """Make queue class available by uri scheme (see `open_queue`).
+
+    :param scheme: uri scheme (`sqlite`, ...)
+    :param queue_class: WorkQueue subclass, created with uri
+    """
+    _queue_backends[scheme] = queue_class
+
+
+def open_queue(uri):
+    """Open work queue by uri (file path means SQLite queue)."""
+    scheme = urlparse(uri).scheme
+    if not scheme:
+        return SQLiteWorkQueue(uri)
+    if scheme not in _queue_backends:
+        raise ValueError("Unknown queue backend %s" % scheme)
+    return _queue_backends[scheme](uri)
+
+
+class WorkQueue(abc.ABC):
+
+    """Work queue interface.
+
+    Job is dict with `id`, `run`, `kind`, `payload` keys, result is json
+    compatible dict.
+    """
+
+    @abc.abstractmethod
+    def put(self, run, jobs):
+        """Enqueue jobs of run.
+
+        :param run: run id
+        :param jobs: list of (kind, payload) tuples
+        """
+
+    @abc.abstractmethod
+    def claim(self, worker, lease=LEASE):
+        """Take next job (queued or with expired lease), None if nothing to do."""
+
+    @abc.abstractmethod
+    def renew(self, job_id, worker, lease=LEASE):
+        """Extend lease of claimed job."""
+
+    @abc.abstractmethod
+    def complete(self, job_id, worker, result):
+        """Store result of claimed job."""
+
+    @abc.abstractmethod
+    def fail(self, job_id, worker, error):
+        """Return job to queue or mark as failed after `MAX_ATTEMPTS` attempts."""
+
+    @abc.abstractmethod
+    def counts(self, run):
+        """Number of jobs of run by status."""
+
+    @abc.abstractmethod
+    def results(self, run):
+        """Finished jobs of run with `status`, `result` and `error`."""
+
+
+class SQLiteWorkQueue(WorkQueue):
+
+    """Work queue in SQLite database file.
+
+    Connection is opened per operation, so queue object can be shared between
+    threads, claims are serialized by database write lock.
+    """
+
+    def __init__(self, uri):
+        parsed = urlparse(uri)
+        self.path = parsed.netloc + parsed.path if parsed.scheme else uri
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    run TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    worker TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return _Transaction(db)
+
+    def put(self, run, jobs):
+        with self._connect() as db:
+            db.executemany(
+                "INSERT INTO jobs (run, kind, payload, status) VALUES (?, ?, ?, ?)",
+                [(run, kind, json.dumps(payload), QUEUED) for kind, payload in jobs]
+            )
+
+    def claim(self, worker, lease=LEASE):
+        now = time.time()
+        with self._connect() as db:
+            # worker died on job too many times
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, 'lease expired', CLAIMED, now, MAX_ATTEMPTS)
+            )
+            row = db.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) "
+                "ORDER BY id LIMIT 1", (QUEUED, CLAIMED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (CLAIMED, worker, now + lease, row['id'])
+            )
+        return {
+            'id': row['id'],
+            'run': row['run'],
+            'kind': row['kind'],
+            'payload': json.loads(row['payload']),
+            'lease': lease,
+        }
+
+    def renew(self, job_id, worker, lease=LEASE):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time() + lease, job_id, worker, CLAIMED)
+            )
+
+    def complete(self, job_id, worker, result):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, result = ? WHERE id = ? AND worker = ?",
+                (DONE, json.dumps(result), job_id, worker)
+            )
+
+    def fail(self, job_id, worker, error):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                "error = ?, worker = NULL WHERE id = ? AND worker = ?",
+                (MAX_ATTEMPTS, FAILED, QUEUED, error, job_id, worker)
+            )
+
+    def counts(self, run):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE run = ? GROUP BY status", (run,)
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def results(self, run):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT * FROM jobs WHERE run = ? AND status IN (?, ?) ORDER BY id",
+                (run, DONE, FAILED)
+            ).fetchall()
+        return [{
+            'id': row['id'],
+            'kind': row['kind'],
+            'payload': json.loads(row['payload']),
+            'status': row['status'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+        } for row in rows]
+
+
+class _Transaction:
+
+    """Connection context: `BEGIN IMMEDIATE` ... `COMMIT`, close on exit."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, *exc_info):
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.db.close()
+
+
+register_queue_backend('sqlite', SQLiteWorkQueue)
+
+
+def plan_jobs(network, node, assets, head_block, options, range_size=RANGE_SIZE):
+    """Split assets of network to jobs.
+
+    :param network: network name
+    :param node: ethereum node uri
+    :param assets: list of assets
+    :param head_block: block to validate at (pinned by coordinator)
+    :param options: ContractValidator options shared by all jobs
+    :param range_size: blocks per gas scan job
+    :return: list of (kind, payload)
+    """
+    jobs = []
+    common = {'network': network, 'node': node, 'head': head_block, 'options': options}
+    for index, asset in enumerate(assets):
+        jobs.append((ASSET_JOB, dict(common, index=index, asset=asset)))
+
+        blockchain_params = asset.get('blockchainParams', {})
+        if blockchain_params.get('type') != 'erc-20':
+            continue
+        if not is_address(blockchain_params.get('address')):
+            continue
+        if blockchain_params.get('staticGasAmount') is None:
+            continue
+
+        from_block = blockchain_params.get('deploymentBlockNumber', 0)
+        for range_from in range(from_block, head_block + 1, range_size):
+            jobs.append((GAS_JOB, dict(
+                common, index=index, address=normalize_address(blockchain_params['address']),
+                from_block=range_from, to_block=min(range_from + range_size - 1, head_block)
+            )))
+    return jobs
+
+
+class Worker:
+
+    """Claim and run jobs from queue."""
+
+    def __init__(self, queue, worker_id=None, lease=LEASE):
+        self.queue = queue
+        self.worker_id = worker_id or '%s:%i:%s' % (
+            socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8]
+        )
+        self.lease = lease
+        self._validators = OrderedDict()
+
+    def run(self, stop_when_empty=False, poll_interval=POLL_INTERVAL, stopped=None):
+        """Process jobs.
+
+        :param stop_when_empty: return when queue has no jobs
+        :param poll_interval: seconds to wait for new jobs
+        :param stopped: threading.Event to stop worker
+        :return: number of processed jobs
+        """
+        processed = 0
+        while stopped is None or not stopped.is_set():
+            job = self.queue.claim(self.worker_id, self.lease)
+            if job is None:
+                if stop_when_empty:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            self.process(job)
+            processed += 1
+        return processed
+
+    def process(self, job):
+        logger.debug("Run %s job %i", job['kind'], job['id'])
+        done = threading.Event()
+        renewer = threading.Thread(target=self._renew_lease, args=(job['id'], done),
+                                   daemon=True)
+        renewer.start()
+        try:
+            if job['kind'] == ASSET_JOB:
+                result = self.run_asset_job(job['payload'])
+            elif job['kind'] == GAS_JOB:
+                result = self.run_gas_job(job['payload'])
+            else:
+                raise ValueError("Unknown job kind %s" % job['kind'])
+        except Exception as e:
+            logger.exception("Job %i failed", job['id'])
+            self.queue.fail(job['id'], self.worker_id, '%s: %s' % (type(e).__name__, e))
+        else:
+            self.queue.complete(job['id'], self.worker_id, result)
+        finally:
+            done.set()
+
+    def _renew_lease(self, job_id, done):
+        while not done.wait(self.lease / 3):
+            self.queue.renew(job_id, self.worker_id, self.lease)
+
+    def get_validator(self, payload):
+        """Assets validator for job options (cached per node and options)."""
+        from .assets_validator import create_assets_validator
+
+        key = json.dumps([payload['network'], payload['node'], payload['head'],
+                          payload['options']], sort_keys=True)
+        validator = self._validators.get(key)
+        if validator is not None:
+            self._validators.move_to_end(key)
+            return validator
+
+        options = dict(payload['options'])
+        validator = self._validators[key] = create_assets_validator(
+            node=payload['node'], block_identifier=payload['head'], check_gas=False,
+            network=payload['network'], **options
+        )
+        while len(self._validators) > CACHED_VALIDATORS:
+            _, evicted = self._validators.popitem(last=False)
+            evicted.contract_validator.close()
+        return validator
+
+    def close(self):
+        """Close cached validators (receipt worker processes of `process` backend)."""
+        while self._validators:
+            _, validator = self._validators.popitem()
+            validator.contract_validator.close()
+
+    def run_asset_job(self, payload):
+        """Validate asset without gas scan.
+
+        :return: `{'errors': [{'path': [...], 'message': ...}], 'ignored': [rule, ...]}`
+        """
+        validator = self.get_validator(payload)
+        errors = list(validator.descend(payload['asset'], validator.schema['items'],
+                                        path=payload['index'], schema_path='items'))
+        return {
+            'errors': [
+                {'path': list(error.absolute_path), 'message': error.message}
+                for error in errors
+            ],
+            'ignored': sorted(validator.contract_validator.ignored),
+        }
+
+    def run_gas_job(self, payload):
+        """Scan gas used by contract TXs in block range.
+
+        :return: `{'transfers': ..., 'digest': RangedTDigest.to_dict()}`
+        """
+        from .assets_validator.contract import LAST_HARD_FORK_BLOCK
+        from .assets_validator.utils import RangedTDigest
+
+        contract_validator = self.get_validator(payload).contract_validator
+        per_fork_tdigest = RangedTDigest([LAST_HARD_FORK_BLOCK, payload['head']])
+        address = payload['address']
+
+        transfers = 0
+        receipts = contract_validator.iter_receipts(
+            address, contract_validator.transfer_topics(address),
+            payload['from_block'], payload['to_block']
+        )
+        for tx in receipts:
+            per_fork_tdigest.update(tx.blockNumber, tx.gasUsed)
+            transfers += 1
+
+        return {'transfers': transfers, 'digest': per_fork_tdigest.to_dict()}
+
+
+class Coordinator:
+
+    """Enqueue run jobs, wait for them and merge results."""
+
+    def __init__(self, queue, run=None):
+        self.queue = queue
+        self.run = run or uuid.uuid4().hex
+        self.assets = {}
+        # ignore rules matched by any job (filled by report)
+        self.ignored = set()
+
+    def submit(self, network, node, assets, head_block, options, range_size=RANGE_SIZE):
+        """Enqueue jobs for assets of network."""
+        self.assets[network] = assets
+        jobs = plan_jobs(network, node, assets, head_block, options, range_size)
+        self.queue.put(self.run, jobs)
+        logger.info("%i jobs of %s enqueued (run %s)", len(jobs), network, self.run)
+
+    def wait(self, worker=None, poll_interval=POLL_INTERVAL):
+        """Wait until all jobs finished.
+
+        :param worker: Worker to process jobs with while waiting
+        """
+        while True:
+            if worker is not None:
+                worker.run(stop_when_empty=True)
+
+            counts = self.queue.counts(self.run)
+            unfinished = counts.get(QUEUED, 0) + counts.get(CLAIMED, 0)
+            if not unfinished:
+                return
+            logger.info("Waiting for %i jobs (%i done, %i failed)", unfinished,
+                        counts.get(DONE, 0), counts.get(FAILED, 0))
+            time.sleep(poll_interval)
+
+    def report(self, gas_percentile=None, ignore=None):
+        """Merge results to errors per asset.
+
+        :param gas_percentile: staticGasAmount percentile to check
+        :param ignore: list of ignored contract methods
+        :return: iterator over (network, asset, field, message)
+        """
+        from .assets_validator import load_schema
+        from .assets_validator.contract import ContractValidator
+        from .assets_validator.utils import RangedTDigest
+
+        digests = {}
+        transfers = defaultdict(int)
+
+        for job in self.queue.results(self.run):
+            payload = job['payload']
+            network, index = payload['network'], payload['index']
+            asset = self.assets[network][index]
+
+            if job['status'] == FAILED:
+                yield network, asset, '', "%s job failed: %s" % (job['kind'], job['error'])
+                continue
+
+            if job['kind'] == ASSET_JOB:
+                self.ignored.update(job['result'].get('ignored', []))
+                for error in job['result']['errors']:
+                    field = '.'.join([str(x) for x in error['path']][1:])
+                    yield network, asset, field, error['message']
+                continue
+
+            digest = RangedTDigest.from_dict(job['result']['digest'])
+            if (network, index) in digests:
+                digests[network, index].merge(digest)
+            else:
+                digests[network, index] = digest
+            transfers[network, index] += job['result']['transfers']
+
+        # gas is checked offline by merged digests, ignore rules are applied as usual
+        contract_validator = ContractValidator(None, ignore=ignore, fast=True,
+                                               gas_percentile=gas_percentile)
+        schema_ignore = load_schema()['items'].get('isValidContract', {})
+        for (network, index), digest in sorted(digests.items()):
+            asset = self.assets[network][index]
+            contract_validator.set_log_context(asset, schema_ignore, network)
+            logger.debug("%s (%s): %i TXs scanned", asset.get('symbol'), network,
+                         transfers[network, index])
+            expected_max_gas = asset['blockchainParams']['staticGasAmount']
+            for error in contract_validator.check_static_gas_amount(digest, expected_max_gas):
+                yield network, asset, '', error.message
+            self.ignored.update(contract_validator.ignored)
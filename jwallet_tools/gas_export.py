@@ -0,0 +1,283 @@
+"""
+Export contract TXs gas samples to columnar `.npy` files.
+
+Every token gets own directory `<output>/<network>/<address>/` with one file per
+column (`blockNumber.npy`, `gasUsed.npy` - `<u8`, `transactionHash.npy` - `|S32`)
+and `meta.json` with exported rows count and last scanned block. Files are
+plain NumPy arrays, so they can be memory-mapped::
+
+    block_number = numpy.load('blockNumber.npy', mmap_mode='r')
+    gas_used = numpy.load('gasUsed.npy', mmap_mode='r')
+    numpy.percentile(gas_used[block_number >= 7280000], 95)
+
+Export is append-only: next run scans blocks after last scanned one only.
+Header of `.npy` is written with room for any row count and is rewritten in
+place, numpy itself is not required to write (or read, see `load_columns`).
+Headers are rewritten after `meta.json` is committed, so interrupted export never
+leaves header with more rows than meta (rows of it are dropped on next run).
+"""
+import array
+import ast
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+# header is padded to fixed size, so it can be rewritten when rows appended
+NPY_HEADER_SIZE = 128
+
+META_FILENAME = 'meta.json'
+
+# column name -> (dtype, item size)
+COLUMNS = {
+    'blockNumber': ('<u8', 8),
+    'gasUsed': ('<u8', 8),
+    'transactionHash': ('|S32', 32),
+}
+
+BATCH_SIZE = 10000
+
+
+def _npy_header(dtype, rows):
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%i,), }" % (dtype, rows)
+    size = NPY_HEADER_SIZE - len(NPY_MAGIC) - 2
+    header = header.ljust(size - 1) + '\n'
+    return NPY_MAGIC + struct.pack('<H', size) + header.encode('latin1')
+
+
+def _read_npy_header(fp):
+    prefix = fp.read(len(NPY_MAGIC) + 2)
+    if prefix[:len(NPY_MAGIC)] != NPY_MAGIC:
+        raise ValueError("%s is not npy v1.0 file" % fp.name)
+    size, = struct.unpack('<H', prefix[len(NPY_MAGIC):])
+    header = ast.literal_eval(fp.read(size).decode('latin1'))
+    return header['descr'], header['shape'][0], len(prefix) + size
+
+
+class NpyColumn:
+
+    """Append-only one dimensional `.npy` file."""
+
+    def __init__(self, path, dtype, itemsize, rows=0):
+        """Open column, create file if not exists.
+
+        :param path: file path
+        :param dtype: numpy dtype descr (`<u8`, `|S32`)
+        :param itemsize: item size in bytes
+        :param rows: rows to keep, rows after it (from interrupted export) are dropped
+        """
+        self.path = path
+        self.dtype = dtype
+        self.itemsize = itemsize
+        self.rows = rows
+
+        if not os.path.exists(path):
+            with open(path, 'wb') as fp:
+                fp.write(_npy_header(dtype, 0))
+
+        self._fp = open(path, 'r+b')
+        descr, _, self._offset = _read_npy_header(self._fp)
+        if descr != dtype:
+            raise ValueError("%s has dtype %s, %s expected" % (path, descr, dtype))
+        self._fp.truncate(self._offset + rows * itemsize)
+        self.commit()
+
+    def append(self, data, rows):
+        """Append encoded rows.
+
+        :param data: rows bytes
+        :param rows: number of rows in data
+        """
+        assert len(data) == rows * self.itemsize
+        self._fp.write(data)
+        self.rows += rows
+
+    def flush(self):
+        """Flush appended rows, header is not changed."""
+        self._fp.flush()
+
+    def commit(self):
+        """Write rows count to header and flush file."""
+        self._fp.seek(0)
+        self._fp.write(_npy_header(self.dtype, self.rows))
+        self._fp.seek(0, os.SEEK_END)
+        self._fp.flush()
+
+    def close(self):
+        """Close file, rows appended after last `commit` are not in header."""
+        self._fp.flush()
+        self._fp.close()
+
+
+def _encode_uint64(values):
+    data = array.array('Q', values)
+    if sys.byteorder != 'little':  # pragma: no cover
+        data.byteswap()
+    return data.tobytes()
+
+
+def _encode_hash(value):
+    if isinstance(value, str):
+        value = bytes.fromhex(value[2:] if value.startswith('0x') else value)
+    return bytes(value)
+
+
+class GasSamplesWriter:
+
+    """Append receipts of single token to columns directory."""
+
+    def __init__(self, directory, address=None):
+        """Open token directory, create if not exists.
+
+        :param directory: token directory
+        :param address: contract address stored to meta
+        :raises ValueError: if directory is export of another contract
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self.meta = {'address': address, 'rows': 0, 'lastBlock': None}
+        meta_path = os.path.join(directory, META_FILENAME)
+        if os.path.exists(meta_path):
+            with open(meta_path) as fp:
+                self.meta.update(json.load(fp))
+        if address is not None and self.meta['address'] not in (None, address):
+            raise ValueError("%s is export of %s, not %s"
+                             % (directory, self.meta['address'], address))
+        self.meta['address'] = address or self.meta['address']
+
+        # meta is written after columns, so its rows count is consistent one
+        self.columns = {
+            name: NpyColumn(os.path.join(directory, name + '.npy'), dtype, itemsize,
+                            rows=self.meta['rows'])
+            for name, (dtype, itemsize) in COLUMNS.items()
+        }
+
+    @property
+    def last_block(self):
+        return self.meta['lastBlock']
+
+    def write(self, receipts, to_block):
+        """Append receipts and mark blocks up to `to_block` as exported.
+
+        :param receipts: receipts with `transactionHash`, `blockNumber`, `gasUsed`
+        :param to_block: last scanned block
+        :return: number of appended rows
+        """
+        rows = 0
+        batch = []
+        for receipt in receipts:
+            batch.append(receipt)
+            if len(batch) >= BATCH_SIZE:
+                rows += self._append(batch)
+                batch = []
+        rows += self._append(batch)
+
+        for column in self.columns.values():
+            column.flush()
+
+        self.meta['rows'] += rows
+        self.meta['lastBlock'] = to_block
+        meta_path = os.path.join(self.directory, META_FILENAME)
+        with open(meta_path + '.tmp', 'w') as fp:
+            json.dump(self.meta, fp)
+        os.replace(meta_path + '.tmp', meta_path)
+
+        # headers follow meta, so they never count uncommitted rows
+        for column in self.columns.values():
+            column.commit()
+        return rows
+
+    def _append(self, batch):
+        if not batch:
+            return 0
+        columns = self.columns
+        columns['blockNumber'].append(
+            _encode_uint64([tx.blockNumber for tx in batch]), len(batch)
+        )
+        columns['gasUsed'].append(_encode_uint64([tx.gasUsed for tx in batch]), len(batch))
+        columns['transactionHash'].append(
+            b''.join(_encode_hash(tx.transactionHash) for tx in batch), len(batch)
+        )
+        return len(batch)
+
+    def close(self):
+        for column in self.columns.values():
+            column.close()
+
+
+def load_columns(directory):
+    """Memory-map exported columns of token.
+
+    Numpy memmaps are returned if numpy is installed, otherwise numeric columns
+    are memoryviews (zero copy) and `transactionHash` is list of bytes.
+
+    :param directory: token directory
+    :return: dict column name -> array
+    """
+    with open(os.path.join(directory, META_FILENAME)) as fp:
+        rows = json.load(fp)['rows']
+
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    result = {}
+    for name, (_, itemsize) in COLUMNS.items():
+        path = os.path.join(directory, name + '.npy')
+        if numpy is not None:
+            result[name] = numpy.load(path, mmap_mode='r')[:rows]
+            continue
+
+        with open(path, 'rb') as fp:
+            _, _, offset = _read_npy_header(fp)
+            if not rows:
+                result[name] = [] if itemsize == 32 else memoryview(b'').cast('Q')
+                continue
+            data = memoryview(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+        data = data[offset:offset + rows * itemsize]
+        if name == 'transactionHash':
+            result[name] = [data[i:i + itemsize].tobytes() for i in range(0, len(data), itemsize)]
+        else:
+            result[name] = data.cast('Q')
+    return result
+
+
+def export_gas_samples(contract_validator, asset, directory):
+    """Scan contract TXs after last exported block up to head and append them.
+
+    :param contract_validator: ContractValidator instance (not fast)
+    :param asset: asset dict
+    :param directory: token directory
+    :return: number of exported rows
+    """
+    from .assets_validator.utils import normalize_address
+
+    blockchain_params = asset['blockchainParams']
+    address = normalize_address(blockchain_params['address'])
+
+    writer = GasSamplesWriter(directory, address)
+    try:
+        if writer.last_block is None:
+            from_block = blockchain_params.get('deploymentBlockNumber', 0)
+        else:
+            from_block = writer.last_block + 1
+        to_block = contract_validator.head_block
+        if from_block > to_block:
+            return 0
+
+        logger.info("Export %s blocks %i - %i", asset['symbol'], from_block, to_block)
+        receipts = contract_validator.iter_receipts(
+            address, contract_validator.transfer_topics(address), from_block, to_block,
+            fields=tuple(COLUMNS), progress_title='export %s' % asset['symbol']
+        )
+        return writer.write(receipts, to_block)
+    finally:
+        writer.close()
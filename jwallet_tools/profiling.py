@@ -0,0 +1,227 @@
+"""
+Sampling profiler for validation runs.
+
+Stacks of all threads are sampled with `sys._current_frames` from background
+thread, so overhead doesn't depend on number of function calls (unlike
+cProfile) and receipt worker threads are profiled too.
+
+Samples are labeled with scope stack of thread (asset, validation stage, see
+`scope`). Worker threads don't inherit scope by themselves, wrap submitted
+callables with `bind_scope` to run them under scope of submitting thread.
+Threads without scope (idle pool workers) are not sampled.
+
+Results are written as collapsed stacks (`flamegraph.pl`, speedscope) and
+top-N hot functions summary.
+"""
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+DEFAULT_INTERVAL = 0.005
+
+TOP_FUNCTIONS = 30
+
+COLLAPSED_FILENAME = 'profile.collapsed'
+
+SUMMARY_FILENAME = 'profile.txt'
+
+# thread ident -> scope labels, readable from sampler thread (unlike threading.local)
+_thread_scopes = {}
+
+_enabled = False
+
+
+class scope:
+
+    """Label samples of current thread while in context.
+
+    Does nothing when profiler is not running.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self._previous = None
+
+    def __enter__(self):
+        if _enabled:
+            ident = threading.get_ident()
+            self._previous = _thread_scopes.get(ident, ())
+            _thread_scopes[ident] = self._previous + (self.label,)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._previous is not None:
+            _set_scope(threading.get_ident(), self._previous)
+            self._previous = None
+
+
+def scoped(label):
+    """Decorator: run function (or generator) under scope."""
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with scope(label):
+                    return (yield from func(*args, **kwargs))
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with scope(label):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _set_scope(ident, labels):
+    if labels:
+        _thread_scopes[ident] = labels
+    else:
+        _thread_scopes.pop(ident, None)
+
+
+def current_scope():
+    return _thread_scopes.get(threading.get_ident(), ())
+
+
+def bind_scope(func):
+    """Make callable run under scope of current thread (in any thread).
+
+    :param func: callable to submit to other thread
+    :return: `func` as is if profiler is not running
+    """
+    if not _enabled:
+        return func
+
+    labels = current_scope()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        ident = threading.get_ident()
+        previous = _thread_scopes.get(ident, ())
+        _thread_scopes[ident] = labels
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _set_scope(ident, previous)
+
+    return wrapper
+
+
+class SamplingProfiler:
+
+    """Sample stacks of scoped threads with fixed interval."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._started_at = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._frame_names = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        global _enabled
+        _enabled = True
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        global _enabled
+        _enabled = False
+        self._stopped.set()
+        self._thread.join()
+        self.duration = time.monotonic() - self._started_at
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Take one sample of all scoped threads."""
+        frames = sys._current_frames()
+        for ident, labels in list(_thread_scopes.items()):
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            self.stacks[labels, self._stack(frame)] += 1
+            self.samples += 1
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_name(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _frame_name(self, code):
+        name = self._frame_names.get(code)
+        if name is None:
+            name = self._frame_names[code] = '%s (%s:%i)' % (
+                code.co_name, os.path.basename(code.co_filename), code.co_firstlineno
+            )
+        return name
+
+    def collapsed(self):
+        """Collapsed stacks, one `scope;...;frame;frame;... count` line per stack."""
+        return [
+            '%s %i' % (';'.join(name.replace(';', ':') for name in labels + frames), count)
+            for (labels, frames), count in sorted(self.stacks.items())
+        ]
+
+    def summary(self, top=TOP_FUNCTIONS):
+        """Top hot functions by own and total samples, and samples per scope."""
+        own = Counter()
+        total = Counter()
+        scopes = Counter()
+        for (labels, frames), count in self.stacks.items():
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+            for i in range(1, len(labels) + 1):
+                scopes[' / '.join(labels[:i])] += count
+
+        samples = self.samples or 1
+        lines = ['%i samples in %.1fs (interval %gs)' % (
+            self.samples, self.duration, self.interval
+        )]
+
+        for title, counter in (('own', own), ('total', total)):
+            lines.extend(['', 'Top %i functions by %s samples:' % (top, title)])
+            for name, count in counter.most_common(top):
+                lines.append('%8i %6.2f%%  %s' % (count, 100.0 * count / samples, name))
+
+        lines.extend(['', 'Samples by scope:'])
+        for name, count in sorted(scopes.items()):
+            lines.append('%8i %6.2f%%  %s' % (count, 100.0 * count / samples, name))
+        return lines
+
+    def write(self, directory, top=TOP_FUNCTIONS):
+        """Write collapsed stacks and summary to directory.
+
+        :return: paths of written files
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for filename, lines in ((COLLAPSED_FILENAME, self.collapsed()),
+                                (SUMMARY_FILENAME, self.summary(top))):
+            path = os.path.join(directory, filename)
+            with open(path, 'w') as fp:
+                fp.write('\n'.join(lines) + '\n')
+            paths.append(path)
+        return paths
@@ -0,0 +1,208 @@
+"""
+Schedule assets validation by expected duration.
+
+Durations and transfer counts of validated assets are saved to stats file (if
+any), next run starts the longest jobs first (LPT, longest processing time) on a pool of
+workers shared by all networks, so one giant token doesn't start last and
+dominate total validation time.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .profiling import scope
+
+logger = logging.getLogger(__name__)
+
+# expected duration of asset when no stats recorded at all
+DEFAULT_COST = 1.0
+
+Job = namedtuple('Job', ['network', 'index', 'asset', 'cost'])
+
+JobResult = namedtuple('JobResult', ['job', 'errors', 'duration', 'transfers', 'ignored'])
+JobResult.__new__.__defaults__ = (frozenset(),)
+
+
+def asset_key(asset):
+    """Stats key of asset: lowercase contract address, symbol if asset has no address.
+
+    Symbols are not unique, so they are not used for contracts.
+    """
+    address = asset.get('blockchainParams', {}).get('address')
+    return address.lower() if isinstance(address, str) else asset.get('symbol')
+
+
+class ValidationStats:
+
+    """Per-asset validation durations and transfer counts from previous runs.
+
+    Stats are kept by network and asset key (see `asset_key`).
+    """
+
+    def __init__(self, path=None):
+        """Constructor.
+
+        :param path: stats file, None to keep stats in memory only
+        """
+        self.path = path
+        self.data = {}
+        if path and os.path.exists(path):
+            with open(path) as fp:
+                self.data = json.load(fp)
+        self._lock = threading.Lock()
+
+    def get(self, network, key):
+        return self.data.get(network, {}).get(key)
+
+    def cost(self, network, key):
+        """Expected validation duration of asset.
+
+        Unknown asset (new one) is expected to be as long as the longest known
+        asset of network, so it is not left to the end.
+
+        :return: duration in seconds
+        """
+        stats = self.get(network, key)
+        if stats is not None:
+            return stats['duration']
+
+        durations = [item['duration'] for item in self.data.get(network, {}).values()]
+        return max(durations) if durations else DEFAULT_COST
+
+    def record(self, network, key, duration, transfers):
+        with self._lock:
+            self.data.setdefault(network, {})[key] = {
+                'duration': round(duration, 3),
+                'transfers': transfers,
+            }
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            with open(self.path + '.tmp', 'w') as fp:
+                json.dump(self.data, fp, indent=2, sort_keys=True)
+            os.replace(self.path + '.tmp', self.path)
+
+
+class Scheduler:
+
+    """Validate assets of all networks on shared worker pool, longest first."""
+
+    def __init__(self, stats, workers=1, clock=time.monotonic):
+        """Constructor.
+
+        :param stats: ValidationStats instance
+        :param workers: number of assets validated at once
+        :param clock: time source
+        """
+        self.stats = stats
+        self.workers = workers
+        self.clock = clock
+        self.validators = {}
+        self.jobs = []
+
+    def add(self, network, validator, assets):
+        """Add assets of network.
+
+        :param network: network name
+        :param validator: assets validator of network (see `create_assets_validator`)
+        :param assets: list of assets
+        """
+        self.validators[network] = validator
+        for index, asset in enumerate(assets):
+            cost = self.stats.cost(network, asset_key(asset))
+            self.jobs.append(Job(network, index, asset, cost))
+
+    def ordered_jobs(self):
+        """Jobs in LPT order."""
+        return sorted(self.jobs, key=lambda job: job.cost, reverse=True)
+
+    def run_job(self, job):
+        network_validator = self.validators[job.network]
+        contract_validator = network_validator.contract_validator
+
+        # jsonschema validator keeps resolution scope, so it is not shared between workers
+        validator = type(network_validator)(network_validator.schema)
+        validator.contract_validator = contract_validator
+
+        started_at = self.clock()
+        with scope('%s:%s' % (job.network, job.asset.get('symbol'))):
+            errors = list(validator.descend(job.asset, validator.schema['items'],
+                                            path=job.index, schema_path='items'))
+        duration = self.clock() - started_at
+        return JobResult(job, errors, duration, contract_validator.transfers,
+                         contract_validator.ignored)
+
+    def run(self):
+        """Validate all assets.
+
+        Jobs are submitted in LPT order, pool queue is FIFO, so every free worker
+        takes the longest job left.
+
+        :return: iterator over JobResult in order of completion
+        """
+        jobs = self.ordered_jobs()
+        progress = Progress(jobs, self.workers)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.run_job, job) for job in jobs]
+            positions = {future: position for position, future in enumerate(futures)}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                # futures finished at once are reported in LPT order
+                for future in sorted(done, key=positions.get):
+                    try:
+                        result = future.result()
+                    except BaseException:
+                        for pending_future in pending:
+                            pending_future.cancel()
+                        raise
+                    progress.done(result)
+                    logger.info("[%i/%i] %s (%s) validated in %.1fs, %i TXs, ETA %s",
+                                progress.finished, len(jobs), result.job.asset.get('symbol'),
+                                result.job.network, result.duration, result.transfers,
+                                format_duration(progress.eta()))
+                    yield result
+
+
+class Progress:
+
+    """Remaining time estimation.
+
+    Expected cost of remaining jobs is corrected by ratio of actual to expected
+    duration of finished jobs (node may be faster or slower than last time) and
+    divided between workers.
+    """
+
+    def __init__(self, jobs, workers):
+        self.remaining_cost = sum(job.cost for job in jobs)
+        self.workers = workers
+        self.finished = 0
+        self.expected = 0.0
+        self.actual = 0.0
+
+    def done(self, result):
+        self.finished += 1
+        self.remaining_cost -= result.job.cost
+        self.expected += result.job.cost
+        self.actual += result.duration
+
+    def eta(self):
+        ratio = self.actual / self.expected if self.expected else 1.0
+        return max(0.0, self.remaining_cost) * ratio / self.workers
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return '%is' % seconds
+    if seconds < 3600:
+        return '%im %02is' % divmod(seconds, 60)
+    hours, seconds = divmod(seconds, 3600)
+    return '%ih %02im' % (hours, seconds // 60)
@@ -0,0 +1,315 @@
+"""
+Watch daemon: keep staticGasAmount statistics of assets current.
+
+Every network is watched by own thread: assets are validated (without gas scan)
+every `validate_interval` seconds, and contract TXs are scanned from deployment
+block once, then only TXs from new blocks are fed to per-token aggregators.
+Tokens are scanned concurrently, so backfill of a big token doesn't hold back
+others. Current statistics and validation
+status are served over small HTTP API:
+
+- `GET /status` - all networks and tokens
+- `GET /networks/<network>/tokens/<address>` - single token
+
+Both accept `percentile` query argument (0 - 100).
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+from .assets_validator import create_assets_validator
+from .assets_validator.contract import LAST_HARD_FORK_BLOCK
+from .assets_validator.utils import RangedTDigest, is_address, normalize_address
+
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 15
+
+# seconds between validations of assets (contracts and metadata may change)
+VALIDATE_INTERVAL = 3600
+
+# tokens scanned at once per network
+SCAN_WORKERS = 4
+
+# end of open range for blocks after last hard fork
+LATEST_BLOCK = 2 ** 63
+
+
+class TokenGasStats:
+
+    """Gas statistics and validation status of single token."""
+
+    def __init__(self, asset):
+        blockchain_params = asset['blockchainParams']
+
+        self.symbol = asset['symbol']
+        self.address = normalize_address(blockchain_params['address'])
+        self.expected_max_gas = blockchain_params.get('staticGasAmount')
+        self.deployment_block = blockchain_params.get('deploymentBlockNumber', 0)
+
+        self.last_block = None
+        self.transfers = 0
+        self.errors = []
+
+        self.per_fork_tdigest = RangedTDigest([LAST_HARD_FORK_BLOCK, LATEST_BLOCK])
+        self._lock = threading.Lock()
+
+    def update(self, receipts, to_block):
+        """Feed receipts scanned up to block.
+
+        Receipts are aggregated separately and merged at once, so statistics are
+        not changed if scan fails.
+
+        :param receipts: receipts with `blockNumber` and `gasUsed`
+        :param to_block: last scanned block
+        """
+        per_fork_tdigest = RangedTDigest(self.per_fork_tdigest.ranges)
+        transfers = 0
+        for tx in receipts:
+            per_fork_tdigest.update(tx.blockNumber, tx.gasUsed)
+            transfers += 1
+
+        with self._lock:
+            self.per_fork_tdigest.merge(per_fork_tdigest)
+            self.transfers += transfers
+            self.last_block = to_block
+
+    def set_errors(self, errors):
+        """Replace validation errors.
+
+        :param errors: list of error messages
+        """
+        with self._lock:
+            self.errors = errors
+
+    def snapshot(self, percentile):
+        """Current statistics.
+
+        :param percentile: gas amount percentile
+        :return: json serializable dict
+        """
+        with self._lock:
+            by_range = self.per_fork_tdigest.all(percentile) if self.transfers else []
+            errors = list(self.errors)
+            last_block = self.last_block
+            transfers = self.transfers
+
+        actual = max([value for _, value in by_range]) if by_range else None
+
+        if last_block is None:
+            status = 'backfilling'
+        elif errors or (actual is not None and self.expected_max_gas is not None
+                        and actual > self.expected_max_gas):
+            status = 'failed'
+        else:
+            status = 'ok'
+
+        return {
+            'symbol': self.symbol,
+            'address': self.address,
+            'status': status,
+            'errors': errors,
+            'lastBlock': last_block,
+            'transfers': transfers,
+            'staticGasAmount': self.expected_max_gas,
+            'percentile': percentile,
+            'actual': actual,
+            'beforeBlock': {
+                str(range_end): value for range_end, value in by_range
+            },
+        }
+
+
+class NetworkWatcher(threading.Thread):
+
+    """Watch assets of single network."""
+
+    def __init__(self, network, node, assets, poll_interval=POLL_INTERVAL,
+                 validate_interval=VALIDATE_INTERVAL, scan_workers=SCAN_WORKERS,
+                 clock=time.monotonic, **kwargs):
+        """Constructor.
+
+        :param network: network name (from `assets_index.json`)
+        :param node: ethereum node to use
+        :param assets: list of assets
+        :param poll_interval: new head polling interval (seconds)
+        :param validate_interval: assets validation interval (seconds)
+        :param scan_workers: number of tokens scanned at once
+        :param clock: time source
+        :param kwargs: see ContractValidator kwargs
+        """
+        super().__init__(name='watch-%s' % network, daemon=True)
+        self.network = network
+        self.assets = assets
+        self.poll_interval = poll_interval
+        self.validate_interval = validate_interval
+        self.scan_workers = scan_workers
+        self.clock = clock
+        self.validated_at = None
+
+        self.validator = create_assets_validator(node=node, check_gas=False, **kwargs)
+        self.contract_validator = self.validator.contract_validator
+
+        # tokens by checksum address, symbols are not unique
+        self.tokens = {}
+        for asset in assets:
+            blockchain_params = asset.get('blockchainParams', {})
+            if blockchain_params.get('type') != 'erc-20':
+                continue
+            if not is_address(blockchain_params.get('address')):
+                continue
+            token = TokenGasStats(asset)
+            self.tokens[token.address] = token
+
+        # token address -> future of running scan
+        self.scanning = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.scan_workers,
+                                thread_name_prefix='scan-%s' % self.network) as executor:
+            while True:
+                self.poll(executor)
+                if self.stopped.wait(self.poll_interval):
+                    break
+
+    def poll(self, executor):
+        """Revalidate assets if it is time to, start scans of tokens behind head.
+
+        Scan of token is not started while its previous scan is running, so
+        backfilling token catches up on its own pace.
+
+        :param executor: executor to scan tokens on
+        """
+        if self.validated_at is None or \
+                self.clock() - self.validated_at >= self.validate_interval:
+            self.validate()
+
+        try:
+            head = self.head_block()
+        except Exception:
+            logger.exception("Can't get %s head block", self.network)
+            return
+
+        for address, token in self.tokens.items():
+            if address in self.scanning:
+                continue
+            if token.last_block is None or token.last_block < head:
+                future = self.scanning[address] = executor.submit(self.scan, token, head)
+                future.add_done_callback(
+                    lambda _, address=address: self.scanning.pop(address, None)
+                )
+
+    def stop(self):
+        self.stopped.set()
+
+    def head_block(self) -> int:
+        contract_validator = self.contract_validator
+        return contract_validator.web3.eth.blockNumber - contract_validator.confirmations
+
+    def validate(self):
+        """Validate assets (without gas scan) and store errors."""
+        self.validated_at = self.clock()
+        for asset in self.assets:
+            token = self.get_token(asset.get('blockchainParams', {}).get('address'))
+            if token is None:
+                continue
+            try:
+                token.set_errors(
+                    [error.message for error in self.validator.iter_errors([asset])]
+                )
+            except Exception as e:
+                logger.exception("Can't validate %s", token.symbol)
+                token.set_errors([str(e)])
+
+    def scan(self, token, to_block):
+        """Scan token TXs after last scanned block (from deployment on first scan).
+
+        :param token: TokenGasStats instance
+        :param to_block: last block to scan
+        """
+        from_block = token.deployment_block if token.last_block is None else token.last_block + 1
+
+        logger.debug("Scan %s (%s) blocks %i - %i", token.symbol, self.network,
+                     from_block, to_block)
+        try:
+            receipts = self.contract_validator.iter_receipts(
+                token.address, self.contract_validator.transfer_topics(token.address),
+                from_block, to_block
+            )
+            token.update(receipts, to_block)
+        except Exception:
+            logger.exception("Can't scan %s (%s) blocks %i - %i, retry on next head",
+                             token.symbol, self.network, from_block, to_block)
+
+    def get_token(self, address):
+        """Token by address (checksum or not).
+
+        :return: TokenGasStats instance, None if token is not watched
+        """
+        if not is_address(address):
+            return None
+        return self.tokens.get(normalize_address(address))
+
+    def snapshot(self, percentile):
+        return {
+            address: token.snapshot(percentile) for address, token in self.tokens.items()
+        }
+
+
+class WatchRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = [x for x in url.path.split('/') if x]
+
+        try:
+            percentile = float(parse_qs(url.query).get('percentile', [self.server.percentile])[0])
+        except ValueError:
+            percentile = None
+        if percentile is None or not 0 <= percentile <= 100:
+            return self.send_json(400, {'error': 'invalid percentile'})
+
+        watchers = self.server.watchers
+
+        if path == ['status']:
+            return self.send_json(200, {
+                network: watcher.snapshot(percentile) for network, watcher in watchers.items()
+            })
+
+        if len(path) == 4 and path[0] == 'networks' and path[2] == 'tokens':
+            watcher = watchers.get(path[1])
+            token = watcher.get_token(path[3]) if watcher else None
+            if token is not None:
+                return self.send_json(200, token.snapshot(percentile))
+
+        self.send_json(404, {'error': 'not found'})
+
+    def send_json(self, code, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class WatchServer(ThreadingMixIn, HTTPServer):
+
+    """HTTP API server for network watchers."""
+
+    daemon_threads = True
+
+    def __init__(self, server_address, watchers, percentile=100):
+        super().__init__(server_address, WatchRequestHandler)
+        self.watchers = {watcher.network: watcher for watcher in watchers}
+        self.percentile = percentile
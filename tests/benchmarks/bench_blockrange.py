@@ -0,0 +1,31 @@
+from jwallet_tools.blockexplorer.blockrange import VariableBlockRange
+
+from .conftest import HEAD_BLOCK
+
+BATCH_SIZE = 1000
+
+# change batch size every N batches, like throttled range does after every request
+STEP_CHANGE_INTERVAL = 10
+
+
+def iterate(block_range):
+    batches = 0
+    for i, _ in enumerate(block_range):
+        batches += 1
+        if i % STEP_CHANGE_INTERVAL == 0:
+            block_range.set_step(BATCH_SIZE + i % 7)
+    return batches
+
+
+def test_block_range_forward(benchmark):
+    batches = benchmark(lambda: iterate(VariableBlockRange(0, HEAD_BLOCK, batch_size=BATCH_SIZE)))
+
+    assert batches > HEAD_BLOCK // (BATCH_SIZE * 2)
+
+
+def test_block_range_reverse(benchmark):
+    batches = benchmark(lambda: iterate(
+        VariableBlockRange(0, HEAD_BLOCK, reverse=True, batch_size=BATCH_SIZE)
+    ))
+
+    assert batches > 0
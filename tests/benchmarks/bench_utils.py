@@ -0,0 +1,74 @@
+import logging
+
+from jwallet_tools.assets_validator.contract import ERC20_ABI, ERC20_METHODS
+from jwallet_tools.assets_validator.utils import (
+    IgnoreLoggerAdapter,
+    IgnoreRules,
+    RangedTDigest,
+    make_signature,
+    normalize_address,
+    signature_exist,
+)
+
+from .conftest import FORK_BLOCK, HEAD_BLOCK
+
+
+def test_signature_exist(benchmark, bytecode, signatures):
+    def check_all():
+        return [signature_exist(bytecode, signature) for signature in signatures]
+
+    assert any(benchmark(check_all))
+
+
+def test_make_signature(benchmark):
+    functions = [item for item in ERC20_ABI if item.get('type') == 'function'] * 100
+
+    def make_all():
+        return [make_signature(item['name'], item.get('inputs', [])) for item in functions]
+
+    assert 'transfer(address,uint256)' in benchmark(make_all)
+
+
+def test_normalize_address(benchmark, addresses):
+    result = benchmark(lambda: [normalize_address(address) for address in addresses])
+
+    assert len(result) == len(addresses)
+
+
+def test_method_ignored(benchmark, tokens, ignore_rules):
+    methods = [name for name, _, _ in ERC20_METHODS]
+    log = IgnoreLoggerAdapter(logging.getLogger(__name__), extra={
+        'ignore': IgnoreRules(ignore_rules)
+    })
+
+    def check_all():
+        ignored = 0
+        for token in tokens:
+            log.extra['token'] = token
+            for method in methods:
+                ignored += log._method_ignored(method)
+        return ignored
+
+    assert benchmark(check_all) > 0
+
+
+def test_ranged_tdigest_update(benchmark, gas_samples):
+    def update_all():
+        per_fork_tdigest = RangedTDigest([FORK_BLOCK, HEAD_BLOCK])
+        for block_number, gas_used in gas_samples:
+            per_fork_tdigest.update(block_number, gas_used)
+        return per_fork_tdigest
+
+    per_fork_tdigest = benchmark.pedantic(update_all, rounds=3, iterations=1)
+
+    assert sum(tdigest.n for tdigest in per_fork_tdigest.by_range.values()) > 0
+
+
+def test_ranged_tdigest_all(benchmark, gas_samples):
+    per_fork_tdigest = RangedTDigest([FORK_BLOCK, HEAD_BLOCK])
+    for block_number, gas_used in gas_samples:
+        per_fork_tdigest.update(block_number, gas_used)
+
+    result = benchmark(lambda: [per_fork_tdigest.all(p) for p in (50, 90, 95, 99, 100)])
+
+    assert len(result) == 5
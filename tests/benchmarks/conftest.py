@@ -0,0 +1,83 @@
+"""
+Synthetic inputs for hot path benchmarks (no node required).
+
+Run with `make bench`, compare with stored baseline with `make bench-compare`
+(baseline file is set by `BENCH_BASELINE`, see Makefile).
+"""
+import random
+
+import pytest
+
+from jwallet_tools.assets_validator.contract import ERC20_ABI
+from jwallet_tools.assets_validator.utils import load_json, make_signature, signature_selector
+
+# size of big deployed contract (EIP-170 limit is 24576 bytes)
+CODE_SIZE = 24 * 1024
+
+ADDRESSES = 1000
+
+TOKENS = 500
+
+IGNORE_RULES = 2000
+
+GAS_SAMPLES = 10 ** 5
+
+FORK_BLOCK = 7280000
+
+HEAD_BLOCK = 8500000
+
+
+@pytest.fixture(scope='session')
+def rng():
+    return random.Random(42)
+
+
+@pytest.fixture(scope='session')
+def signatures():
+    return [
+        make_signature(item['name'], item.get('inputs', []))
+        for item in ERC20_ABI if item.get('type') == 'function'
+    ]
+
+
+@pytest.fixture(scope='session')
+def bytecode(rng, signatures):
+    """Random contract code with PUSH4 selectors of half of ERC20 methods."""
+    code = bytearray(rng.getrandbits(8) for _ in range(CODE_SIZE))
+    for i, signature in enumerate(signatures[::2]):
+        position = 100 + i * 50
+        code[position:position + 5] = b'\x63' + bytes.fromhex(signature_selector(signature))
+    return bytes(code)
+
+
+@pytest.fixture(scope='session')
+def addresses(rng):
+    return ['0x%040x' % rng.getrandbits(160) for _ in range(ADDRESSES)]
+
+
+@pytest.fixture(scope='session')
+def tokens(rng):
+    return [
+        {'name': 'Token %i' % i, 'symbol': 'T%i' % i}
+        for i in rng.sample(range(TOKENS * 10), TOKENS)
+    ]
+
+
+@pytest.fixture(scope='session')
+def ignore_rules(rng, tokens, signatures):
+    """Ignore rules from schema plus synthetic per-token ones."""
+    methods = [signature.split('(')[0] for signature in signatures]
+    rules = set(load_json('assets.schema.json')['items']['isValidContract']['ignore'])
+    while len(rules) < IGNORE_RULES:
+        token = rng.choice(tokens)['symbol']
+        rules.add('%s.%s' % (token, rng.choice(methods + ['*'])))
+    return rules
+
+
+@pytest.fixture(scope='session')
+def gas_samples(rng):
+    """(blockNumber, gasUsed) of transfers, most of them after last hard fork."""
+    return [
+        (rng.randint(FORK_BLOCK - 10 ** 6, HEAD_BLOCK), int(rng.lognormvariate(10.6, 0.3)))
+        for _ in range(GAS_SAMPLES)
+    ]
@@ -1,3 +1,8 @@
+import json
+import socket
+import threading
+import time
+
 import pytest
 
 from web3 import Web3, HTTPProvider
@@ -26,3 +31,77 @@ def validator():
 @pytest.fixture
 def contract(w3):
     return w3.eth.contract(TEST_TOKEN_ADDRESS, abi=ERC20_ABI)
+
+
+class StandInNode(threading.Thread):
+
+    """Unix socket JSON-RPC server answering every request in own thread.
+
+    `eth_getTransactionReceipt` params[0] is delay, so responses come out of order.
+    """
+
+    def __init__(self, path):
+        super().__init__(daemon=True)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(5)
+        self.connections = 0
+
+    def run(self):
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self.serve, args=(sock,), daemon=True).start()
+
+    def serve(self, sock):
+        lock = threading.Lock()
+        decoder = json.JSONDecoder()
+        buffer = ''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                return
+            buffer += chunk.decode('utf-8')
+            while buffer:
+                try:
+                    request, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    break
+                buffer = buffer[end:]
+                threading.Thread(target=self.answer, args=(sock, lock, request)).start()
+
+    def answer(self, sock, lock, request):
+        if request['method'] == 'eth_blockNumber':
+            response = {'result': '0x10'}
+        elif request['method'] == 'eth_getLogs':
+            response = {'result': [
+                {'transactionHash': delay, 'blockNumber': request['params'][0]['fromBlock']}
+                for delay in ('0.02', '0', '0.01')
+            ]}
+        elif request['method'] == 'eth_getTransactionReceipt':
+            time.sleep(float(request['params'][0]))
+            response = {'result': {
+                'transactionHash': request['params'][0],
+                'blockNumber': '0x1',
+                'gasUsed': '0x5208',
+            }}
+        else:
+            response = {'error': {'code': -32601, 'message': 'method not found'}}
+        response.update(jsonrpc='2.0', id=request['id'])
+        with lock:
+            sock.sendall(json.dumps(response).encode('utf-8') + b'\n')
+
+    def close(self):
+        self.server.close()
+
+
+@pytest.fixture
+def node(tmpdir):
+    path = str(tmpdir.join('node.ipc'))
+    server = StandInNode(path)
+    server.start()
+    yield server, 'ipc://' + path
+    server.close()
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from jwallet_tools.assets_validator import (
+    create_assets_validator,
+    get_assets_validator_class,
+    load_schema,
+)
+
+from .conftest import NODE_URL
+
+
+OTHER_NODE_URL = "https://ropsten-node.jwallet.network/"
+
+
+def test_validator_class_is_cached():
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        classes = list(executor.map(lambda _: get_assets_validator_class(), range(32)))
+
+    assert all(cls is classes[0] for cls in classes)
+    assert load_schema() is load_schema()
+
+
+def test_contract_validator_bound_per_network():
+    mainnet = create_assets_validator(node=NODE_URL, fast=True)
+    ropsten = create_assets_validator(node=OTHER_NODE_URL, ignore=['GNT.*'], fast=True)
+
+    assert type(mainnet) is type(ropsten)
+    assert mainnet.schema is ropsten.schema
+    assert mainnet.contract_validator.node == NODE_URL
+    assert ropsten.contract_validator.node == OTHER_NODE_URL
+    assert ropsten.contract_validator.ignore == {'GNT.*'}
+
+
+def test_bound_contract_validator_invoked():
+    validator = create_assets_validator(node=NODE_URL, fast=True)
+    errors = list(validator.iter_errors([{
+        "name": "Pundi X",
+        "symbol": "PXS",
+        "display": {},
+        "blockchainParams": {
+            "type": "erc-20",
+            "address": "invalid",
+            "decimals": 18,
+            "staticGasAmount": 0,
+            "deploymentBlockNumber": 0
+        }
+    }]))
+
+    assert "invalid is not an address" in [error.message for error in errors]
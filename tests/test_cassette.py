@@ -0,0 +1,163 @@
+import json
+import os
+from unittest import mock
+
+import pytest
+from click.testing import CliRunner
+
+from jwallet_tools.__main__ import main
+from jwallet_tools.assets_validator import _http_provider
+from jwallet_tools.assets_validator.cassette import (
+    Cassette,
+    CassetteMiss,
+    RECORD,
+    REPLAY,
+    request_key,
+)
+from jwallet_tools.blockexplorer.rpc import RawRPCBackend
+
+from .conftest import NODE_URL
+
+
+def rpc_request(request_id, method, params):
+    return json.dumps({
+        'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params
+    }).encode('utf-8')
+
+
+@pytest.fixture
+def cassette_path(tmpdir):
+    return str(tmpdir.join('node.cassette'))
+
+
+def test_record_replay(cassette_path):
+    keys = [request_key('POST', NODE_URL, 'eth_blockNumber', [i]) for i in range(100)]
+
+    with Cassette(cassette_path, RECORD) as cassette:
+        for i, key in enumerate(keys):
+            assert cassette.fetch(key, lambda: b'response %i' % i) == b'response %i' % i
+        assert len(cassette) == 100
+
+    with Cassette(cassette_path, REPLAY) as cassette:
+        assert len(cassette) == 100
+        for i, key in enumerate(keys):
+            assert cassette.get(key) == b'response %i' % i
+
+        with pytest.raises(CassetteMiss):
+            cassette.fetch(request_key('POST', NODE_URL, 'eth_blockNumber', []), mock.Mock())
+
+
+def test_record_appends(cassette_path):
+    first, second = request_key('first'), request_key('second')
+
+    with Cassette(cassette_path, RECORD) as cassette:
+        cassette.fetch(first, lambda: b'first')
+
+    request = mock.Mock(return_value=b'second')
+    with Cassette(cassette_path, RECORD) as cassette:
+        assert cassette.fetch(first, request) == b'first'
+        assert cassette.fetch(second, request) == b'second'
+        assert cassette.fetch(second, request) == b'second'
+    assert request.call_count == 1, "recorded responses must be served from cassette"
+
+    with Cassette(cassette_path, REPLAY) as cassette:
+        assert [cassette.get(first), cassette.get(second)] == [b'first', b'second']
+    assert os.path.getsize(cassette_path + '.idx') == 2 * 32
+
+
+def test_replay_without_network(cassette_path):
+    response = b'{"jsonrpc": "2.0", "id": 1, "result": "0x10"}'
+
+    with mock.patch.object(_http_provider, '_make_post_request', return_value=response):
+        with Cassette(cassette_path, RECORD) as cassette:
+            _http_provider.set_cassette(cassette)
+            try:
+                _http_provider.make_post_request(
+                    NODE_URL, rpc_request(1, 'eth_blockNumber', [])
+                )
+            finally:
+                _http_provider.set_cassette(None)
+
+    with mock.patch.object(_http_provider, '_make_post_request') as post_mock:
+        with Cassette(cassette_path, REPLAY) as cassette:
+            _http_provider.set_cassette(cassette)
+            try:
+                assert RawRPCBackend(NODE_URL).call('eth_blockNumber', []) == '0x10'
+                with pytest.raises(CassetteMiss):
+                    RawRPCBackend(NODE_URL).call('eth_blockNumber', ['latest'])
+            finally:
+                _http_provider.set_cassette(None)
+    post_mock.assert_not_called()
+
+
+def test_volatile_and_error_responses(cassette_path):
+    block_number = b'{"jsonrpc": "2.0", "id": 1, "result": "0x10"}'
+    error = b'{"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "busy"}}'
+    pending = b'{"jsonrpc": "2.0", "id": 1, "result": null}'
+    receipt = b'{"jsonrpc": "2.0", "id": 1, "result": {"gasUsed": "0x5208"}}'
+    responses = [block_number, error, pending, block_number.replace(b'0x10', b'0x11'), receipt]
+
+    with mock.patch.object(_http_provider, '_make_post_request', side_effect=responses):
+        with Cassette(cassette_path, RECORD) as cassette:
+            _http_provider.set_cassette(cassette)
+            try:
+                for method, params in [('eth_blockNumber', []),
+                                       ('eth_getTransactionReceipt', ['0x01']),
+                                       ('eth_getTransactionReceipt', ['0x01']),
+                                       ('eth_blockNumber', []),
+                                       ('eth_getTransactionReceipt', ['0x01'])]:
+                    _http_provider.make_post_request(NODE_URL, rpc_request(1, method, params))
+            finally:
+                _http_provider.set_cassette(None)
+
+    with Cassette(cassette_path, REPLAY) as cassette:
+        assert len(cassette) == 2
+        assert cassette.get(request_key('POST', NODE_URL, 'eth_blockNumber', [])) == \
+            responses[3], "volatile response must be refreshed"
+        assert cassette.get(
+            request_key('POST', NODE_URL, 'eth_getTransactionReceipt', ['0x01'])
+        ) == receipt, "error and null receipt responses must not be recorded"
+
+
+def test_is_recordable_response():
+    assert _http_provider.is_recordable_response('eth_blockNumber', b'{"result": "0x10"}')
+    assert _http_provider.is_recordable_response('eth_call', b'{"result": null}')
+    assert not _http_provider.is_recordable_response('eth_call', b'{"error": {"code": 1}}')
+    assert not _http_provider.is_recordable_response('eth_call', b'<html>')
+    assert not _http_provider.is_recordable_response('eth_getTransactionReceipt',
+                                                     b'{"result": null}')
+    assert not _http_provider.is_recordable_response('eth_getTransactionByHash',
+                                                     b'{"result": null}')
+
+
+@pytest.mark.parametrize('node', ['ipc:///tmp/geth.ipc', 'ws://127.0.0.1:8546'])
+def test_socket_node_rejected(cassette_path, node):
+    result = CliRunner().invoke(main, ['validate', '--node', node, '--record', cassette_path, '-'],
+                                input='[]')
+    assert result.exit_code == 2
+    assert "can't be used with IPC/WebSocket nodes: %s" % node in result.output
+    assert not os.path.exists(cassette_path)
+
+
+def test_is_volatile_request():
+    assert _http_provider.is_volatile_request('eth_blockNumber', [])
+    assert _http_provider.is_volatile_request('eth_call', [{'to': '0x01'}, 'latest'])
+    assert _http_provider.is_volatile_request('eth_getLogs', [{'toBlock': 'pending'}])
+    assert not _http_provider.is_volatile_request('eth_getLogs', [{'toBlock': '0x10'}])
+    assert not _http_provider.is_volatile_request('eth_getTransactionReceipt', ['0x01'])
+
+
+def test_index_flushed_while_recording(cassette_path, monkeypatch):
+    monkeypatch.setattr('jwallet_tools.assets_validator.cassette.FLUSH_INTERVAL', 0)
+    first, second = request_key('first'), request_key('second')
+
+    cassette = Cassette(cassette_path, RECORD)
+    try:
+        cassette.fetch(first, lambda: b'first')
+        with Cassette(cassette_path, REPLAY) as replay:
+            assert replay.get(first) == b'first'
+
+        cassette.fetch(second, lambda: b'second')
+        assert [cassette.get(first), cassette.get(second)] == [b'first', b'second']
+    finally:
+        cassette.close()
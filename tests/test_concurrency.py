@@ -0,0 +1,91 @@
+from unittest import mock
+
+import pytest
+import requests
+from click import BadParameter
+
+from jwallet_tools.__main__ import CONCURRENCY
+from jwallet_tools.blockexplorer.concurrency import AdaptiveConcurrencyLimiter
+from jwallet_tools.blockexplorer.events import EventReceiptIterator, ReceiptFetchError
+from jwallet_tools.blockexplorer.rpc import Log, Receipt
+
+from .conftest import TEST_TOKEN_ADDRESS
+
+
+def test_grow_while_latency_flat():
+    limiter = AdaptiveConcurrencyLimiter(initial=10, max_limit=12)
+    for _ in range(100):
+        limiter.update(0.1)
+    assert limiter.limit == 12
+
+
+def test_backoff_on_error():
+    limiter = AdaptiveConcurrencyLimiter(initial=10)
+    limiter.update(0.1, error=True)
+    assert limiter.limit == 7
+
+    # one burst of errors decreases limit only once
+    for _ in range(5):
+        limiter.update(0.1, error=True)
+    assert limiter.limit == 7
+
+
+def test_backoff_on_latency_spike():
+    limiter = AdaptiveConcurrencyLimiter(initial=10)
+    for _ in range(5):
+        limiter.update(0.1)
+    for _ in range(10):
+        limiter.update(1)
+    assert limiter.limit < 10
+
+
+@pytest.fixture
+def backend():
+    backend = mock.Mock()
+    backend.get_logs.return_value = [Log('0x01', 1)]
+    return backend
+
+
+def test_receipt_retry(backend):
+    backend.get_transaction_receipt.side_effect = [
+        requests.exceptions.HTTPError('429 Too Many Requests'),
+        None,
+        Receipt('0x01', 1, 21000),
+    ]
+    iterator = EventReceiptIterator(None, TEST_TOKEN_ADDRESS, 1, 1, concurrency='auto',
+                                    backend=backend)
+
+    with mock.patch('jwallet_tools.blockexplorer.events.RECEIPT_RETRY_DELAY', 0):
+        assert list(iterator) == [Receipt('0x01', 1, 21000)]
+    assert iterator.concurrency_level > 0
+
+
+def test_receipt_retries_exhausted(backend):
+    backend.get_transaction_receipt.side_effect = requests.exceptions.Timeout()
+    iterator = EventReceiptIterator(None, TEST_TOKEN_ADDRESS, 1, 1, retries=2, backend=backend)
+
+    with mock.patch('jwallet_tools.blockexplorer.events.RECEIPT_RETRY_DELAY', 0):
+        with pytest.raises(ReceiptFetchError):
+            list(iterator)
+    assert backend.get_transaction_receipt.call_count == 3
+
+
+def test_slot_released_when_submit_fails(backend):
+    iterator = EventReceiptIterator(None, TEST_TOKEN_ADDRESS, 1, 1, concurrency=1,
+                                    backend=backend)
+    executor = mock.Mock()
+    executor.submit.side_effect = RuntimeError('cannot schedule new futures after shutdown')
+    queue = mock.Mock()
+
+    iterator.writer(iter([Log('0x01', 1)]), queue, executor)
+
+    assert isinstance(queue.put.call_args_list[0][0][0], RuntimeError)
+    assert iterator.limiter._in_flight == 0
+
+
+def test_concurrency_option():
+    assert CONCURRENCY.convert('auto', None, None) == 'auto'
+    assert CONCURRENCY.convert('100', None, None) == 100
+    for value in ('0', '-1', 'fast'):
+        with pytest.raises(BadParameter):
+            CONCURRENCY.convert(value, None, None)
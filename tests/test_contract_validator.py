@@ -1,8 +1,12 @@
 from unittest import mock
 import pytest
+from click.testing import CliRunner
 
 from web3.datastructures import AttributeDict
 
+from jwallet_tools.__main__ import main
+from jwallet_tools.assets_validator.contract import ContractValidator
+
 from .conftest import (
     TEST_TOKEN_ADDRESS,
     TEST_TOKEN_GAS,
@@ -19,7 +23,7 @@ def test_known_gas_amount(validator, contract):
     receipts_mock.return_value.return_value = [
         AttributeDict({'gasUsed': TEST_TOKEN_GAS, 'blockNumber': 5 * 10 ** 6})
     ]
-    with mock.patch('jwallet_tools.assets_validator.contract.EventReceiptIterator'):
+    with mock.patch('jwallet_tools.blockexplorer.events.EventReceiptIterator'):
         with pytest.raises(StopIteration):
             next(iter(
                 validator.validate_static_gas_amount(
@@ -101,3 +105,40 @@ def validator_args():
         },
         None
     ]
+
+
+def test_head_block_pinned():
+    validator = ContractValidator(NODE_URL, fast=True, confirmations=12)
+    validator.web3 = mock.Mock()
+    type(validator.web3.eth).blockNumber = mock.PropertyMock(side_effect=[100, 200])
+
+    assert validator.head_block == 88
+    assert validator.head_block == 88
+
+    assert ContractValidator(NODE_URL, fast=True, block_identifier=50).head_block == 50
+
+
+def test_block_with_confirmations_rejected():
+    result = CliRunner().invoke(main, [
+        'validate', '--node', NODE_URL, '--block', '100', '--confirmations', '12', '-'
+    ], input='[]')
+
+    assert result.exit_code == 1
+    assert "[FAIL] --block and --confirmations can't be used together" in result.output
+
+
+def test_recent_gas_window():
+    validator = ContractValidator(NODE_URL, fast=True, block_identifier=1000,
+                                  gas_window_transfers=10, gas_window_blocks=100)
+    validator.log.extra = {'token': {'name': 'Test', 'symbol': 'TST'},
+                           'ignore': validator.get_ignore_rules({})}
+    contract = mock.Mock(address=TEST_TOKEN_ADDRESS)
+
+    with mock.patch.object(validator, 'iter_receipts', return_value=[
+        AttributeDict({'gasUsed': TEST_TOKEN_GAS, 'blockNumber': 990})
+    ]) as iter_receipts:
+        assert list(validator.validate_static_gas_amount(contract, TEST_TOKEN_GAS, 0)) == []
+
+    iter_receipts.assert_called_once_with(
+        TEST_TOKEN_ADDRESS, mock.ANY, 901, 1000, reverse=True, limit=10
+    )
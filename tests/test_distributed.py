@@ -0,0 +1,210 @@
+import threading
+from unittest import mock
+
+import pytest
+from click.testing import CliRunner
+
+from jwallet_tools.__main__ import main
+from jwallet_tools.assets_validator import create_assets_validator
+from jwallet_tools.blockexplorer.rpc import Receipt
+from jwallet_tools.distributed import (
+    ASSET_JOB,
+    CACHED_VALIDATORS,
+    DONE,
+    FAILED,
+    GAS_JOB,
+    MAX_ATTEMPTS,
+    QUEUED,
+    Coordinator,
+    Worker,
+    WorkQueue,
+    open_queue,
+    plan_jobs,
+)
+
+from .conftest import NODE_URL, TEST_TOKEN_ADDRESS
+
+
+HEAD_BLOCK = 1000
+
+
+def make_asset(symbol, gas, address=TEST_TOKEN_ADDRESS):
+    return {
+        "name": symbol,
+        "symbol": symbol,
+        "display": {},
+        "blockchainParams": {
+            "type": "erc-20",
+            "address": address,
+            "decimals": 18,
+            "staticGasAmount": gas,
+            "deploymentBlockNumber": 100
+        }
+    }
+
+
+@pytest.fixture
+def queue(tmpdir):
+    return open_queue('sqlite:///' + str(tmpdir.join('queue.db')))
+
+
+def test_claim_complete(queue):
+    queue.put('run', [(ASSET_JOB, {'index': 0}), (ASSET_JOB, {'index': 1})])
+
+    first = queue.claim('worker-1')
+    second = queue.claim('worker-2')
+    assert [first['payload'], second['payload']] == [{'index': 0}, {'index': 1}]
+    assert queue.claim('worker-3') is None
+
+    queue.complete(first['id'], 'worker-1', {'errors': []})
+    queue.complete(second['id'], 'other-worker', {'errors': []})
+
+    assert queue.counts('run') == {DONE: 1, 'claimed': 1}
+    assert queue.results('run')[0]['result'] == {'errors': []}
+
+
+def test_retry_and_lease(queue):
+    queue.put('run', [(GAS_JOB, {})])
+
+    for _ in range(MAX_ATTEMPTS - 1):
+        job = queue.claim('worker')
+        queue.fail(job['id'], 'worker', 'ValueError: node error')
+        assert queue.counts('run') == {QUEUED: 1}
+
+    job = queue.claim('worker', lease=-1)
+    assert queue.claim('other-worker') is None, "job with expired lease after last attempt"
+    assert queue.counts('run') == {FAILED: 1}
+    assert queue.results('run')[0]['error'] == 'lease expired'
+    assert job['id'] == queue.results('run')[0]['id']
+
+
+def test_expired_lease_reclaimed(queue):
+    queue.put('run', [(GAS_JOB, {})])
+    job = queue.claim('dead-worker', lease=-1)
+
+    assert queue.claim('worker')['id'] == job['id']
+
+
+def test_plan_gas_ranges():
+    jobs = plan_jobs('mainnet', NODE_URL, [make_asset('PXS', 50000), {'symbol': 'ETH'}],
+                     HEAD_BLOCK, {}, range_size=400)
+
+    assert [kind for kind, _ in jobs] == [ASSET_JOB, GAS_JOB, GAS_JOB, GAS_JOB, ASSET_JOB]
+    assert [(job['from_block'], job['to_block']) for kind, job in jobs if kind == GAS_JOB] == [
+        (100, 499), (500, 899), (900, 1000)
+    ]
+
+
+class OfflineWorker(Worker):
+
+    """Worker with offline validator, contract TXs gas used is equal to block number."""
+
+    def get_validator(self, payload):
+        validator = create_assets_validator(node=payload['node'], fast=True,
+                                            block_identifier=payload['head'])
+        contract_validator = validator.contract_validator
+        contract_validator.transfer_topics = mock.Mock(return_value=[])
+        contract_validator.iter_receipts = lambda address, topics, from_block, to_block: [
+            Receipt('0x%x' % block, block, block * 100)
+            for block in range(from_block, to_block + 1)
+        ]
+        return validator
+
+
+def test_distributed_validation(queue):
+    coordinator = Coordinator(queue)
+    assets = [
+        make_asset('LOW', 10 ** 6),
+        make_asset('HIGH', 50000),
+        make_asset('BAD', 50000, address='invalid'),
+    ]
+    coordinator.submit('mainnet', NODE_URL, assets, HEAD_BLOCK, {}, range_size=300)
+
+    workers = [
+        threading.Thread(target=OfflineWorker(queue).run, kwargs={'stop_when_empty': True})
+        for _ in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    coordinator.wait()
+
+    report = [(asset['symbol'], field, message)
+              for network, asset, field, message in coordinator.report(gas_percentile=100)]
+
+    assert ('BAD', 'blockchainParams.address', "'invalid' is too short") in report
+    assert ('BAD', '', 'invalid is not an address') in report
+    gas_errors = [(symbol, field, message) for symbol, field, message in report
+                  if message.startswith('staticGasAmount')]
+    assert gas_errors == [
+        ('HIGH', '', 'staticGasAmount: Expected 50000 gas but 100000 actual (P100)')
+    ], "merged digests of all ranges must be checked"
+
+
+def test_failed_job_reported(queue):
+    coordinator = Coordinator(queue)
+    coordinator.submit('mainnet', NODE_URL, [make_asset('PXS', 50000)], HEAD_BLOCK, {},
+                       range_size=HEAD_BLOCK)
+
+    worker = OfflineWorker(queue)
+    worker.run_gas_job = mock.Mock(side_effect=ValueError('node error'))
+    worker.run(stop_when_empty=True)
+
+    messages = [message for _, _, _, message in coordinator.report()]
+    assert 'gas job failed: ValueError: node error' in messages
+    assert not [message for message in messages if message.startswith('staticGasAmount')]
+
+
+def test_network_scoped_ignore_rules_reported(queue):
+    coordinator = Coordinator(queue)
+    coordinator.submit('mainnet', NODE_URL, [make_asset('HIGH', 50000)], HEAD_BLOCK, {},
+                       range_size=HEAD_BLOCK)
+    OfflineWorker(queue).run(stop_when_empty=True)
+
+    report = list(coordinator.report(
+        gas_percentile=100, ignore=['mainnet:HIGH.staticGasAmount', 'ropsten:*.*']
+    ))
+
+    assert not [message for _, _, _, message in report if message.startswith('staticGasAmount')]
+    assert coordinator.ignored == {'mainnet:HIGH.staticGasAmount'}
+
+
+def test_worker_closes_evicted_validators(queue):
+    worker = Worker(queue)
+
+    def payload(head):
+        return {'network': 'mainnet', 'node': NODE_URL, 'head': head,
+                'options': {'rpc_backend': 'process'}}
+
+    with mock.patch('jwallet_tools.assets_validator.create_assets_validator') as create:
+        create.side_effect = lambda **kwargs: mock.Mock()
+        validators = [worker.get_validator(payload(head)) for head in range(CACHED_VALIDATORS)]
+        first = validators[0]
+        assert worker.get_validator(payload(0)) is first
+        last = worker.get_validator(payload(CACHED_VALIDATORS))
+
+    assert create.call_count == CACHED_VALIDATORS + 1
+    evicted = validators[1]
+    evicted.contract_validator.close.assert_called_once_with()
+    first.contract_validator.close.assert_not_called()
+
+    worker.close()
+    for validator in [first, last] + validators[2:]:
+        validator.contract_validator.close.assert_called_once_with()
+
+
+def test_work_queue_is_abstract():
+    with pytest.raises(TypeError):
+        WorkQueue()
+
+
+def test_unsupported_queue_options(tmpdir):
+    result = CliRunner().invoke(main, [
+        'validate', '--node', NODE_URL, '--queue', str(tmpdir.join('queue.db')),
+        '--gas-window-blocks', '1000', '--jobs', '4', '-'
+    ], input='[]')
+
+    assert result.exit_code == 1
+    assert "[FAIL] --gas-window-blocks, --jobs can't be used with --queue" in result.output
+    assert not tmpdir.join('queue.db').exists(), "nothing must be enqueued"
@@ -1,6 +1,11 @@
 import logging
+from unittest import mock
 
-from jwallet_tools.blockexplorer.events import EventReceiptIterator
+from web3.datastructures import AttributeDict
+
+from jwallet_tools.blockexplorer.blockrange import ThrottledBlockRange
+from jwallet_tools.blockexplorer.events import EventIterator, EventReceiptIterator
+from jwallet_tools.blockexplorer.rpc import Log, Receipt
 
 from .conftest import (
     TEST_TOKEN_ADDRESS,
@@ -19,3 +24,67 @@ def test_iterate_receipts(w3, caplog):
         concurrency=1, progress=True
     )
     next(iter(iterator))
+
+
+def test_receipts_with_backend():
+    backend = mock.Mock()
+    backend.get_logs.return_value = [Log('0x01', BLOCKS_WITH_TEST_TX)]
+    backend.get_transaction_receipt.return_value = Receipt('0x01', BLOCKS_WITH_TEST_TX, 21000)
+
+    iterator = EventReceiptIterator(
+        None, TEST_TOKEN_ADDRESS, BLOCKS_WITH_TEST_TX, BLOCKS_WITH_TEST_TX,
+        concurrency=1, backend=backend
+    )
+
+    assert list(iterator) == [Receipt('0x01', BLOCKS_WITH_TEST_TX, 21000)]
+    backend.get_transaction_receipt.assert_called_once_with('0x01')
+
+
+def test_receipts_projection():
+    backend = mock.Mock()
+    backend.get_logs.return_value = [Log('0x01', BLOCKS_WITH_TEST_TX)]
+    backend.get_transaction_receipt.return_value = AttributeDict({
+        'transactionHash': '0x01',
+        'blockNumber': BLOCKS_WITH_TEST_TX,
+        'gasUsed': 21000,
+        'logs': [],
+        'logsBloom': b'\0' * 256,
+    })
+
+    iterator = EventReceiptIterator(
+        None, TEST_TOKEN_ADDRESS, BLOCKS_WITH_TEST_TX, BLOCKS_WITH_TEST_TX,
+        concurrency=1, backend=backend, fields=('blockNumber', 'gasUsed')
+    )
+
+    receipt, = list(iterator)
+    assert receipt == (BLOCKS_WITH_TEST_TX, 21000)
+    assert receipt._fields == ('blockNumber', 'gasUsed')
+    assert not hasattr(receipt, '__dict__')
+
+
+def test_reverse_limit():
+    def get_logs(log_filter):
+        return [Log('0x%x' % block, block)
+                for block in range(log_filter['fromBlock'], log_filter['toBlock'] + 1)]
+
+    backend = mock.Mock()
+    backend.get_logs.side_effect = get_logs
+
+    iterator = EventIterator(None, TEST_TOKEN_ADDRESS, 0, 100, batch_size=50, reverse=True,
+                             backend=backend, limit=60)
+
+    blocks = [log.blockNumber for log in iterator]
+    assert blocks == list(range(100, 40, -1))
+    assert backend.get_logs.call_count == 2
+
+
+def test_reverse_no_rescan():
+    backend = mock.Mock()
+    backend.get_logs.return_value = []
+
+    with mock.patch.object(ThrottledBlockRange, 'update'):
+        list(EventIterator(None, TEST_TOKEN_ADDRESS, 0, 100, batch_size=50, reverse=True,
+                           backend=backend))
+
+    scanned = [(c[0][0]['fromBlock'], c[0][0]['toBlock']) for c in backend.get_logs.call_args_list]
+    assert scanned == [(51, 100), (1, 50), (0, 0)]
@@ -0,0 +1,130 @@
+import os
+from unittest import mock
+
+import pytest
+
+from jwallet_tools.blockexplorer.rpc import Receipt
+from jwallet_tools.gas_export import (
+    GasSamplesWriter,
+    NPY_HEADER_SIZE,
+    _read_npy_header,
+    export_gas_samples,
+    load_columns,
+)
+
+from .conftest import TEST_TOKEN_ADDRESS, TEST_TOKEN_DEPLOYMENT_BLOCK
+
+
+def receipt(block, gas):
+    return Receipt('0x%064x' % block, block, gas)
+
+
+def test_append_and_load(tmpdir):
+    directory = str(tmpdir.join('PXS'))
+
+    writer = GasSamplesWriter(directory)
+    assert writer.write([receipt(10, 21000), receipt(11, 35000)], 20) == 2
+    writer.close()
+
+    writer = GasSamplesWriter(directory)
+    assert writer.last_block == 20
+    writer.write([receipt(25, 50000)], 30)
+    writer.close()
+
+    columns = load_columns(directory)
+    assert list(columns['blockNumber']) == [10, 11, 25]
+    assert list(columns['gasUsed']) == [21000, 35000, 50000]
+    assert bytes(columns['transactionHash'][2]) == (25).to_bytes(32, 'big')
+
+    assert os.path.getsize(os.path.join(directory, 'gasUsed.npy')) == NPY_HEADER_SIZE + 3 * 8
+
+
+def test_interrupted_export_is_dropped(tmpdir):
+    directory = str(tmpdir.join('PXS'))
+
+    writer = GasSamplesWriter(directory)
+    writer.write([receipt(10, 21000)], 20)
+
+    def receipts():
+        yield receipt(21, 30000)
+        raise ValueError('node error')
+
+    with pytest.raises(ValueError):
+        writer.write(receipts(), 30)
+    writer.close()
+
+    writer = GasSamplesWriter(directory)
+    assert writer.last_block == 20
+    writer.close()
+    assert list(load_columns(directory)['gasUsed']) == [21000]
+
+
+def test_header_follows_meta(tmpdir):
+    directory = str(tmpdir.join('PXS'))
+    path = os.path.join(directory, 'gasUsed.npy')
+
+    writer = GasSamplesWriter(directory)
+    writer.write([receipt(10, 21000)], 20)
+    with mock.patch('os.replace', side_effect=OSError('disk full')):
+        with pytest.raises(OSError):
+            writer.write([receipt(21, 30000)], 30)
+    writer.close()
+
+    with open(path, 'rb') as fp:
+        assert _read_npy_header(fp)[1] == 1, "uncommitted rows must not be in header"
+
+    writer = GasSamplesWriter(directory)
+    writer.close()
+    assert os.path.getsize(path) == NPY_HEADER_SIZE + 8
+
+
+def test_other_contract_rejected(tmpdir):
+    directory = str(tmpdir.join('PXS'))
+
+    writer = GasSamplesWriter(directory, TEST_TOKEN_ADDRESS)
+    writer.write([receipt(10, 21000)], 20)
+    writer.close()
+    GasSamplesWriter(directory, TEST_TOKEN_ADDRESS).close()
+    with pytest.raises(ValueError):
+        GasSamplesWriter(directory, '0x' + '11' * 20)
+
+
+def test_numpy_compatible(tmpdir):
+    numpy = pytest.importorskip('numpy')
+    directory = str(tmpdir.join('PXS'))
+
+    writer = GasSamplesWriter(directory)
+    writer.write([receipt(10, 21000), receipt(11, 35000)], 20)
+    writer.close()
+
+    gas_used = numpy.load(os.path.join(directory, 'gasUsed.npy'), mmap_mode='r')
+    assert gas_used.tolist() == [21000, 35000]
+
+
+def test_export_from_last_block(tmpdir):
+    contract_validator = mock.Mock(head_block=TEST_TOKEN_DEPLOYMENT_BLOCK + 100)
+    contract_validator.iter_receipts.return_value = [
+        receipt(TEST_TOKEN_DEPLOYMENT_BLOCK + 1, 30000)
+    ]
+    asset = {
+        'symbol': 'PXS',
+        'blockchainParams': {
+            'address': TEST_TOKEN_ADDRESS,
+            'deploymentBlockNumber': TEST_TOKEN_DEPLOYMENT_BLOCK,
+        },
+    }
+    directory = str(tmpdir.join('PXS'))
+
+    assert export_gas_samples(contract_validator, asset, directory) == 1
+    assert export_gas_samples(contract_validator, asset, directory) == 0
+
+    contract_validator.head_block += 10
+    export_gas_samples(contract_validator, asset, directory)
+
+    scanned = [call[0][2:4] for call in contract_validator.iter_receipts.call_args_list]
+    assert scanned == [
+        (TEST_TOKEN_DEPLOYMENT_BLOCK, TEST_TOKEN_DEPLOYMENT_BLOCK + 100),
+        (TEST_TOKEN_DEPLOYMENT_BLOCK + 101, TEST_TOKEN_DEPLOYMENT_BLOCK + 110),
+    ]
+    assert len(load_columns(directory)['gasUsed']) == 2
+    assert contract_validator.iter_receipts.call_args[1]['progress_title'] == 'export PXS'
@@ -0,0 +1,93 @@
+import logging
+
+from jwallet_tools.assets_validator.contract import ContractValidator
+from jwallet_tools.assets_validator.utils import IgnoreLoggerAdapter, IgnoreRules, parse_ignore_rule
+
+from .conftest import NODE_URL
+
+
+def test_parse_ignore_rule():
+    assert parse_ignore_rule('approve') == (None, '*', 'approve')
+    assert parse_ignore_rule('GNT.*') == (None, 'GNT', '*')
+    assert parse_ignore_rule('ropsten:GNT.name') == ('ropsten', 'GNT', 'name')
+
+
+def test_exact_rules():
+    rules = IgnoreRules(['approve', 'GNT.*', '*.decimals', 'EOS.symbol'])
+
+    assert rules.match('approve', 'ANY') == 'approve'
+    assert rules.match('name', 'GNT') == 'GNT.*'
+    assert rules.match('decimals', 'ANY') == '*.decimals'
+    assert rules.match('symbol', 'EOS') == 'EOS.symbol'
+    assert rules.match('symbol', 'ANY') is None
+    assert rules.match('name', 'EOS') is None
+
+
+def test_glob_rules():
+    rules = IgnoreRules(['ICX.decimal?', 'MK?.name', '*.transfer*'])
+
+    assert rules.match('decimals', 'ICX') == 'ICX.decimal?'
+    assert rules.match('name', 'MKR') == 'MK?.name'
+    assert rules.match('name', 'MKRR') is None
+    assert rules.match('transferFrom', 'ANY') == '*.transfer*'
+
+
+def test_most_specific_rule_matched():
+    rules = IgnoreRules(['GNT.*', 'GNT.name', '*.name', 'mainnet:GNT.name'])
+
+    assert rules.match('name', 'GNT') == 'GNT.name'
+    assert rules.match('name', 'GNT', 'mainnet') == 'mainnet:GNT.name'
+    assert rules.match('symbol', 'GNT', 'mainnet') == 'GNT.*'
+
+
+def test_network_scoped_rules():
+    rules = IgnoreRules(['ropsten:GNT.name', 'ropsten:*.approve', 'test*:ANY.symbol'])
+
+    assert rules.match('name', 'GNT', 'ropsten') == 'ropsten:GNT.name'
+    assert rules.match('name', 'GNT', 'mainnet') is None
+    assert rules.match('name', 'GNT') is None
+    assert rules.match('approve', 'ANY', 'ropsten') == 'ropsten:*.approve'
+    assert rules.match('symbol', 'ANY', 'testnet') == 'test*:ANY.symbol'
+
+
+def test_results_cached():
+    rules = IgnoreRules(['*.transfer*'])
+
+    assert rules.match('transfer', 'GNT') == '*.transfer*'
+    assert rules.match('name', 'GNT') is None
+
+    assert rules._index[None, 'GNT'][0] == {'transfer': '*.transfer*', 'name': None}
+
+
+def test_logger_adapter_records_matched_rules():
+    log = IgnoreLoggerAdapter(logging.getLogger(__name__), extra={
+        'token': {'name': 'Golem', 'symbol': 'GNT'},
+        'ignore': IgnoreRules({'GNT.*', 'EOS.symbol'}),
+    })
+
+    assert log._method_ignored('name')
+    assert list(log.if_ignored('approve', 'failed')) == []
+    assert log.extra['ignored'] == {'GNT.*'}
+    assert log.extra['ignore'].rules == {'GNT.*', 'EOS.symbol'}, "context must not be changed"
+
+
+def test_contract_validator_compiles_rules_once():
+    validator = ContractValidator(NODE_URL, ignore=['ropsten:GNT.name'], fast=True,
+                                  network='ropsten')
+    schema_config = {'ignore': ['EOS.symbol']}
+
+    rules = validator.get_ignore_rules(schema_config)
+    assert validator.get_ignore_rules(schema_config) is rules
+    assert validator.get_ignore_rules({'ignore': ['EOS.symbol']}) is rules, \
+        "same rules of other config must not be compiled again"
+    assert validator.get_ignore_rules({}).rules == {'ropsten:GNT.name'}
+    assert validator.get_ignore_rules(schema_config) is rules
+    assert rules.rules == {'ropsten:GNT.name', 'EOS.symbol'}
+
+    validator.set_log_context({'name': 'Golem', 'symbol': 'GNT'}, schema_config)
+    assert validator.log._method_ignored('name')
+    assert validator.ignored == {'ropsten:GNT.name'}
+
+    validator.set_log_context({'name': 'Golem', 'symbol': 'GNT'}, schema_config, 'mainnet')
+    assert not validator.log._method_ignored('name')
+    assert validator.ignored == set()
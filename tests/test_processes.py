@@ -0,0 +1,91 @@
+import multiprocessing
+from concurrent.futures import Future
+from unittest import mock
+
+import pytest
+
+from jwallet_tools.assets_validator.contract import ContractValidator
+from jwallet_tools.blockexplorer import processes
+from jwallet_tools.blockexplorer.events import ReceiptFetchError
+from jwallet_tools.blockexplorer.processes import ProcessReceiptIterator, ReceiptProcessPool
+from jwallet_tools.blockexplorer.rpc import Log, Receipt
+
+from .conftest import TEST_TOKEN_ADDRESS
+
+
+@pytest.fixture
+def worker_state():
+    buffer = multiprocessing.RawArray('Q', 2 * 4 * 2)
+    processes._init_worker(buffer, 4, 'ipc:///dev/null', 1, 2, 0, None, None)
+    yield buffer
+    processes._worker['executor'].shutdown()
+    processes._worker.clear()
+
+
+def test_fetch_slice_writes_pairs(worker_state):
+    processes._worker['backend'] = mock.Mock(get_transaction_receipt=lambda tx_hash: Receipt(
+        tx_hash, int(tx_hash, 16), int(tx_hash, 16) * 1000
+    ))
+
+    assert processes._fetch_slice(1, ['0x1', '0x2', '0x3']) == (3, None)
+    assert list(worker_state)[8:14] == [1, 1000, 2, 2000, 3, 3000]
+
+
+def test_fetch_slice_reports_failed_receipt(worker_state):
+    processes._worker['backend'] = mock.Mock(get_transaction_receipt=lambda tx_hash: (
+        None if tx_hash == '0x2' else Receipt(tx_hash, 1, 21000)
+    ))
+
+    count, failed = processes._fetch_slice(0, ['0x1', '0x2', '0x3'])
+
+    assert count == 1
+    assert failed == ('0x2', 'receipt not found')
+
+
+def test_receipts_fetched_on_processes(node):
+    _, uri = node
+    # 40 TXs per scanned batch, more slices than slots of shared buffer
+    logs_backend = mock.Mock(get_logs=lambda log_filter: [
+        Log(delay, log_filter['fromBlock']) for delay in ['0', '0.01'] * 20
+    ])
+    pool = ReceiptProcessPool(uri, processes=2, slice_size=2)
+    try:
+        iterator = ProcessReceiptIterator(
+            None, TEST_TOKEN_ADDRESS, 100, 100, backend=logs_backend, pool=pool
+        )
+
+        receipts = list(iterator)
+    finally:
+        pool.shutdown()
+
+    assert len(receipts) == 40
+    assert set(receipts) == {(1, 21000)}
+    assert receipts[0].gasUsed == 21000
+    assert pool._free_slots.qsize() == 2 * processes.SLOTS_PER_PROCESS
+
+
+def test_failed_receipt_raised():
+    future = Future()
+    future.set_result((1, ('0x2', 'receipt not found')))
+    pool = mock.Mock(slice_size=2, acquire_slot=mock.Mock(return_value=0),
+                     submit=mock.Mock(return_value=future), read=mock.Mock(return_value=[(1, 2)]))
+    logs_backend = mock.Mock(get_logs=lambda log_filter: [Log('0x1', 1), Log('0x2', 1)])
+    iterator = ProcessReceiptIterator(None, TEST_TOKEN_ADDRESS, 1, 1, backend=logs_backend,
+                                      pool=pool)
+
+    with pytest.raises(ReceiptFetchError):
+        list(iterator)
+    pool.release_slot.assert_called_once_with(0)
+
+
+def test_contract_validator_shuts_down_pool(node):
+    _, uri = node
+    validator = ContractValidator(uri, rpc_backend='process', processes=1, fast=True)
+    pool = validator.receipt_pool
+
+    with mock.patch.object(pool, 'shutdown', wraps=pool.shutdown) as shutdown:
+        validator.close()
+        validator.close()
+
+    shutdown.assert_called_once_with()
+    assert validator._receipt_pool is None
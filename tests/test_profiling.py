@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from jwallet_tools.profiling import (
+    COLLAPSED_FILENAME,
+    SUMMARY_FILENAME,
+    SamplingProfiler,
+    bind_scope,
+    current_scope,
+    scope,
+    scoped,
+)
+
+
+def busy_loop(duration=0.1):
+    finish_at = time.monotonic() + duration
+    while time.monotonic() < finish_at:
+        pass
+
+
+def test_scope_disabled():
+    with scope('asset'):
+        assert current_scope() == ()
+    assert bind_scope(busy_loop) is busy_loop
+
+
+def test_worker_threads_sampled(tmpdir):
+    with SamplingProfiler(interval=0.001) as profiler:
+        with scope('mainnet:PXS'), scope('staticGasAmount'):
+            assert current_scope() == ('mainnet:PXS', 'staticGasAmount')
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                executor.submit(bind_scope(busy_loop)).result()
+        assert current_scope() == ()
+
+    assert profiler.samples > 0
+    scopes = {labels for labels, _ in profiler.stacks}
+    assert scopes == {('mainnet:PXS', 'staticGasAmount')}, "idle threads must not be sampled"
+    assert any('busy_loop' in frames[-1] for _, frames in profiler.stacks)
+
+    profiler.write(str(tmpdir))
+    collapsed = tmpdir.join(COLLAPSED_FILENAME).read()
+    assert collapsed.startswith('mainnet:PXS;staticGasAmount;')
+    assert 'busy_loop (test_profiling.py' in tmpdir.join(SUMMARY_FILENAME).read()
+
+
+def test_scoped_generator():
+    @scoped('stage')
+    def stage():
+        yield current_scope()
+        return 'result'
+
+    def run():
+        return (yield from stage())
+
+    with SamplingProfiler(interval=1):
+        generator = run()
+        assert next(generator) == ('stage',)
+        try:
+            next(generator)
+        except StopIteration as e:
+            assert e.value == 'result'
+        assert current_scope() == ()
@@ -0,0 +1,111 @@
+from unittest import mock
+
+import pytest
+from click.testing import CliRunner
+
+from jwallet_tools.__main__ import main
+from jwallet_tools.assets_validator._http_provider import (
+    TokenBucket,
+    _rate_limiters,
+    make_post_request,
+    set_rate_limit,
+)
+
+from .conftest import NODE_URL
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+def test_token_bucket_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(10, burst=5, clock=clock, sleep=clock.sleep)
+
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.now == 0, "burst must be allowed at once"
+
+    for _ in range(10):
+        bucket.acquire()
+    assert abs(clock.now - 1) < 1e-9
+
+
+def test_token_bucket_refill_capped():
+    clock = FakeClock()
+    bucket = TokenBucket(10, burst=2, clock=clock, sleep=clock.sleep)
+
+    clock.now = 100
+    for _ in range(3):
+        bucket.acquire()
+    assert abs(clock.now - 100.1) < 1e-9
+
+
+def test_post_request_limited():
+    set_rate_limit(NODE_URL, 10)
+    try:
+        # reconfigured bucket is still the one requests go through
+        set_rate_limit(NODE_URL, 1, burst=1)
+        limiter = _rate_limiters[NODE_URL]
+        with mock.patch.object(limiter, 'sleep') as sleep_mock:
+            with mock.patch('jwallet_tools.assets_validator._http_provider._get_session'):
+                make_post_request(NODE_URL, b'{}')
+                make_post_request(NODE_URL, b'{}')
+    finally:
+        set_rate_limit(NODE_URL, None)
+
+    assert sleep_mock.call_count == 1, "second request must wait for token"
+    assert sleep_mock.call_args[0][0] > 0.9
+
+
+def test_rate_limit_shared():
+    set_rate_limit(NODE_URL, 10)
+    try:
+        limiter = _rate_limiters[NODE_URL]
+        set_rate_limit(NODE_URL, 20, burst=5)
+        assert _rate_limiters[NODE_URL] is limiter
+        assert (limiter.rate, limiter.burst) == (20, 5)
+    finally:
+        set_rate_limit(NODE_URL, None)
+    assert NODE_URL not in _rate_limiters
+
+
+def test_reconfigure_drops_extra_tokens():
+    clock = FakeClock()
+    bucket = TokenBucket(10, burst=10, clock=clock, sleep=clock.sleep)
+
+    bucket.configure(1, burst=2)
+    for _ in range(2):
+        bucket.acquire()
+    assert clock.now == 0
+    bucket.acquire()
+    assert clock.now == 1.0
+
+
+@pytest.mark.parametrize('rate, burst', [(0, None), (-1, None), (10, 0)])
+def test_invalid_rate_limit_rejected(rate, burst):
+    with pytest.raises(ValueError):
+        TokenBucket(rate, burst)
+    with pytest.raises(ValueError):
+        set_rate_limit(NODE_URL, rate, burst)
+    assert NODE_URL not in _rate_limiters
+
+    bucket = TokenBucket(10)
+    with pytest.raises(ValueError):
+        bucket.configure(rate, burst)
+    assert bucket.rate == 10
+
+
+@pytest.mark.parametrize('option', ['--rate-limit=0', '--rate-limit=-1', '--burst=0'])
+def test_invalid_rate_limit_option(option):
+    result = CliRunner().invoke(main, ['validate', '--node', NODE_URL, option, '-'], input='[]')
+
+    assert result.exit_code == 2
+    assert 'Invalid value' in result.output
@@ -0,0 +1,67 @@
+import json
+from unittest import mock
+
+import pytest
+
+from jwallet_tools.blockexplorer.rpc import Log, RawRPCBackend, Receipt
+
+from .conftest import NODE_URL, TEST_TOKEN_ADDRESS
+
+
+TX_HASH = '0x' + 'ab' * 32
+
+
+def rpc_response(result=None, error=None):
+    response = {'jsonrpc': '2.0', 'id': 0}
+    if error is not None:
+        response['error'] = error
+    else:
+        response['result'] = result
+    return json.dumps(response).encode('utf-8')
+
+
+@pytest.fixture
+def post_mock():
+    with mock.patch('jwallet_tools.assets_validator._http_provider.make_post_request') as post_mock:
+        yield post_mock
+
+
+def test_get_logs(post_mock):
+    post_mock.return_value = rpc_response([{
+        'transactionHash': TX_HASH,
+        'blockNumber': '0x10',
+        'data': '0x' + '00' * 32,
+        'topics': [],
+    }])
+    backend = RawRPCBackend(NODE_URL)
+
+    logs = backend.get_logs({'address': TEST_TOKEN_ADDRESS, 'fromBlock': 1, 'toBlock': 16})
+
+    assert logs == [Log(TX_HASH, 16)]
+    request = json.loads(post_mock.call_args[0][1])
+    assert request['method'] == 'eth_getLogs'
+    assert request['params'] == [{
+        'address': TEST_TOKEN_ADDRESS, 'fromBlock': '0x1', 'toBlock': '0x10'
+    }]
+
+
+def test_get_transaction_receipt(post_mock):
+    post_mock.return_value = rpc_response({
+        'transactionHash': TX_HASH,
+        'blockNumber': '0x10',
+        'gasUsed': '0x5208',
+        'logsBloom': '0x' + '00' * 256,
+    })
+    backend = RawRPCBackend(NODE_URL)
+
+    receipt = backend.get_transaction_receipt(bytes.fromhex(TX_HASH[2:]))
+
+    assert receipt == Receipt(TX_HASH, 16, 21000)
+    assert json.loads(post_mock.call_args[0][1])['params'] == [TX_HASH]
+
+
+def test_rpc_error(post_mock):
+    post_mock.return_value = rpc_response(error={'code': -32000, 'message': 'leveldb: not found'})
+
+    with pytest.raises(ValueError):
+        RawRPCBackend(NODE_URL).get_logs({'fromBlock': 1, 'toBlock': 2})
@@ -0,0 +1,130 @@
+import random
+from unittest import mock
+
+import pytest
+from click.testing import CliRunner
+
+from jwallet_tools.__main__ import main
+from jwallet_tools.assets_validator.contract import ContractValidator, LAST_HARD_FORK_BLOCK
+from jwallet_tools.assets_validator.sampling import (
+    cluster_percentile_interval,
+    percentile_interval,
+    sample_windows,
+    stratified_windows,
+)
+from jwallet_tools.blockexplorer.rpc import Receipt
+
+from .conftest import NODE_URL, TEST_TOKEN_ADDRESS
+
+
+def test_sample_windows():
+    windows = sample_windows(100, 100099, 10, 1000, random.Random(1))
+
+    assert len(windows) == 10
+    assert all(to_block - from_block == 999 for from_block, to_block in windows)
+    assert all(100 <= from_block and to_block <= 100099 for from_block, to_block in windows)
+    assert all(a[1] < b[0] for a, b in zip(windows, windows[1:])), "windows overlap"
+
+
+def test_sample_short_interval():
+    assert sample_windows(100, 5000, 10, 1000) == [(100, 5000)]
+    assert sample_windows(100, 99, 10, 1000) == []
+
+
+def test_stratified_windows():
+    windows = stratified_windows(10, 1000, [500, 1000], 2, 100, random.Random(1))
+
+    assert all(to_block < 500 for _, to_block in windows[500])
+    assert all(from_block >= 500 for from_block, _ in windows[1000])
+    assert stratified_windows(600, 1000, [500, 1000], 2, 100)[500] == []
+
+
+def test_percentile_interval():
+    values = list(range(1, 1001))
+
+    estimate, lower, upper = percentile_interval(values, 50)
+    assert lower < estimate < upper
+    assert 450 < lower and upper < 550
+
+
+def test_percentile_interval_unbounded():
+    _, lower, upper = percentile_interval(list(range(10)), 99)
+    assert upper == float('inf')
+    assert lower > 0
+
+
+def test_cluster_percentile_interval():
+    # gas used depends on window: values of window are not independent
+    clusters = [[window * 100] * 100 for window in range(10)] + [[]]
+
+    estimate, lower, upper = cluster_percentile_interval(clusters, 50, rng=random.Random(1))
+    _, iid_lower, iid_upper = percentile_interval(sum(clusters, []), 50)
+
+    assert lower <= iid_lower and iid_upper <= upper
+    assert upper - lower > iid_upper - iid_lower, "cluster sample interval must be wider"
+    assert lower <= estimate <= upper
+
+
+def test_single_cluster_interval():
+    values = list(range(1000))
+    assert cluster_percentile_interval([values], 50) == percentile_interval(values, 50)
+
+
+def test_sample_estimation_requires_percentile():
+    result = CliRunner().invoke(main, [
+        'validate', '--node', NODE_URL, '--gas-estimation', 'sample', '-'
+    ], input='[]')
+
+    assert result.exit_code == 1
+    assert "--gas-estimation=sample requires --gas-percentile below 100" in result.output
+
+
+@pytest.fixture
+def sampling_validator():
+    validator = ContractValidator(NODE_URL, fast=True, gas_percentile=90, gas_estimation='sample',
+                                  block_identifier=LAST_HARD_FORK_BLOCK * 2)
+    validator.log.extra = {'token': {'name': 'Test', 'symbol': 'TST'},
+                           'ignore': validator.get_ignore_rules({})}
+    return validator
+
+
+def estimate(validator, gas_used, expected):
+    receipts = [Receipt('0x01', LAST_HARD_FORK_BLOCK + 1, x) for x in gas_used]
+    with mock.patch.object(validator, 'iter_receipts', return_value=receipts):
+        generator = validator.estimate_static_gas_amount(
+            TEST_TOKEN_ADDRESS, [], expected, LAST_HARD_FORK_BLOCK, validator.head_block
+        )
+        errors = []
+        try:
+            while True:
+                errors.append(next(generator))
+        except StopIteration as e:
+            return e.value, errors
+
+
+def test_estimation_conclusive(sampling_validator):
+    assert estimate(sampling_validator, range(1000), 2000) == (True, [])
+
+    conclusive, errors = estimate(sampling_validator, range(1000), 100)
+    assert conclusive
+    assert len(errors) == 1
+
+
+def test_estimation_inconclusive(sampling_validator):
+    assert estimate(sampling_validator, range(1000), 900) == (False, [])
+
+
+def test_estimation_range_without_txs_inconclusive(sampling_validator):
+    def iter_receipts(address, topics, from_block, to_block):
+        if to_block < LAST_HARD_FORK_BLOCK:
+            return []
+        return [Receipt('0x01', to_block, x) for x in range(1000)]
+
+    with mock.patch.object(sampling_validator, 'iter_receipts', side_effect=iter_receipts):
+        generator = sampling_validator.estimate_static_gas_amount(
+            TEST_TOKEN_ADDRESS, [], 2000, 0, sampling_validator.head_block
+        )
+        with pytest.raises(StopIteration) as e:
+            next(generator)
+
+    assert e.value.value is False, "range without sampled TXs must not pass"
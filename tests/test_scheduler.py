@@ -0,0 +1,98 @@
+from jwallet_tools.assets_validator import create_assets_validator
+from jwallet_tools.scheduler import (
+    DEFAULT_COST,
+    Job,
+    JobResult,
+    Progress,
+    Scheduler,
+    ValidationStats,
+    asset_key,
+    format_duration,
+)
+
+from .conftest import NODE_URL
+
+
+def make_asset(symbol, address='0xa15c7ebe1f07caf6bff097d8a589fb8ac49ae5b3'):
+    return {
+        "name": symbol,
+        "symbol": symbol,
+        "display": {},
+        "blockchainParams": {
+            "type": "erc-20",
+            "address": address,
+            "decimals": 18,
+            "staticGasAmount": 0,
+            "deploymentBlockNumber": 0
+        }
+    }
+
+
+def test_stats_cost(tmpdir):
+    path = str(tmpdir.join('stats.json'))
+
+    stats = ValidationStats(path)
+    assert stats.cost('mainnet', 'PXS') == DEFAULT_COST
+
+    stats.record('mainnet', 'PXS', 120.5, 100000)
+    stats.record('mainnet', 'GNT', 10, 5000)
+    stats.save()
+
+    stats = ValidationStats(path)
+    assert stats.get('mainnet', 'PXS') == {'duration': 120.5, 'transfers': 100000}
+    assert stats.cost('mainnet', 'GNT') == 10
+    assert stats.cost('mainnet', 'NEW') == 120.5, "unknown asset must not be left to the end"
+    assert stats.cost('ropsten', 'NEW') == DEFAULT_COST
+
+
+def test_longest_first(tmpdir):
+    small, huge, medium = make_asset('SMALL'), make_asset('HUGE', address='invalid'), \
+        make_asset('MEDIUM')
+    stats = ValidationStats(str(tmpdir.join('stats.json')))
+    stats.record('mainnet', asset_key(small), 1, 10)
+    stats.record('mainnet', asset_key(huge), 100, 10 ** 6)
+    stats.record('ropsten', asset_key(medium), 10, 1000)
+
+    scheduler = Scheduler(stats, workers=1)
+    scheduler.add('mainnet', create_assets_validator(node=NODE_URL, fast=True), [small, huge])
+    scheduler.add('ropsten', create_assets_validator(node=NODE_URL, fast=True), [medium])
+
+    results = list(scheduler.run())
+
+    assert [result.job.asset['symbol'] for result in results] == ['HUGE', 'MEDIUM', 'SMALL']
+    errors = results[0].errors
+    assert "invalid is not an address" in [error.message for error in errors]
+    assert {error.absolute_path[0] for error in errors} == {1}, \
+        "error path must point to asset in file"
+
+
+def test_stats_by_address(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    first = make_asset('PXS', address='0xA15C7EBE1F07CAF6BFF097D8A589FB8AC49AE5B3')
+    second = make_asset('PXS', address='0x' + '11' * 20)
+
+    stats = ValidationStats()
+    stats.record('mainnet', asset_key(first), 100, 10 ** 6)
+    stats.record('mainnet', asset_key(second), 1, 10)
+
+    assert stats.cost('mainnet', asset_key(make_asset('PXS'))) == 100, \
+        "same symbol tokens must be kept apart, address case ignored"
+    assert stats.cost('mainnet', asset_key(second)) == 1
+
+    stats.save()
+    assert not tmpdir.listdir(), "stats without file must not be saved"
+
+
+def test_eta():
+    jobs = [Job('mainnet', i, {}, cost) for i, cost in enumerate([40, 20, 20])]
+    progress = Progress(jobs, workers=2)
+    assert progress.eta() == 40
+
+    progress.done(JobResult(jobs[0], [], 80, 0))
+    assert progress.eta() == 40, "remaining cost must be corrected by actual speed"
+
+
+def test_format_duration():
+    assert format_duration(5.4) == '5s'
+    assert format_duration(125) == '2m 05s'
+    assert format_duration(7260) == '2h 01m'
@@ -0,0 +1,162 @@
+import io
+import json
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+from web3 import Web3
+
+from jwallet_tools.assets_validator._socket_provider import (
+    WS_OPCODE_CLOSE,
+    WS_OPCODE_CONTINUATION,
+    WS_OPCODE_PING,
+    WS_OPCODE_PONG,
+    WS_OPCODE_TEXT,
+    IPCConnection,
+    JSONStreamSplitter,
+    MultiplexedConnection,
+    SocketProvider,
+    WebSocketConnection,
+    encode_frame,
+    make_provider,
+    read_frame,
+)
+from jwallet_tools.assets_validator._http_provider import CustomHTTPProvider
+from jwallet_tools.blockexplorer.events import EventReceiptIterator
+from jwallet_tools.blockexplorer.rpc import RawRPCBackend
+
+from .conftest import NODE_URL, TEST_TOKEN_ADDRESS
+
+
+def test_requests_matched_by_id(node):
+    server, uri = node
+    connection = IPCConnection(uri)
+    delays = ['0.2', '0.01', '0.1', '0', '0.05'] * 4
+
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(delays)) as executor:
+        responses = list(executor.map(
+            lambda delay: connection.request('eth_getTransactionReceipt', [delay]), delays
+        ))
+
+    assert [response['result']['transactionHash'] for response in responses] == delays
+    assert time.monotonic() - started_at < 1, "requests must be in flight at once"
+    assert server.connections == 1
+
+
+def test_raw_backend_and_web3(node):
+    _, uri = node
+
+    assert RawRPCBackend(uri).get_transaction_receipt('0') == ('0', 1, 21000)
+    with pytest.raises(ValueError):
+        RawRPCBackend(uri).call('eth_unknown', [])
+
+    web3 = Web3(make_provider(uri))
+    assert web3.eth.blockNumber == 16
+
+
+def test_receipts_iterator(node):
+    _, uri = node
+    iterator = EventReceiptIterator(
+        None, TEST_TOKEN_ADDRESS, 100, 100, concurrency=3, backend=RawRPCBackend(uri)
+    )
+
+    receipts = list(iterator)
+
+    assert sorted(receipt.transactionHash for receipt in receipts) == ['0', '0.01', '0.02']
+
+
+def test_reconnect(node):
+    server, uri = node
+    connection = IPCConnection(uri)
+    assert connection.request('eth_blockNumber', [])['result'] == '0x10'
+
+    connection._sock.shutdown(socket.SHUT_RDWR)
+    for _ in range(100):
+        if connection._sock is None:
+            break
+        time.sleep(0.01)
+
+    assert connection.request('eth_blockNumber', [])['result'] == '0x10'
+    assert server.connections == 2
+
+
+def test_ipc_split_messages():
+    chunks = [
+        b'{"id": 1, "result": "\xd0', b'\xb6"}\n{"id": 2, "result": ',
+        b'"\xd0\xb6\xd0', b'\xb6"}', b'',
+    ]
+    sock = mock.Mock()
+    sock.recv.side_effect = chunks
+
+    messages = list(IPCConnection('ipc:///tmp/geth.ipc').receive(sock))
+
+    assert messages == [{'id': 1, 'result': '\u0436'}, {'id': 2, 'result': '\u0436\u0436'}]
+
+
+def test_json_stream_splitter():
+    stream = (' {"id": 1, "result": "}\\"{["}\n[{"id": 2, "result": null}]'
+              '{"id": 3, "result": "\\\\"}')
+    expected = [{'id': 1, 'result': '}"{['}, [{'id': 2, 'result': None}],
+                {'id': 3, 'result': '\\'}]
+
+    assert list(JSONStreamSplitter().feed(stream)) == expected
+
+    splitter = JSONStreamSplitter()
+    with mock.patch('json.loads', side_effect=json.loads) as loads:
+        messages = [message for char in stream for message in splitter.feed(char)]
+    assert messages == expected
+    assert loads.call_count == 3, "message must be decoded once it is complete only"
+
+
+def test_json_stream_splitter_unbalanced():
+    with pytest.raises(ValueError):
+        list(JSONStreamSplitter().feed('{"id": 1}}'))
+
+
+def test_connection_is_abstract():
+    with pytest.raises(TypeError):
+        MultiplexedConnection('ipc:///tmp/geth.ipc')
+
+
+def test_make_provider():
+    assert isinstance(make_provider(NODE_URL), CustomHTTPProvider)
+    assert isinstance(make_provider('ws://127.0.0.1:8546'), SocketProvider)
+    assert isinstance(make_provider('ipc:///tmp/geth.ipc'), SocketProvider)
+
+
+def test_websocket_frames():
+    payload = json.dumps({'id': 1, 'result': '0x' + 'ab' * 40000}).encode('utf-8')
+    opcode, decoded = read_frame(io.BytesIO(encode_frame(WS_OPCODE_TEXT, payload)))
+
+    assert opcode == 0x80 | WS_OPCODE_TEXT
+    assert decoded == payload
+
+
+def server_frame(first, payload):
+    # server frames are not masked
+    return bytes([first, len(payload)]) + payload
+
+
+def test_websocket_fragmented_and_control_frames():
+    sock = mock.Mock()
+    sock.makefile.return_value = io.BytesIO(b''.join([
+        server_frame(WS_OPCODE_TEXT, b'{"id": 1, '),
+        # control frames can be sent between fragments of message
+        server_frame(0x80 | WS_OPCODE_PING, b'ping'),
+        server_frame(0x80 | WS_OPCODE_PONG, b''),
+        server_frame(WS_OPCODE_CONTINUATION, b'"result": '),
+        server_frame(0x80 | WS_OPCODE_CONTINUATION, b'"0x10"}'),
+        server_frame(0x80 | WS_OPCODE_TEXT, b'{"id": 2, "result": "0x11"}'),
+        server_frame(0x80 | WS_OPCODE_CLOSE, b''),
+        server_frame(0x80 | WS_OPCODE_TEXT, b'{"id": 3, "result": "0x12"}'),
+    ]))
+
+    messages = list(WebSocketConnection('ws://127.0.0.1:8546').receive(sock))
+
+    assert messages == [{'id': 1, 'result': '0x10'}, {'id': 2, 'result': '0x11'}]
+    sock.sendall.assert_called_once()
+    pong = io.BytesIO(sock.sendall.call_args[0][0])
+    assert read_frame(pong) == (WS_OPCODE_PONG, b'ping')
@@ -0,0 +1,71 @@
+import json
+import subprocess
+import sys
+from unittest import mock
+
+from jwallet_tools.assets_validator.contract import ContractValidator
+
+from .conftest import (
+    NODE_URL,
+    TEST_TOKEN_ADDRESS,
+    TEST_TOKEN_DECIMALS,
+    TEST_TOKEN_DEPLOYMENT_BLOCK,
+    TEST_TOKEN_GAS,
+)
+
+
+# `validate --fast` is used as pre-commit hook, so it must not load node clients
+HEAVY_MODULES = ('web3', 'requests', 'urllib3', 'jsonschema', 'tdigest', 'tqdm')
+
+# jsonschema is required to validate, node clients are not
+FAST_VALIDATION_HEAVY_MODULES = tuple(m for m in HEAVY_MODULES if m != 'jsonschema')
+
+# jsonschema imports requests if it can (for remote refs), so importing node
+# clients is blocked: eager import of them fails instead of being hidden
+BLOCK_NODE_CLIENTS = "import sys; sys.modules.update(dict.fromkeys(('requests', 'urllib3'), None));"
+
+
+def test_cli_import_is_lazy():
+    code = BLOCK_NODE_CLIENTS + (
+        "import jwallet_tools.__main__;"
+        "print(','.join(m for m in %r if sys.modules.get(m) is not None))" % (HEAVY_MODULES,)
+    )
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True)
+    assert result.stdout.strip() == b''
+
+
+def test_fast_validator_is_offline():
+    with mock.patch('requests.get') as get_mock:
+        validator = ContractValidator(NODE_URL, fast=True)
+
+    assert validator.web3 is None
+    assert not get_mock.called
+
+
+def test_fast_validation_is_lazy(tmp_path):
+    assets = tmp_path / 'assets.json'
+    assets.write_text(json.dumps([{
+        "name": "Pundi X",
+        "symbol": "PXS",
+        "display": {"isDefaultForcedDisplay": True, "digitalAssetsListPriority": 1},
+        "blockchainParams": {
+            "type": "erc-20",
+            "address": TEST_TOKEN_ADDRESS,
+            "decimals": TEST_TOKEN_DECIMALS,
+            "staticGasAmount": TEST_TOKEN_GAS,
+            "deploymentBlockNumber": TEST_TOKEN_DEPLOYMENT_BLOCK
+        }
+    }]))
+
+    code = BLOCK_NODE_CLIENTS + (
+        "from jwallet_tools.__main__ import main\n"
+        "try:\n"
+        "    main(['validate', %r, '--node', %r, '--fast', '--loglevel', 'ERROR'])\n"
+        "finally:\n"
+        "    print('loaded:' + ','.join(m for m in %r if sys.modules.get(m) is not None))\n"
+    ) % (str(assets), NODE_URL, FAST_VALIDATION_HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, check=False)
+
+    assert result.returncode == 0, result.stdout
+    assert result.stdout.strip().endswith(b'loaded:'), result.stdout
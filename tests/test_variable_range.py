@@ -1,4 +1,4 @@
-from jwallet_tools.blockexplorer.blockrange import VariableBlockRange
+from jwallet_tools.blockexplorer.blockrange import ThrottledBlockRange, VariableBlockRange
 
 
 def test_range():
@@ -44,7 +44,7 @@ def test_change_range():
 def test_reverse_range():
     ranger = VariableBlockRange(0, 100, reverse=True, batch_size=50)
     res = list(ranger)
-    assert res == [(51, 100), (1, 50), (1, 1)]
+    assert res == [(51, 100), (1, 50), (0, 0)], "from_block must be scanned"
 
 
 def test_rollback():
@@ -62,3 +62,20 @@ def test_reverse_change_range():
     assert next(it) == (51, 100)
     ranger.set_step(10)
     assert next(it) == (41, 50)
+
+
+def test_reverse_throttle_speed_up():
+    ranger = ThrottledBlockRange(0, 10 ** 6, reverse=True, batch_size=50)
+    it = iter(ranger)
+    next(it)
+    ranger.update(0.001)
+    from_block, to_block = next(it)
+    assert to_block - from_block + 1 == 500
+
+
+def test_reverse_range_covers_all_blocks():
+    for from_block, to_block, batch_size in ((0, 100, 50), (0, 100, 30), (5, 5, 10), (3, 10, 1)):
+        ranges = list(VariableBlockRange(from_block, to_block, reverse=True,
+                                         batch_size=batch_size))
+        blocks = [block for low, high in ranges for block in range(high, low - 1, -1)]
+        assert blocks == list(range(to_block, from_block - 1, -1)), ranges
@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from jwallet_tools.assets_validator.utils import normalize_address
+from jwallet_tools.blockexplorer.rpc import Receipt
+from jwallet_tools.watcher import NetworkWatcher, WatchServer
+
+from .conftest import (
+    NODE_URL,
+    TEST_TOKEN_ADDRESS,
+    TEST_TOKEN_DECIMALS,
+    TEST_TOKEN_DEPLOYMENT_BLOCK,
+    TEST_TOKEN_GAS,
+)
+
+
+ASSET = {
+    "name": "Pundi X",
+    "symbol": "PXS",
+    "blockchainParams": {
+        "type": "erc-20",
+        "address": TEST_TOKEN_ADDRESS,
+        "decimals": TEST_TOKEN_DECIMALS,
+        "staticGasAmount": TEST_TOKEN_GAS,
+        "deploymentBlockNumber": TEST_TOKEN_DEPLOYMENT_BLOCK
+    }
+}
+
+TOKEN_ADDRESS = normalize_address(TEST_TOKEN_ADDRESS)
+
+
+@pytest.fixture
+def watcher():
+    watcher = NetworkWatcher('mainnet', NODE_URL, [ASSET], fast=True)
+    watcher.contract_validator.transfer_topics = mock.Mock(return_value=[])
+    return watcher
+
+
+def test_backfill_then_follow(watcher):
+    iter_receipts = mock.Mock(side_effect=[
+        [Receipt('0x01', TEST_TOKEN_DEPLOYMENT_BLOCK + 1, 30000)],
+        [Receipt('0x02', TEST_TOKEN_DEPLOYMENT_BLOCK + 101, TEST_TOKEN_GAS + 1)],
+    ])
+    watcher.contract_validator.iter_receipts = iter_receipts
+    token = watcher.tokens[TOKEN_ADDRESS]
+
+    assert token.snapshot(100)['status'] == 'backfilling'
+
+    watcher.scan(token, TEST_TOKEN_DEPLOYMENT_BLOCK + 100)
+    assert token.snapshot(100)['status'] == 'ok'
+
+    watcher.scan(token, TEST_TOKEN_DEPLOYMENT_BLOCK + 200)
+    snapshot = token.snapshot(100)
+    assert snapshot['status'] == 'failed'
+    assert snapshot['transfers'] == 2
+    assert snapshot['lastBlock'] == TEST_TOKEN_DEPLOYMENT_BLOCK + 200
+
+    scanned = [call[0][2:] for call in iter_receipts.call_args_list]
+    assert scanned == [
+        (TEST_TOKEN_DEPLOYMENT_BLOCK, TEST_TOKEN_DEPLOYMENT_BLOCK + 100),
+        (TEST_TOKEN_DEPLOYMENT_BLOCK + 101, TEST_TOKEN_DEPLOYMENT_BLOCK + 200),
+    ]
+
+
+def test_failed_scan_keeps_stats(watcher):
+    def receipts():
+        yield Receipt('0x01', TEST_TOKEN_DEPLOYMENT_BLOCK + 1, 30000)
+        raise ValueError('node error')
+
+    watcher.contract_validator.iter_receipts = mock.Mock(return_value=receipts())
+    token = watcher.tokens[TOKEN_ADDRESS]
+
+    watcher.scan(token, TEST_TOKEN_DEPLOYMENT_BLOCK + 100)
+
+    assert token.transfers == 0
+    assert token.last_block is None
+
+
+def test_http_api(watcher):
+    watcher.tokens[TOKEN_ADDRESS].update(
+        [Receipt('0x01', TEST_TOKEN_DEPLOYMENT_BLOCK, 30000)], TEST_TOKEN_DEPLOYMENT_BLOCK
+    )
+    server = WatchServer(('127.0.0.1', 0), [watcher])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%i' % server.server_address[1]
+
+    try:
+        status = json.loads(urlopen(url + '/status?percentile=50').read())
+        token = json.loads(
+            urlopen(url + '/networks/mainnet/tokens/' + TEST_TOKEN_ADDRESS.lower()).read()
+        )
+        with pytest.raises(HTTPError) as error:
+            urlopen(url + '/status?percentile=150')
+        assert error.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert status['mainnet'][TOKEN_ADDRESS]['percentile'] == 50
+    assert token['status'] == 'ok'
+    assert token['actual'] == 30000
+
+
+def test_same_symbol_tokens():
+    blockchain_params = dict(ASSET['blockchainParams'], address='0x' + '11' * 20)
+    other = dict(ASSET, blockchainParams=blockchain_params)
+    watcher = NetworkWatcher('mainnet', NODE_URL, [ASSET, other], fast=True)
+
+    assert len(watcher.tokens) == 2
+
+
+def test_revalidated_on_interval(watcher):
+    clock = mock.Mock(return_value=0)
+    watcher.clock = clock
+    watcher.validate_interval = 100
+    watcher.validate = mock.Mock(side_effect=lambda: setattr(watcher, 'validated_at', clock()))
+    watcher.head_block = mock.Mock(side_effect=ValueError('node is down'))
+
+    for now in (0, 50, 100, 150):
+        clock.return_value = now
+        watcher.poll(mock.Mock())
+
+    assert watcher.validate.call_count == 2
+
+
+def test_slow_backfill_doesnt_block_tokens():
+    other = dict(ASSET, symbol='OTHER',
+                 blockchainParams=dict(ASSET['blockchainParams'], address='0x' + '11' * 20))
+    watcher = NetworkWatcher('mainnet', NODE_URL, [ASSET, other], fast=True)
+    watcher.validate = mock.Mock()
+    watcher.head_block = mock.Mock(return_value=TEST_TOKEN_DEPLOYMENT_BLOCK + 100)
+    watcher.contract_validator.transfer_topics = mock.Mock(return_value=[])
+
+    backfill_released = threading.Event()
+
+    def iter_receipts(address, topics, from_block, to_block):
+        if address == TOKEN_ADDRESS:
+            backfill_released.wait(5)
+        return []
+
+    watcher.contract_validator.iter_receipts = iter_receipts
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        watcher.poll(executor)
+        other_token = watcher.tokens[normalize_address(other['blockchainParams']['address'])]
+        for _ in range(100):
+            if other_token.address not in watcher.scanning:
+                break
+            time.sleep(0.01)
+
+        assert other_token.last_block == TEST_TOKEN_DEPLOYMENT_BLOCK + 100
+        assert watcher.tokens[TOKEN_ADDRESS].last_block is None
+
+        watcher.poll(executor)
+        assert list(watcher.scanning) == [TOKEN_ADDRESS], "running scan must not be restarted"
+        backfill_released.set()